@@ -1,4 +1,50 @@
 """
 This program is used to schmooze formats from firefox and add new ones
+
+Everything public in the modules below is available from the package, as
+if they had all been star-imported.  A module is only imported the first
+time something from it is asked for, so that quick entry points (like
+"python -m firefoxFormats._quick") do not pay to import all of them.
 """
-from ._firefoxFormats import *
\ No newline at end of file
+
+# the modules whose public names the package provides, searched in this order
+_MODULES=('_firefoxFormats','_cache','_batch','_async','_binaryIndex','_extIndex',
+    '_daemon','_watch','_launch','_httpMime','_verify','_stats','_profiles',
+    '_reverseIndex','_diff','_store','_mimeDb','_sniff','_tree')
+
+
+def _publicNames(module):
+    """
+    what "from module import *" would get
+    """
+    names=getattr(module,'__all__',None)
+    if names is None:
+        names=[name for name in vars(module) if not name.startswith('_')]
+    return names
+
+
+def __getattr__(name):
+    import importlib
+    if name in _MODULES:
+        return importlib.import_module('.'+name,__name__)
+    if name=='__all__':
+        names=[]
+        for moduleName in _MODULES:
+            names.extend(_publicNames(importlib.import_module('.'+moduleName,__name__)))
+        value=list(dict.fromkeys(names))
+    elif name.startswith('_'):
+        raise AttributeError("module '%s' has no attribute '%s'"%(__name__,name))
+    else:
+        for moduleName in _MODULES:
+            module=importlib.import_module('.'+moduleName,__name__)
+            if name in vars(module):
+                value=getattr(module,name)
+                break
+        else:
+            raise AttributeError("module '%s' has no attribute '%s'"%(__name__,name))
+    globals()[name]=value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals())|set(__getattr__('__all__')))
@@ -0,0 +1,85 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+asyncio support for running handlers without blocking the event loop
+"""
+import time
+
+
+class HandlerResult:
+    """
+    What happened when a handler was run
+    """
+
+    def __init__(self,callString,returncode=None,output=b'',elapsed=0.0):
+        self.callString=callString # the command line or url that was run
+        self.returncode=returncode # exit code of the process (0 = ok)
+        self.output=output # captured stdout+stderr bytes
+        self.elapsed=elapsed # how long it took, in seconds
+
+    @property
+    def ok(self):
+        """
+        whether the handler reported success
+        """
+        return self.returncode==0
+
+    def __repr__(self):
+        return '"%s" returned %s in %0.3fs'%(
+            self.callString,self.returncode,self.elapsed)
+
+
+async def runCommand(callArgs,timeout=None,callString=None):
+    """
+    run a command as an asyncio subprocess
+
+    If the timeout expires or the calling task is cancelled, the process
+    is killed before the exception is passed on.
+
+    :property callArgs: the argument list to run (without a shell, the same
+        way handlers are run synchronously), or a string to run in the shell
+    :property timeout: seconds to wait before giving up (None=forever)
+    :property callString: what to call it in the HandlerResult
+        (default=callArgs as a command line)
+
+    :return: HandlerResult
+    """
+    import asyncio
+    import subprocess
+    start=time.perf_counter()
+    if isinstance(callArgs,str):
+        if callString is None:
+            callString=callArgs
+        po=await asyncio.create_subprocess_shell(callArgs,
+            stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+    else:
+        if callString is None:
+            callString=subprocess.list2cmdline(callArgs)
+        po=await asyncio.create_subprocess_exec(*callArgs,
+            stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+    try:
+        out,_=await asyncio.wait_for(po.communicate(),timeout)
+    except BaseException: # includes timeouts and cancellation
+        if po.returncode is None:
+            po.kill()
+            await po.wait()
+        raise
+    return HandlerResult(callString,po.returncode,out,time.perf_counter()-start)
+
+
+async def openBrowser(url,timeout=None):
+    """
+    open a url in the web browser without blocking the event loop
+
+    :property url: the url to open
+    :property timeout: seconds to wait before giving up (None=forever)
+
+    :return: HandlerResult
+    """
+    import asyncio
+    import webbrowser
+    start=time.perf_counter()
+    loop=asyncio.get_running_loop()
+    opened=await asyncio.wait_for(
+        loop.run_in_executor(None,webbrowser.open,url),timeout)
+    return HandlerResult(url,0 if opened else 1,b'',time.perf_counter()-start)
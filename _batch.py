@@ -0,0 +1,198 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Dispatch a large number of urls/paths to their handlers in one go
+"""
+import os
+import time
+
+
+class BatchResult:
+    """
+    The outcome of dispatching a single item of a batch
+    """
+
+    def __init__(self,item,error=None,elapsed=0.0):
+        self.item=item # the url or path that was dispatched
+        self.error=error # the exception raised, or None if all went well
+        self.elapsed=elapsed # how long it took, in seconds
+
+    @property
+    def ok(self):
+        """
+        whether this item was dispatched successfully
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return 'OK   %s (%0.3fs)'%(self.item,self.elapsed)
+        return 'FAIL %s: %s'%(self.item,self.error)
+
+
+class BatchSummary:
+    """
+    Aggregate results of a batch run
+    """
+
+    def __init__(self):
+        self.count=0
+        self.failures=0
+        self.elapsed=0.0 # wall clock time for the whole batch
+
+    @property
+    def succeeded(self):
+        """
+        how many items were dispatched successfully
+        """
+        return self.count-self.failures
+
+    @property
+    def throughput(self):
+        """
+        items per second
+        """
+        if self.elapsed<=0:
+            return 0.0
+        return self.count/self.elapsed
+
+    def add(self,result):
+        """
+        add a BatchResult to the totals
+        """
+        self.count+=1
+        if not result.ok:
+            self.failures+=1
+
+    @property
+    def jsonDict(self):
+        """
+        the totals as something that can be encoded as json
+        """
+        return {'count':self.count,'succeeded':self.succeeded,
+            'failures':self.failures,'elapsed':self.elapsed}
+
+    def __repr__(self):
+        return '%d items, %d succeeded, %d failed in %0.3fs (%0.1f items/s)'%(
+            self.count,self.succeeded,self.failures,self.elapsed,self.throughput)
+
+
+class BoundedSubmitter:
+    """
+    Submits tasks to an executor without ever letting more than a few per
+    worker pile up, so that work can be fed from a huge (or still growing)
+    source without queueing all of it
+    """
+
+    def __init__(self,pool,jobs,backlog=2):
+        """
+        :property pool: a ThreadPoolExecutor or ProcessPoolExecutor
+        :property jobs: how many workers the pool has
+        :property backlog: how many pending tasks to allow per worker
+        """
+        self.pool=pool
+        self.limit=max(1,jobs)*backlog
+        self.pending=set()
+
+    def submit(self,fn,*args):
+        """
+        submit a task, and if that makes too many pending, wait for some to finish
+
+        :return: the results of the tasks that finished meanwhile (often none)
+        """
+        self.pending.add(self.pool.submit(fn,*args))
+        if len(self.pending)<self.limit:
+            return []
+        return self.wait()
+
+    def wait(self):
+        """
+        wait for at least one pending task to finish
+
+        :return: the results of the tasks that finished (none if nothing was pending)
+        """
+        from concurrent.futures import FIRST_COMPLETED,wait
+        if not self.pending:
+            return []
+        done,self.pending=wait(self.pending,return_when=FIRST_COMPLETED)
+        return [future.result() for future in done]
+
+    def drain(self):
+        """
+        wait for all of the pending tasks to finish
+
+        :return: their results
+        """
+        from concurrent.futures import wait
+        done=wait(self.pending).done
+        self.pending=set()
+        return [future.result() for future in done]
+
+
+def readItems(f):
+    """
+    yield newline-delimited urls/paths from a file-like object,
+    skipping blank lines
+    """
+    for line in f:
+        line=line.strip()
+        if line:
+            yield line
+
+
+def defaultJobs():
+    """
+    the default number of handlers to run at the same time
+    """
+    return min(32,(os.cpu_count() or 1)*4)
+
+
+def runBatch(fff,items,jobs=None,handler=None,report=None):
+    """
+    dispatch many urls/paths to their handlers using a pool of workers
+
+    Each item is resolved (on the calling thread) via FirefoxFormats.resolve()
+    and then its handler is run on a worker.  No more than a few items per
+    worker are ever queued, so items can be streamed from a huge source.
+
+    :property fff: a FirefoxFormats object
+    :property items: iterable of urls or paths
+    :property jobs: how many handlers may be running at once
+    :property handler: the name of a specific handler to use (if absent, use default hander)
+    :property report: callback that is called with a BatchResult as each item completes
+        (an item fails if its handler raises, which includes a handler
+        application exiting with an error)
+
+    :return: a BatchSummary
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if jobs is None:
+        jobs=defaultJobs()
+    jobs=max(1,jobs)
+    summary=BatchSummary()
+    def finished(result):
+        summary.add(result)
+        if report is not None:
+            report(result)
+    def run(handlers,item):
+        start=time.perf_counter()
+        try:
+            handlers(item,handler)
+        except Exception as e:
+            return BatchResult(item,e,time.perf_counter()-start)
+        return BatchResult(item,None,time.perf_counter()-start)
+    start=time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        submitter=BoundedSubmitter(pool,jobs)
+        for item in items:
+            try:
+                handlers=fff.resolve(item,handler)
+            except Exception as e:
+                finished(BatchResult(item,e))
+                continue
+            for result in submitter.submit(run,handlers,item):
+                finished(result)
+        for result in submitter.drain():
+            finished(result)
+    summary.elapsed=time.perf_counter()-start
+    return summary
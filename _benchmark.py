@@ -0,0 +1,392 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for firefoxFormats, run against synthetic handlers.json files
+
+Results are written as json so that they can be compared between releases.
+
+Usage:
+    python -m firefoxFormats._benchmark [--scales=100,1000,...] [--repeat=n] [--output=file.json]
+    python -m firefoxFormats._benchmark --importBudget[=ms]
+"""
+import os
+import sys
+import time
+import json
+
+
+SCALES=(100,1000,10000,100000,1000000)
+
+# a pool of handler applications and webservices, so that (like in real
+# profiles) the same few handlers show up over and over again
+APPLICATIONS=[
+    ('Adobe Acrobat','C:\\Program Files\\Adobe\\Acrobat DC\\Acrobat\\Acrobat.exe'),
+    ('VLC media player','C:\\Program Files\\VideoLAN\\VLC\\vlc.exe'),
+    ('Notepad++','C:\\Program Files\\Notepad++\\notepad++.exe'),
+    ('LibreOffice','/usr/bin/libreoffice'),
+    ('Evince','/usr/bin/evince'),
+    ('GIMP','/usr/bin/gimp'),
+    ('7-Zip','C:\\Program Files\\7-Zip\\7zFM.exe'),
+    ('Microsoft Teams','C:\\Users\\me\\AppData\\Local\\Microsoft\\Teams\\current\\Teams.exe'),
+    ('Zoom','/usr/bin/zoom'),
+    ('Thunderbird','/usr/bin/thunderbird'),
+    ]
+WEBSERVICES=[
+    ('Gmail','https://mail.google.com/mail/?extsrc=mailto&url=%s'),
+    ('Yahoo! Mail','https://compose.mail.yahoo.com/?To=%s'),
+    ('Outlook.com','https://outlook.live.com/default.aspx?rru=compose&to=%s'),
+    ('IRCCloud','https://www.irccloud.com/#!/%s'),
+    ('Office Online','https://view.officeapps.live.com/op/view.aspx?src=%s'),
+    ]
+MEDIA_TYPES=('application','audio','image','text','video','x-scheme-handler')
+
+
+def generateHandlersJson(count,seed=0):
+    """
+    generate a synthetic handlers.json dict
+
+    About 85% of the entries are mime types and the rest are schemes.
+    Most mime types have one extension, some have several (including
+    multi-dot ones like "tar.gz") and some have none.  Most entries have
+    zero or one handler, drawn from a small pool of applications.
+
+    :property count: how many mime types + schemes to generate
+    :property seed: random seed, so the same file can be generated again
+    """
+    import random
+    rnd=random.Random(seed)
+    mimeTypes={}
+    schemes={}
+    numSchemes=max(1,count*15//100)
+    def handlers():
+        ret=[]
+        for _ in range(rnd.choices((0,1,2,3),(40,45,10,5))[0]):
+            if rnd.random()<0.8:
+                name,path=rnd.choice(APPLICATIONS)
+                ret.append({'name':name,'path':path})
+            else:
+                name,uriTemplate=rnd.choice(WEBSERVICES)
+                ret.append({'name':name,'uriTemplate':uriTemplate})
+        if ret and rnd.random()<0.1:
+            ret.insert(0,None)
+        return ret
+    def entry(extensions=None):
+        ret={'action':rnd.choices((0,2,3,4),(30,40,20,10))[0]}
+        if extensions:
+            ret['extensions']=extensions
+        if rnd.random()<0.2:
+            ret['ask']=True
+        if rnd.random()<0.05:
+            ret['stubEntry']=True
+        h=handlers()
+        if h:
+            ret['handlers']=h
+        return ret
+    for i in range(count-numSchemes):
+        extensions=[]
+        for j in range(rnd.choices((0,1,2,3),(10,70,15,5))[0]):
+            ext='x%x%s'%(i,'abcdefgh'[j])
+            if rnd.random()<0.05:
+                ext=ext+'.gz'
+            extensions.append(ext)
+        name='%s/x-synthetic-%d'%(rnd.choice(MEDIA_TYPES),i)
+        mimeTypes[name]=entry(extensions)
+    for i in range(numSchemes):
+        schemes['web+s%d'%i]=entry()
+    return {
+        'defaultHandlersVersion':{'en-US':4},
+        'mimeTypes':mimeTypes,
+        'schemes':schemes
+        }
+
+
+def writeHandlersJson(filename,count,seed=0):
+    """
+    write a synthetic handlers.json file
+
+    :return: the dict that was written
+    """
+    jsonDict=generateHandlersJson(count,seed)
+    with open(filename,'w',encoding='utf-8') as f:
+        json.dump(jsonDict,f,separators=(',',':'))
+    return jsonDict
+
+
+def _timeit(fn,repeat):
+    """
+    time a function
+
+    :return: {'min':seconds,'mean':seconds}
+    """
+    times=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        fn()
+        times.append(time.perf_counter()-start)
+    return {'min':min(times),'mean':sum(times)/len(times)}
+
+
+# modules that the quick lookup path must never import
+QUICK_FORBIDDEN_IMPORTS=('json','subprocess','pickle','hashlib','asyncio','sqlite3')
+# modules of this package that the quick lookup path must never import
+QUICK_FORBIDDEN_MODULES=('_firefoxFormats','_daemon','_launch','_store','_httpMime')
+# how long importing the quick lookup path may take, in milliseconds
+QUICK_IMPORT_BUDGET_MS=10.0
+
+
+def measureImportTime(module=None):
+    """
+    measure how long it takes to import a module in a fresh interpreter
+
+    :property module: the module to import (default=the quick lookup module)
+
+    :return: (milliseconds spent importing this package,
+        list of everything that was imported)
+    """
+    import subprocess
+    if module is None:
+        module=__package__+'._quick'
+    here=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env=dict(os.environ,PYTHONPATH=here)
+    result=subprocess.run([sys.executable,'-X','importtime','-c','import '+module],
+        env=env,stderr=subprocess.PIPE,stdout=subprocess.DEVNULL,check=True)
+    total=0
+    imported=[]
+    for line in result.stderr.decode('utf-8').splitlines():
+        # import time: self [us] | cumulative | imported package
+        line=line.split('|')
+        if len(line)!=3 or not line[1].strip().isdigit():
+            continue
+        name=line[2][1:].rstrip()
+        imported.append(name.strip())
+        if not name.startswith(' ') and name.split('.',1)[0]==__package__:
+            total+=int(line[1])
+    return total/1000.0,imported
+
+
+def checkImportBudget(budgetMs=None,module=None):
+    """
+    check that the quick lookup path imports within a time budget and
+    does not drag in any of QUICK_FORBIDDEN_IMPORTS or QUICK_FORBIDDEN_MODULES
+
+    :property budgetMs: the budget (default=QUICK_IMPORT_BUDGET_MS)
+
+    :return: list of problems (empty if everything is ok)
+    """
+    if budgetMs is None:
+        budgetMs=QUICK_IMPORT_BUDGET_MS
+    ms,imported=measureImportTime(module)
+    problems=[]
+    if ms>budgetMs:
+        problems.append('import took %0.1fms (budget %0.1fms)'%(ms,budgetMs))
+    for name in QUICK_FORBIDDEN_IMPORTS:
+        if name in imported:
+            problems.append('imported %s'%name)
+    for name in QUICK_FORBIDDEN_MODULES:
+        if '%s.%s'%(__package__,name) in imported:
+            problems.append('imported %s.%s'%(__package__,name))
+    return problems
+
+
+def measureMemory(filename,lazy=False):
+    """
+    measure how much memory a loaded profile takes up, using tracemalloc
+
+    :return: {'retained':bytes still in use after loading,
+        'peak':most bytes in use at once while loading}
+    """
+    import gc
+    import tracemalloc
+    from ._firefoxFormats import FirefoxFormats
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start,_=tracemalloc.get_traced_memory()
+        fff=FirefoxFormats(filename=filename,useCache=False,lazy=lazy)
+        fff.load()
+        fff.ext2mime # pylint: disable=pointless-statement
+        gc.collect()
+        current,peak=tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del fff
+    return {'retained':current-start,'peak':peak-start}
+
+
+def benchmarkScale(filename,count,repeat=3):
+    """
+    run all of the benchmarks against one handlers.json file
+
+    :return: list of result dicts
+    """
+    from ._firefoxFormats import FirefoxFormats,cmdline
+    import io
+    import contextlib
+    import subprocess
+    results=[]
+    def record(name,fn,ops=1,reps=repeat):
+        results.append({'scale':count,'benchmark':name,'ops':ops,
+            'seconds':_timeit(fn,reps)})
+    with open(filename,'rb') as f:
+        data=f.read()
+    fff=FirefoxFormats(filename=filename,useCache=False)
+    fff.load()
+    record('load',lambda:FirefoxFormats(filename=filename,useCache=False).load())
+    record('loadLazy',lambda:FirefoxFormats(filename=filename,useCache=False,lazy=True).load())
+    record('jsonRoundTrip',lambda:json.dumps(json.loads(data)))
+    record('modelJson',lambda:fff.json)
+    def buildExt2mime():
+        fff._ext2mime=None # pylint: disable=protected-access
+        return fff.ext2mime
+    record('ext2mime',buildExt2mime)
+    exts=list(fff.ext2mime)[:10000] or ['none']
+    paths=['/some/dir.d/file%d.%s'%(i,exts[i%len(exts)]) for i in range(10000)]
+    def lookups():
+        lookup=fff.fileExtensionToMime
+        for path in paths:
+            lookup(path)
+    record('fileExtensionToMime',lookups,len(paths))
+    record('repr',lambda:repr(fff))
+    def listing():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cmdline(['--noDaemon','--file=%s'%filename,'--noCache','--list'])
+    record('cmdlineList',listing)
+    handlers=[h for hs in fff.mimeTypeHandlers.values() for h in hs.handlers
+        if h.path is not None or h.uriTemplate is not None][:10000]
+    def callStrings():
+        for h in handlers:
+            h.getCallString('/some/file name.txt')
+    if handlers:
+        record('getCallString',callStrings,len(handlers))
+    here=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env=dict(os.environ,PYTHONPATH=here)
+    args=[sys.executable,'-m',__package__,'--noDaemon','--file=%s'%filename,'--ext2mime']
+    def startup():
+        subprocess.run(args+['--noCache'],env=env,stdout=subprocess.DEVNULL,check=True)
+    record('cmdlineStartup',startup)
+    for lazy in (False,True):
+        results.append({'scale':count,'benchmark':'memoryLazy' if lazy else 'memory',
+            'ops':1,'bytes':measureMemory(filename,lazy)})
+    def cachedStartup():
+        subprocess.run(args,env=env,stdout=subprocess.DEVNULL,check=True)
+    cachedStartup() # fill the cache
+    record('cmdlineStartupCached',cachedStartup)
+    quickArgs=[sys.executable,'-m',__package__+'._quick','--file=%s'%filename,
+        'ext2mime','file.%s'%exts[0]]
+    def quickStartup():
+        subprocess.run(quickArgs,env=env,stdout=subprocess.DEVNULL)
+    quickStartup() # compile the index
+    record('quickStartup',quickStartup)
+    return results
+
+
+def runBenchmarks(scales=SCALES,repeat=3,workDir=None,report=None):
+    """
+    generate synthetic profiles at each scale and benchmark them
+
+    :property scales: number of entries in each generated profile
+    :property repeat: how many times to time each benchmark
+    :property workDir: where to put the generated files (default=a temp dir)
+    :property report: callback called with each result dict as it is finished
+
+    :return: json-compatible dict of all the results
+    """
+    import platform
+    import tempfile
+    results=[]
+    importMs=min(measureImportTime()[0] for _ in range(repeat))
+    results.append({'scale':0,'benchmark':'quickImportTime','ops':1,
+        'seconds':{'min':importMs/1000.0,'mean':importMs/1000.0}})
+    with tempfile.TemporaryDirectory(dir=workDir) as tmpDir:
+        oldCacheDir=os.environ.get('FIREFOXFORMATS_CACHE_DIR')
+        os.environ['FIREFOXFORMATS_CACHE_DIR']=os.path.join(tmpDir,'cache')
+        try:
+            for count in scales:
+                filename=os.path.join(tmpDir,'handlers%d.json'%count)
+                writeHandlersJson(filename,count)
+                for result in benchmarkScale(filename,count,repeat):
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+        finally:
+            if oldCacheDir is None:
+                del os.environ['FIREFOXFORMATS_CACHE_DIR']
+            else:
+                os.environ['FIREFOXFORMATS_CACHE_DIR']=oldCacheDir
+    return {
+        'formatVersion':1,
+        'timestamp':time.time(),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results
+        }
+
+
+def cmdline(args):
+    """
+    Run the command line
+
+    :param args: command line arguments (WITHOUT the filename)
+    """
+    printhelp=False
+    scales=SCALES
+    repeat=3
+    output=None
+    importBudget=None
+    for arg in args:
+        arg=[a.strip() for a in arg.split('=',1)]
+        if arg[0] in ['-h','--help']:
+            printhelp=True
+        elif arg[0]=='--scales':
+            scales=[int(x) for x in arg[1].split(',')]
+        elif arg[0]=='--repeat':
+            repeat=int(arg[1])
+        elif arg[0]=='--output':
+            output=arg[1]
+        elif arg[0]=='--importBudget':
+            if len(arg)>1:
+                importBudget=float(arg[1])
+            else:
+                importBudget=QUICK_IMPORT_BUDGET_MS
+        else:
+            print('ERR: unknown argument "'+arg[0]+'"')
+            printhelp=True
+    if printhelp:
+        print('Usage:')
+        print('  _benchmark.py [options]')
+        print('Options:')
+        print('   --scales=n,n,... ... profile sizes to benchmark (default=%s)'%(
+            ','.join(str(s) for s in SCALES)))
+        print('   --repeat=n ......... how many times to time each benchmark')
+        print('   --output=file ...... save json results to a file (default=stdout)')
+        print('   --importBudget[=ms]  only check that the quick lookup path imports')
+        print('                        within a time budget (default=%0.1fms) and'%QUICK_IMPORT_BUDGET_MS)
+        print('                        without heavy modules')
+        return -1
+    if importBudget is not None:
+        problems=checkImportBudget(importBudget)
+        for problem in problems:
+            print('FAIL:',problem)
+        if problems:
+            return 1
+        print('OK')
+        return 0
+    def report(result):
+        if 'bytes' in result: # memory rather than timing
+            sys.stderr.write('%8d %-24s %d bytes retained, %d peak\n'%(result['scale'],
+                result['benchmark'],result['bytes']['retained'],result['bytes']['peak']))
+        else:
+            sys.stderr.write('%8d %-24s %0.6fs\n'%(result['scale'],result['benchmark'],
+                result['seconds']['min']))
+    results=runBenchmarks(scales,repeat,report=report)
+    if output is None:
+        print(json.dumps(results,indent=2))
+    else:
+        with open(output,'w') as f:
+            json.dump(results,f,indent=2)
+    return 0
+
+
+if __name__=='__main__':
+    sys.exit(cmdline(sys.argv[1:]))
@@ -0,0 +1,303 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+A compact, memory-mapped binary index of a profile's handlers
+
+This is for lookup-only workloads (extension->mime, which handler serves a
+scheme, etc).  The index file is mmapped and searched in place, so nothing
+is parsed up front and many processes can share one page-cached copy.
+
+File layout (all integers are little-endian uint32 unless noted):
+    header:   magic "FFXI", format version,
+              (count,offset) of the extension, mime type, scheme and
+              extension mime type tables,
+              offset of the handler records, offset of the string pool,
+              most dot-separated parts of any extension,
+              (mtime,size,inode) of the source handlers.json as uint64s,
+              _mimeDb.layersSignature() of the mime layers as a uint64
+    tables:   count entries of (keyOffset,keyLength,value) sorted by key bytes
+              (extensions are stored lowercase)
+              for extensions, value is the index of the entry in the
+              extension mime type table (whose values are unused)
+              for mime types and schemes, value is the offset of a record
+    records:  action (int32, -1=None), flags (1=ask, 2=stubEntry), handlerCount,
+              then handlerCount * (name,path,uriTemplate) string references
+    strings:  utf-8 bytes, referenced by (offset,length) from the pool start
+              an offset of NONE means the string is None
+"""
+import struct
+from ._cache import replaceFile
+from ._extIndex import iterSuffixes
+from ._mimeDb import layersSignature
+
+
+MAGIC=b'FFXI'
+FORMAT_VERSION=4
+NONE=0xFFFFFFFF
+
+_HEADER=struct.Struct('<4sI11I4Q')
+_ENTRY=struct.Struct('<3I')
+_RECORD=struct.Struct('<i2I')
+_HANDLER=struct.Struct('<6I')
+
+FLAG_ASK=1
+FLAG_STUB_ENTRY=2
+
+
+class _StringPool:
+    """
+    collects strings for the string pool, storing each distinct one once
+    """
+
+    def __init__(self):
+        self.data=bytearray()
+        self.offsets={}
+
+    def add(self,s):
+        """
+        add a string and get its (offset,length) reference
+        """
+        if s is None:
+            return (NONE,0)
+        ref=self.offsets.get(s)
+        if ref is None:
+            b=s.encode('utf-8')
+            ref=(len(self.data),len(b))
+            self.data+=b
+            self.offsets[s]=ref
+        return ref
+
+
+def compileIndex(fff,filename,sourceSignature=None):
+    """
+    compile a FirefoxFormats object into a binary index file
+
+    :property fff: the FirefoxFormats object to compile
+    :property filename: where to save the index
+    :property sourceSignature: the (mtime,size,inode) of the handlers.json the
+        index was compiled from, so readers can tell if it is out of date
+
+    File extensions come from all of the object's mimeLayers, the same as
+    its ext2mime, and the layersSignature() of those is kept in the index
+    as well, so readers can also tell when the system mime types change.
+    """
+    mimeLayersSignature=layersSignature(fff.mimeLayers)
+    strings=_StringPool()
+    records=bytearray()
+    def compileTable(handlerSets):
+        entries=[]
+        for key,handlerSet in handlerSets.items():
+            flags=0
+            if handlerSet.ask:
+                flags|=FLAG_ASK
+            if handlerSet.stubEntry:
+                flags|=FLAG_STUB_ENTRY
+            action=-1 if handlerSet.action is None else int(handlerSet.action)
+            recordOffset=len(records)
+            records.extend(_RECORD.pack(action,flags,len(handlerSet.handlers)))
+            for h in handlerSet.handlers:
+                records.extend(_HANDLER.pack(*strings.add(h.name or None),
+                    *strings.add(h.path),*strings.add(h.uriTemplate)))
+            entries.append((key.encode('utf-8'),recordOffset))
+        entries.sort()
+        return entries
+    mimes=compileTable(fff.mimeTypeHandlers)
+    schemes=compileTable(fff.urlProtocolHandlers)
+    ext2mime=fff.ext2mime
+    extMimes=sorted(set(mime.encode('utf-8') for mime in ext2mime.values()))
+    extMimeIndex={mime.decode('utf-8'):i for i,mime in enumerate(extMimes)}
+    extMimes=[(mime,0) for mime in extMimes]
+    exts=sorted((ext.encode('utf-8'),extMimeIndex[mime]) for ext,mime in ext2mime.items())
+    maxParts=ext2mime.maxParts
+    tables=[]
+    for entries in (exts,mimes,schemes,extMimes):
+        table=bytearray()
+        for key,value in entries:
+            offset,length=strings.add(key.decode('utf-8'))
+            table.extend(_ENTRY.pack(offset,length,value))
+        tables.append(table)
+    offset=_HEADER.size
+    header=[MAGIC,FORMAT_VERSION]
+    for entries,table in zip((exts,mimes,schemes,extMimes),tables):
+        header.extend((len(entries),offset))
+        offset+=len(table)
+    header.append(offset)
+    header.append(offset+len(records))
+    header.append(maxParts)
+    header.extend(sourceSignature or (0,0,0))
+    header.append(mimeLayersSignature)
+    def write(f):
+        f.write(_HEADER.pack(*header))
+        for table in tables:
+            f.write(table)
+        f.write(records)
+        f.write(strings.data)
+    replaceFile(filename,write)
+
+
+class BinaryIndex:
+    """
+    Read-only lookups straight out of a memory-mapped index file
+    created by compileIndex()
+    """
+
+    def __init__(self,filename):
+        import mmap
+        self.filename=filename
+        self._mm=None
+        with open(filename,'rb') as f:
+            self._mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        header=_HEADER.unpack_from(self._mm,0)
+        if header[0]!=MAGIC or header[1]!=FORMAT_VERSION:
+            self.close()
+            raise Exception('"%s" is not a firefoxFormats index'%filename)
+        self._exts=header[2:4]
+        self._mimes=header[4:6]
+        self._schemes=header[6:8]
+        self._extMimes=header[8:10]
+        self._records=header[10]
+        self._strings=header[11]
+        self._maxParts=header[12]
+        self.sourceSignature=header[13:16] # (mtime,size,inode) of the handlers.json
+        self.layersSignature=header[16] # _mimeDb.layersSignature() of the mime layers
+
+    def close(self):
+        """
+        release the memory map
+        """
+        if self._mm is not None:
+            self._mm.close()
+            self._mm=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def _string(self,offset,length):
+        """
+        get a string out of the string pool
+        """
+        if offset==NONE:
+            return None
+        start=self._strings+offset
+        return self._mm[start:start+length].decode('utf-8')
+
+    def _find(self,table,key):
+        """
+        binary search a table for a key
+
+        :return: (entry index,value) or None
+        """
+        count,tableOffset=table
+        key=key.encode('utf-8')
+        mm=self._mm
+        strings=self._strings
+        lo=0
+        hi=count
+        while lo<hi:
+            mid=(lo+hi)//2
+            offset,length,value=_ENTRY.unpack_from(mm,tableOffset+mid*_ENTRY.size)
+            offset+=strings
+            probe=mm[offset:offset+length]
+            if probe<key:
+                lo=mid+1
+            elif probe>key:
+                hi=mid
+            else:
+                return mid,value
+        return None
+
+    def _key(self,table,i):
+        """
+        get the key of the i'th entry of a table
+        """
+        offset,length,_=_ENTRY.unpack_from(self._mm,table[1]+i*_ENTRY.size)
+        return self._string(offset,length)
+
+    def _record(self,recordOffset):
+        """
+        decode a handler record
+
+        :return: (action,flags,[(name,path,uriTemplate),...])
+        """
+        offset=self._records+recordOffset
+        action,flags,count=_RECORD.unpack_from(self._mm,offset)
+        offset+=_RECORD.size
+        handlers=[]
+        for _ in range(count):
+            refs=_HANDLER.unpack_from(self._mm,offset)
+            offset+=_HANDLER.size
+            handlers.append((self._string(*refs[0:2]),
+                self._string(*refs[2:4]),self._string(*refs[4:6])))
+        if action<0:
+            action=None
+        return action,flags,handlers
+
+    def _lookup(self,table,key):
+        """
+        look up a mime type or scheme record
+        """
+        found=self._find(table,key)
+        if found is None:
+            return None
+        return self._record(found[1])
+
+    def fileExtensionToMime(self,path):
+        """
+        lookup the file extension of a given path
+        (longest registered extension wins, case insensitive)
+        """
+        found=None
+        for ext in iterSuffixes(path,self._maxParts):
+            found=self._find(self._exts,ext) or found
+        if found is None:
+            return None
+        return self._key(self._extMimes,found[1])
+
+    def mimeHandlers(self,mime):
+        """
+        get the handlers for a mime type
+
+        :return: (action,flags,[(name,path,uriTemplate),...]) or None
+        """
+        return self._lookup(self._mimes,mime)
+
+    def schemeHandlers(self,scheme):
+        """
+        get the handlers for a url scheme (without ":")
+
+        :return: (action,flags,[(name,path,uriTemplate),...]) or None
+        """
+        return self._lookup(self._schemes,scheme)
+
+    @staticmethod
+    def _target(record,handlerName):
+        """
+        pick the target (path or uriTemplate) out of a record
+        the same way as FirefoxHandlerSet.getHandler()
+        """
+        if record is None or not record[2]:
+            return None
+        handler=record[2][0]
+        if handlerName is not None:
+            for h in record[2]:
+                if h[0]==handlerName:
+                    handler=h
+                    break
+        if handler[1] is not None:
+            return handler[1]
+        return handler[2]
+
+    def mimeTarget(self,mime,handlerName=None):
+        """
+        which application or webservice serves a mime type
+        """
+        return self._target(self.mimeHandlers(mime),handlerName)
+
+    def schemeTarget(self,scheme,handlerName=None):
+        """
+        which application or webservice serves a url scheme
+        """
+        return self._target(self.schemeHandlers(scheme),handlerName)
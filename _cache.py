@@ -0,0 +1,192 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parsed firefox profile data
+
+Entries are keyed on the absolute path of the source file and are only
+considered valid while the source file's mtime, size and inode are unchanged.
+
+The cache can be turned off by setting the FIREFOXFORMATS_NO_CACHE environment
+variable, and relocated with FIREFOXFORMATS_CACHE_DIR.
+"""
+import os
+
+
+# bump this whenever the layout of the cached objects changes
+CACHE_FORMAT=3
+
+
+def getCacheDir():
+    """
+    get the directory where cached data is kept
+    """
+    path=os.environ.get('FIREFOXFORMATS_CACHE_DIR')
+    if not path:
+        if os.name=='nt':
+            base=os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            base=os.environ.get('XDG_CACHE_HOME') \
+                or os.path.join(os.path.expanduser('~'),'.cache')
+        path=os.path.join(base,'firefoxFormats')
+    return path
+
+
+def cacheEnabled():
+    """
+    whether caching has been turned on (the default) or off
+    """
+    return not os.environ.get('FIREFOXFORMATS_NO_CACHE')
+
+
+def fileSignature(filename):
+    """
+    the things that tell us whether a file has changed
+
+    :property filename: the file, or the descriptor of a file that is open
+        (to get the signature of exactly what is about to be read from it)
+
+    :return: (mtime,size,inode) tuple
+    """
+    st=os.stat(filename)
+    return (st.st_mtime_ns,st.st_size,st.st_ino)
+
+
+def fileSignatureOrNone(filename):
+    """
+    the fileSignature() of a file, or None if it is not there
+    (for source files that may or may not exist)
+    """
+    try:
+        return fileSignature(filename)
+    except OSError:
+        return None
+
+
+def replaceFile(filename,write,text=False,sync=False):
+    """
+    write a file by way of a temporary file that is then renamed over it,
+    so that nothing ever sees half a file
+
+    :property filename: the file to write (its directory is created if need be)
+    :property write: called with the open temporary file to write the contents
+    :property text: open the temporary file as utf-8 text rather than binary
+    :property sync: make sure the contents, and the rename, are on disk
+        before returning
+    """
+    filename=os.path.abspath(filename)
+    directory=os.path.dirname(filename)
+    os.makedirs(directory,exist_ok=True)
+    tmpFilename='%s.%d.tmp'%(filename,os.getpid())
+    try:
+        if text:
+            f=open(tmpFilename,'w',encoding='utf-8')
+        else:
+            f=open(tmpFilename,'wb')
+        with f:
+            write(f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmpFilename,filename)
+    except BaseException:
+        try:
+            os.remove(tmpFilename)
+        except OSError:
+            pass
+        raise
+    if sync and hasattr(os,'O_DIRECTORY'): # make sure the rename itself is on disk
+        fd=os.open(directory,os.O_RDONLY|os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def cacheFilename(filename,kind):
+    """
+    where the cache of a given kind for a given source file lives
+
+    (zlib checksums are used rather than hashlib because they are much
+    cheaper to import, which matters for quick command line lookups)
+    """
+    import zlib
+    path=os.path.abspath(filename).encode('utf-8')
+    key='%08x%08x'%(zlib.crc32(path),zlib.adler32(path))
+    return os.path.join(getCacheDir(),'%s.%s'%(key,kind))
+
+
+def loadCached(filename,kind='model'):
+    """
+    load a cached object for a source file
+
+    :property filename: the source file the cache was derived from
+    :property kind: what kind of cached data to get
+
+    :return: the cached object or None if there is no valid cache
+    """
+    import pickle
+    try:
+        signature=fileSignature(filename)
+        with open(cacheFilename(filename,kind),'rb') as f:
+            header=pickle.load(f)
+            if header!=(CACHE_FORMAT,os.path.abspath(filename),signature):
+                return None
+            return pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,AttributeError,
+            ImportError,IndexError,TypeError,ValueError):
+        return None
+
+
+def saveCached(filename,obj,kind='model',signature=None):
+    """
+    save an object to the cache for a given source file
+
+    Failure to write the cache is not an error; it just will not be
+    there next time.
+
+    :property filename: the source file the object was derived from
+    :property obj: the object to store (must be pickleable)
+    :property kind: what kind of cached data this is
+    :property signature: the fileSignature() of the source file as it was
+        when it was read (default is to take it now, which is only right if
+        nothing can have changed it since)
+    """
+    import pickle
+    try:
+        if signature is None:
+            signature=fileSignature(filename)
+        def write(f):
+            pickle.dump((CACHE_FORMAT,os.path.abspath(filename),signature),f,
+                pickle.HIGHEST_PROTOCOL)
+            pickle.dump(obj,f,pickle.HIGHEST_PROTOCOL)
+        replaceFile(cacheFilename(filename,kind),write)
+    except (OSError,pickle.PicklingError):
+        return False
+    return True
+
+
+def clearCache(filename=None):
+    """
+    clear out the cache
+
+    :property filename: only clear the cache for this source file
+        (default is to clear everything)
+
+    :return: how many cache files were removed
+    """
+    cacheDir=getCacheDir()
+    if not os.path.isdir(cacheDir):
+        return 0
+    prefix=None
+    if filename is not None:
+        prefix=os.path.basename(cacheFilename(filename,''))
+    count=0
+    for entry in os.scandir(cacheDir):
+        if prefix is not None and not entry.name.startswith(prefix):
+            continue
+        try:
+            os.remove(entry.path)
+            count+=1
+        except OSError:
+            pass
+    return count
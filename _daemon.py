@@ -0,0 +1,301 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+A resident daemon that keeps a loaded FirefoxFormats in memory and answers
+lookup and dispatch requests over a unix domain socket
+
+The protocol is one json object per line in each direction:
+    request:  {"op":"fileExtensionToMime","args":["x.pdf"]}
+    response: {"ok":true,"result":"application/pdf"}
+          or: {"ok":false,"error":"unknown file extension for \"x\""}
+"""
+import os
+
+
+# name:(FirefoxFormats object -> callable) for every request the daemon accepts
+OPS={
+    'ping':lambda fff:lambda:'pong',
+    'fileExtensionToMime':lambda fff:fff.fileExtensionToMime,
+    'classify':lambda fff:lambda paths:[m for _,m in fff.classifyPaths(paths)],
+    'ext2mime':lambda fff:lambda:dict(fff.ext2mime),
+    'doUrl':lambda fff:fff.doUrl,
+    'doMime':lambda fff:fff.doMime,
+    'doExtn':lambda fff:lambda path,handler=None:_doExtn(fff,path,handler),
+    'list':lambda fff:lambda:repr(fff),
+    'json':lambda fff:lambda:fff.jsonDict,
+    'ndjson':lambda fff:lambda:_ndjson(fff),
+    }
+
+
+def _doExtn(fff,path,handler=None):
+    """
+    fff.doExtn(), but with the BatchSummary that opening a whole directory
+    gives turned into its jsonDict so it can be sent back
+    """
+    ret=fff.doExtn(path,handler)
+    if os.path.isdir(path):
+        return ret.jsonDict
+    return ret
+
+
+def _ndjson(fff):
+    """
+    get the newline-delimited json of a FirefoxFormats object as a string
+    """
+    import io
+    f=io.StringIO()
+    fff.writeNdjson(f)
+    return f.getvalue()
+
+
+def defaultSocketPath():
+    """
+    where the daemon listens unless told otherwise
+    (override with the FIREFOXFORMATS_SOCKET environment variable)
+    """
+    path=os.environ.get('FIREFOXFORMATS_SOCKET')
+    if path:
+        return path
+    runtimeDir=os.environ.get('XDG_RUNTIME_DIR')
+    if runtimeDir:
+        return os.path.join(runtimeDir,'firefoxFormats.sock')
+    import tempfile
+    uid=os.getuid() if hasattr(os,'getuid') else os.environ.get('USERNAME','')
+    return os.path.join(tempfile.gettempdir(),'firefoxFormats-%s.sock'%uid)
+
+
+def handleRequest(fff,line):
+    """
+    answer a single request line
+
+    :return: the response line
+    """
+    import json
+    try:
+        request=json.loads(line)
+        op=OPS.get(request.get('op'))
+        if op is None:
+            raise Exception('Unknown request "%s"'%request.get('op'))
+        # (encoded in here so a result json cannot handle is still answered)
+        return json.dumps({'ok':True,'result':op(fff)(*request.get('args',[]))})+'\n'
+    except Exception as e:
+        return json.dumps({'ok':False,'error':str(e)})+'\n'
+
+
+def serve(fff,socketPath=None,watch=True):
+    """
+    serve requests for a FirefoxFormats object until interrupted
+
+    :property fff: the FirefoxFormats object to serve
+    :property socketPath: the unix socket to listen on (default=defaultSocketPath())
+    :property watch: reload fff whenever its handlers.json changes on disk
+        (see _watch), so that answers do not go stale while the daemon runs
+    """
+    import socket
+    import socketserver
+    if not hasattr(socket,'AF_UNIX'):
+        raise Exception('Unix domain sockets are not supported on this platform')
+    if socketPath is None:
+        socketPath=defaultSocketPath()
+    # request threads share fff, and the watcher reloads it while they read it
+    fff.threadSafe=True
+    # load everything up front so request threads never race to do it
+    fff.ext2mime # pylint: disable=pointless-statement
+    fff.urlProtocolHandlers # pylint: disable=pointless-statement
+    watcher=None
+    if watch:
+        from ._watch import HandlersWatcher
+        watcher=HandlersWatcher(fff)
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        """
+        answers requests on one client connection
+        """
+        def handle(self):
+            for line in self.rfile:
+                self.wfile.write(handleRequest(fff,line).encode('utf-8'))
+                self.wfile.flush()
+
+    class Server(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+        """
+        a server with one thread per client connection
+        """
+        daemon_threads=True
+
+    if os.path.exists(socketPath):
+        if connectDaemon(socketPath) is not None:
+            raise Exception('A daemon is already listening on "%s"'%socketPath)
+        os.remove(socketPath) # left over from a daemon that died
+    oldUmask=os.umask(0o077)
+    try:
+        server=Server(socketPath,RequestHandler)
+    finally:
+        os.umask(oldUmask)
+    try:
+        if watcher is not None:
+            watcher.start()
+        print('Listening on',socketPath)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        server.server_close()
+        os.remove(socketPath)
+
+
+class DaemonClient:
+    """
+    Talks to a running daemon
+
+    Has the same lookup/dispatch methods as FirefoxFormats, so it can be
+    used in place of one.
+    """
+
+    def __init__(self,socketPath=None):
+        import socket
+        if socketPath is None:
+            socketPath=defaultSocketPath()
+        self.socketPath=socketPath
+        self._sock=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        try:
+            self._sock.connect(socketPath)
+        except OSError:
+            self._sock.close()
+            raise
+        self._rfile=self._sock.makefile('rb')
+
+    def close(self):
+        """
+        disconnect from the daemon
+        """
+        self._rfile.close()
+        self._sock.close()
+
+    def request(self,op,*args):
+        """
+        send a request to the daemon and get the result
+
+        :raises Exception: if the daemon reports an error
+        """
+        import json
+        data=json.dumps({'op':op,'args':args})+'\n'
+        self._sock.sendall(data.encode('utf-8'))
+        line=self._rfile.readline()
+        if not line:
+            raise Exception('Daemon at "%s" closed the connection'%self.socketPath)
+        response=json.loads(line)
+        if not response['ok']:
+            raise Exception(response['error'])
+        return response['result']
+
+    def fileExtensionToMime(self,path):
+        """
+        lookup the file extension of a given path
+        """
+        return self.request('fileExtensionToMime',path)
+
+    def classifyPaths(self,paths,chunkSize=1000):
+        """
+        find the mime types for a large number of paths
+        (sent to the daemon chunkSize paths at a time)
+        """
+        chunk=[]
+        for path in paths:
+            chunk.append(path)
+            if len(chunk)>=chunkSize:
+                yield from zip(chunk,self.request('classify',chunk))
+                chunk=[]
+        if chunk:
+            yield from zip(chunk,self.request('classify',chunk))
+
+    @property
+    def ext2mime(self):
+        """
+        file extenstion to mime type mapping dictionary
+        """
+        return self.request('ext2mime')
+
+    @property
+    def jsonDict(self):
+        """
+        a json-compatible dict
+        """
+        return self.request('json')
+
+    @property
+    def json(self):
+        """
+        a json string
+        """
+        import json
+        return json.dumps(self.jsonDict)
+
+    def writeJson(self,f):
+        """
+        write the json configuration to a file-like object
+        """
+        f.write(self.json)
+
+    def writeNdjson(self,f):
+        """
+        write the configuration as newline-delimited json to a file-like object
+        """
+        f.write(self.request('ndjson'))
+
+    def writeListing(self,f):
+        """
+        write the human-readable listing to a file-like object
+        """
+        f.write(self.request('list')+'\n')
+
+    def doUrl(self,url,handler=None):
+        """
+        have the daemon execute the handler for a url type
+        """
+        return self.request('doUrl',url,handler)
+
+    def doMime(self,url,mime=None,handler=None):
+        """
+        have the daemon execute the handler for a mime type
+
+        (a local path is made absolute since the daemon has its own working directory)
+        """
+        from ._firefoxFormats import isUrl
+        if not isUrl(url):
+            url=os.path.abspath(url)
+        return self.request('doMime',url,mime,handler)
+
+    def doExtn(self,path,handler=None):
+        """
+        have the daemon execute a handler based upon its file extension
+
+        (the path is made absolute since the daemon has its own working directory)
+
+        :return: for a directory, the totals of opening everything in it
+            (the jsonDict of a BatchSummary)
+        """
+        return self.request('doExtn',os.path.abspath(path),handler)
+
+    def __repr__(self):
+        return self.request('list')
+
+
+def connectDaemon(socketPath=None):
+    """
+    connect to the daemon if it is running
+
+    :return: a DaemonClient or None
+    """
+    if socketPath is None:
+        socketPath=defaultSocketPath()
+    if not os.path.exists(socketPath):
+        return None
+    import socket
+    if not hasattr(socket,'AF_UNIX'):
+        return None
+    try:
+        return DaemonClient(socketPath)
+    except OSError:
+        return None
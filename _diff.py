@@ -0,0 +1,207 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Compare many handlers.json files against a baseline
+
+Differences are found at the level of whole mime types/schemes, the
+handlers within them, and the individual fields of each.  Entries that
+match the baseline (usually the vast majority) are skipped as soon as
+comparing the parsed dicts says they are equal, and a file that is
+byte-for-byte the baseline is not even parsed.
+
+The differences are written out as newline-delimited json as each file
+is done, so memory does not grow with the number of files.
+
+Each output line is one of:
+    {"type": "diff", "profile": ..., "kind": "mimeTypes"|"schemes", "name": ...,
+        "change": "added"|"removed"|"modified", "fields": {...}, "handlers": {...}}
+    {"type": "diff", "profile": ..., "kind": "defaultHandlersVersion"|"extra", ...}
+    {"type": "error", "profile": ..., "error": ...}
+    {"type": "summary", "profile": ..., "differences": n}
+"""
+
+
+class DiffBaseline:
+    """
+    A baseline handlers.json, parsed once to compare everything against
+    """
+
+    def __init__(self,filename):
+        import json
+        import hashlib
+        with open(filename,'rb') as f:
+            data=f.read()
+        self.filename=filename
+        self.fileHash=hashlib.blake2b(data,digest_size=16).digest()
+        jsonDict=json.loads(data)
+        self.version=jsonDict.get('defaultHandlersVersion')
+        self.extra={k:v for k,v in jsonDict.items()
+            if k not in ('defaultHandlersVersion','mimeTypes','schemes')}
+        self.entries={} # kind:{name:rawDict}
+        for kind in ('mimeTypes','schemes'):
+            self.entries[kind]=jsonDict.get(kind) or {}
+
+
+def _handlerKey(handler):
+    """
+    what identifies a handler within an entry (its name, or failing that, its target)
+    """
+    if not handler:
+        return ''
+    return handler.get('name') or handler.get('path') or handler.get('uriTemplate') or ''
+
+
+def _fieldChanges(old,new,ignore=()):
+    """
+    {field:[old,new]} for every top-level field that differs
+    """
+    ret={}
+    for field in set(old)|set(new):
+        if field in ignore:
+            continue
+        if old.get(field)!=new.get(field):
+            ret[field]=[old.get(field),new.get(field)]
+    return ret
+
+
+def _handlerChanges(oldHandlers,newHandlers):
+    """
+    what happened to the handlers of an entry
+
+    :return: {"added":[...],"removed":[...],"modified":{key:{field:[old,new]}},
+        "reordered":bool} with empty parts left out
+    """
+    oldHandlers=oldHandlers or []
+    newHandlers=newHandlers or []
+    old={_handlerKey(h):h for h in oldHandlers}
+    new={_handlerKey(h):h for h in newHandlers}
+    ret={}
+    added=[new[k] for k in new if k not in old]
+    removed=[old[k] for k in old if k not in new]
+    modified={}
+    for k in old:
+        if k in new and old[k]!=new[k]:
+            modified[k]=_fieldChanges(old[k] or {},new[k] or {})
+    if added:
+        ret['added']=added
+    if removed:
+        ret['removed']=removed
+    if modified:
+        ret['modified']=modified
+    if [k for k in (_handlerKey(h) for h in oldHandlers) if k in new]!=\
+            [k for k in (_handlerKey(h) for h in newHandlers) if k in old]:
+        ret['reordered']=True # eg. a different default handler
+    return ret
+
+
+def diffJson(baseline,jsonDict,profile=None):
+    """
+    compare a parsed handlers.json against a baseline
+
+    :property baseline: a DiffBaseline
+    :property jsonDict: the parsed json to compare
+    :property profile: what to call this profile in the results
+
+    :return: generator of diff records
+    """
+    version=jsonDict.get('defaultHandlersVersion')
+    if version!=baseline.version:
+        yield {'type':'diff','profile':profile,'kind':'defaultHandlersVersion',
+            'change':'modified','fields':{'defaultHandlersVersion':[baseline.version,version]}}
+    extra={k:v for k,v in jsonDict.items() if k not in ('defaultHandlersVersion','mimeTypes','schemes')}
+    if extra!=baseline.extra:
+        yield {'type':'diff','profile':profile,'kind':'extra','change':'modified',
+            'fields':_fieldChanges(baseline.extra,extra)}
+    for kind in ('mimeTypes','schemes'):
+        base=baseline.entries[kind]
+        entries=jsonDict.get(kind) or {}
+        for name,raw in entries.items():
+            baseEntry=base.get(name)
+            if baseEntry is None:
+                yield {'type':'diff','profile':profile,'kind':kind,'name':name,
+                    'change':'added','value':raw}
+                continue
+            if baseEntry==raw:
+                continue
+            record={'type':'diff','profile':profile,'kind':kind,'name':name,'change':'modified'}
+            fields=_fieldChanges(baseEntry,raw,('handlers',))
+            if fields:
+                record['fields']=fields
+            handlers=_handlerChanges(baseEntry.get('handlers'),raw.get('handlers'))
+            if handlers:
+                record['handlers']=handlers
+            yield record
+        for name,baseEntry in base.items():
+            if name not in entries:
+                yield {'type':'diff','profile':profile,'kind':kind,'name':name,
+                    'change':'removed','value':baseEntry}
+
+
+def diffFile(baseline,filename):
+    """
+    compare a handlers.json file against a baseline
+
+    :return: list of records, ending with a summary (or an error)
+    """
+    import json
+    import hashlib
+    try:
+        with open(filename,'rb') as f:
+            data=f.read()
+        if hashlib.blake2b(data,digest_size=16).digest()==baseline.fileHash:
+            ret=[]
+        else:
+            ret=list(diffJson(baseline,json.loads(data),filename))
+    except (OSError,ValueError,AttributeError,TypeError) as e:
+        return [{'type':'error','profile':filename,'error':str(e)}]
+    ret.append({'type':'summary','profile':filename,'differences':len(ret)})
+    return ret
+
+
+def iterProfileFiles(paths):
+    """
+    yield every handlers.json-like (*.json) file in a list of files and directories
+    (files that are given are passed straight through)
+    """
+    from ._tree import walkTree
+    return walkTree(paths,include='*.json',jobs=1)
+
+
+def diffProfiles(baselineFilename,paths,report=None):
+    """
+    compare every profile in a list of files/directories against a baseline
+
+    :property baselineFilename: the golden handlers.json
+    :property paths: files and/or directories of *.json files to compare
+    :property report: called with each record as soon as its file is done
+        (default=collect them all into a list and return it)
+
+    :return: the list of records if there is no report callback, otherwise
+        how many files had differences
+    """
+    baseline=DiffBaseline(baselineFilename)
+    collected=None
+    if report is None:
+        collected=[]
+        report=collected.append
+    changed=0
+    for filename in iterProfileFiles(paths):
+        records=diffFile(baseline,filename)
+        if records[-1].get('differences',1):
+            changed+=1
+        for record in records:
+            report(record)
+    if collected is not None:
+        return collected
+    return changed
+
+
+def ndjsonReport(f):
+    """
+    get a report callback that writes records to a file-like object as ndjson
+    """
+    import json
+    encode=json.JSONEncoder(ensure_ascii=False).encode
+    def report(record):
+        f.write(encode(record)+'\n')
+    return report
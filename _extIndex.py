@@ -0,0 +1,160 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+File extension -> mime type index
+
+Extensions are matched case-insensitively against the file name only (dots in
+directory names are ignored) and the longest registered extension wins, so
+"archive.tar.gz" can map to something different than "x.gz".
+
+Rather than walking a suffix trie character by character, the index keeps a
+dict keyed on the lowercased extension and remembers the most dot-separated
+parts any registered extension has.  A lookup then only needs to probe that
+many suffixes of the file name, each being a single hash lookup.
+"""
+from collections.abc import Mapping
+
+
+def fileName(path):
+    """
+    the file name part of a path, for either / or \\ separators
+    """
+    return path[max(path.rfind('/'),path.rfind('\\'))+1:]
+
+
+def iterSuffixes(path,maxParts):
+    """
+    yield the candidate (lowercase) extensions of a path,
+    from the shortest to the longest
+
+    :property maxParts: the most dot-separated parts an extension can have
+    """
+    name=fileName(path).lower()
+    pos=len(name)
+    for _ in range(maxParts):
+        i=name.rfind('.',0,pos)
+        if i<0:
+            break
+        yield name[i+1:]
+        pos=i
+
+
+class ExtensionIndex(Mapping):
+    """
+    A mapping of (lowercase) file extension -> mime type
+    that can also find the mime type for a whole path
+    """
+
+    def __init__(self,items=None,fallback=None):
+        """
+        :property items: iterable of (extension,mimeType) pairs
+        :property fallback: {extension:mimeType} that is there to begin with
+            and that removed extensions go back to (eg. the system mime types)
+        """
+        self._ext2mime={}
+        self._owners={} # ext:[mimeTypes] only for extensions claimed by several
+        self._fallback=fallback
+        self.maxParts=0 # most dot-separated parts of any extension
+        if fallback:
+            self._ext2mime.update(fallback)
+            self.maxParts=max(ext.count('.') for ext in fallback)+1
+        if items is not None:
+            for ext,mimeType in items:
+                self.add(ext,mimeType)
+
+    def add(self,ext,mimeType):
+        """
+        add an extension
+
+        If the extension is already claimed by another mime type, the
+        newest one wins, but the others are remembered in case it is removed.
+        """
+        ext=ext.lower()
+        current=self._ext2mime.get(ext)
+        if current is not None and current!=mimeType:
+            owners=self._owners.setdefault(ext,[current])
+            if mimeType in owners:
+                owners.remove(mimeType)
+            owners.append(mimeType)
+        self._ext2mime[ext]=mimeType
+        parts=ext.count('.')+1
+        if parts>self.maxParts:
+            self.maxParts=parts
+
+    def remove(self,ext,mimeType=None):
+        """
+        remove an extension (if it is there)
+
+        :property mimeType: only remove the extension from this mime type,
+            falling back to any other mime type that also claims it
+            (or failing that, to the fallback)
+        """
+        ext=ext.lower()
+        owners=self._owners.get(ext)
+        if mimeType is None or owners is None:
+            if mimeType is None or self._ext2mime.get(ext)==mimeType:
+                self._ext2mime.pop(ext,None)
+                self._owners.pop(ext,None)
+                if self._fallback and ext in self._fallback:
+                    self._ext2mime[ext]=self._fallback[ext]
+            return
+        if mimeType in owners:
+            owners.remove(mimeType)
+        self._ext2mime[ext]=owners[-1]
+        if len(owners)<2:
+            del self._owners[ext]
+
+    def copy(self):
+        """
+        an independent copy of this index
+        """
+        ret=ExtensionIndex()
+        ret._ext2mime=dict(self._ext2mime)
+        ret._owners={ext:list(owners) for ext,owners in self._owners.items()}
+        ret._fallback=self._fallback # never changed, so can be shared
+        ret.maxParts=self.maxParts
+        return ret
+
+    def lookup(self,path):
+        """
+        find the mime type for the longest registered extension of a path
+
+        :return: the mime type or None
+        """
+        name=path[max(path.rfind('/'),path.rfind('\\'))+1:].lower()
+        get=self._ext2mime.get
+        pos=len(name)
+        found=None
+        for _ in range(self.maxParts):
+            i=name.rfind('.',0,pos)
+            if i<0:
+                break
+            mimeType=get(name[i+1:])
+            if mimeType is not None:
+                found=mimeType
+            pos=i
+        return found
+
+    def classify(self,paths):
+        """
+        yield (path,mimeType) for each path in an iterable
+        (mimeType is None if it is not known)
+        """
+        lookup=self.lookup
+        for path in paths:
+            yield path,lookup(path)
+
+    def __getitem__(self,ext):
+        return self._ext2mime[ext.lower()]
+
+    def __contains__(self,ext):
+        return ext.lower() in self._ext2mime
+
+    def __iter__(self):
+        return iter(self._ext2mime)
+
+    def __len__(self):
+        return len(self._ext2mime)
+
+    def __repr__(self):
+        return repr(self._ext2mime)
@@ -4,43 +4,96 @@
 This program is used to schmooze formats from firefox and add new ones
 """
 import os
-import subprocess
-import json
+import sys
+from enum import IntEnum
+from collections.abc import MutableMapping
+
+
+def _sibling(name):
+    """
+    import one of the other modules in this package
+    (works both as a package and when this file is run as a script)
+    """
+    import importlib
+    return importlib.import_module('.'+name,__package__ or _scriptPackage())
+
+
+# what the package is called when this file is run as a script
+SCRIPT_PACKAGE='_firefoxFormatsScript'
+
+
+def _scriptPackage():
+    """
+    when this file is run as a script there is no package for the other
+    modules' relative imports to be relative to, so make one up that holds
+    the directory this file is in (with this module as its _firefoxFormats,
+    so that it does not get imported a second time)
+
+    :return: the name of the package
+    """
+    if SCRIPT_PACKAGE not in sys.modules:
+        import types
+        package=types.ModuleType(SCRIPT_PACKAGE)
+        package.__path__=[os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[SCRIPT_PACKAGE]=package
+        sys.modules[SCRIPT_PACKAGE+'._firefoxFormats']=sys.modules[__name__]
+    return SCRIPT_PACKAGE
+
+
+def _timed(phase):
+    """
+    time a phase of the work (see _stats.timed())
+    """
+    global _stats
+    if _stats is None:
+        _stats=_sibling('_stats')
+    return _stats.timed(phase)
+_stats=None
 
 
 def getFirefoxProfilePath(osUser=None,profileId=None):
     """
-    get the path to a firefox profile
+    get the path to a firefox profile (with a trailing path separator)
+
     :property osUser: user on the os to find (default=current user)
-    :property profileId: firefox profile id (default=first with shortest name)
-
-    TODO: only works on windows
-    """
-    path=os.environ['appdata']
-    if osUser is not None:
-        path=path.replace('\\%s\\'%os.environ['USERNAME'],'\\%s\\'%osUser)
-    path=path+'\\Mozilla\\Firefox\\Profiles\\'
-    if profileId is None:
-        # find one
-        profiles=[]
-        selectedProfile=None
-        for filename in os.listdir(path):
-            filename=path+filename
-            if os.path.isdir(filename) and filename.find('.default')>=0:
-                profiles.append(filename)
-                if selectedProfile is None or len(filename)<len(selectedProfile):
-                    selectedProfile=filename
-        if not profiles:
-            raise Exception('WARN: no firefox profiles found in "%s"'%path)
-        if len(profiles)>1:
-            print('WARN: Multiple profiles to choose from:')
-            for p in profiles:
-                print(' ',p.rsplit('\\',1)[-1])
-            print('Choosing:',selectedProfile.rsplit('\\',1)[-1])
-        path=selectedProfile+'\\'
-    else:
-        path=path+profileId+'\\'
-    return path
+    :property profileId: firefox profile id (default=the one firefox uses,
+        according to installs.ini/profiles.ini)
+
+    See also _profiles.findProfile(), listProfiles() and listAllProfiles()
+    """
+    with _timed('discover'):
+        return os.path.join(_sibling('_profiles').findProfile(osUser,profileId),'')
+
+
+def _intern(s):
+    """
+    intern a string (these repeat a lot, eg. the same application path
+    shows up in many handlers) and leave anything else alone
+    """
+    if isinstance(s,str):
+        return sys.intern(s)
+    return s
+
+
+class HandlerAction(IntEnum):
+    """
+    What firefox does with a given mime type or url protocol
+    """
+    EXECUTE_OS_DEFAULT_APPLICATION=0
+    MYSTERY=1 # TODO: I have never seen this set
+    EXECUTE_APPLICATION=2
+    OPEN_IN_FIREFOX=3
+    EXECUTE_APPLICATION_X=4 # TODO: don't know what the difference is
+
+
+def isUrl(urlOrPath):
+    """
+    determine whether something is a url (as opposed to a local file path)
+    """
+    proto=urlOrPath.split(':',1)
+    if len(proto)<2 or len(proto[0])<2: # single letters are windows drives
+        return False
+    return proto[0].replace('+','').replace('-','').replace('.','').isalnum()
 
 
 class FirefoxHandler:
@@ -51,21 +104,26 @@ class FirefoxHandler:
     or a uriTemplate url linking to a webservice.
     """
 
-    def __init__(self,name='',path=None,uriTemplate=None):
-        self.name=name
+    __slots__=('name','mimeType','urlProtocol','path','uriTemplate','extra')
+
+    def __init__(self,name='',path=None,uriTemplate=None,**extra):
+        self.name=_intern(name)
         self.mimeType=None # if this is a mimeType hanler, this is the type
         self.urlProtocol=None # if this is a urlProtocol type handler, this is the url protocol (without ":")
-        self.path=path # if present, the path to the file that will handle this protocol
-        self.uriTemplate=uriTemplate # if present, the webservice that will handle this protocol
+        self.path=_intern(path) # if present, the path to the file that will handle this protocol
+        self.uriTemplate=_intern(uriTemplate) # if present, the webservice that will handle this protocol
+        self.extra=extra or None # any json values we do not know about, kept so they can be saved back
 
     @property
     def json(self):
         """
         a json string
         """
+        import json
         return json.dumps(self.jsonDict)
     @json.setter
     def json(self,jsonString):
+        import json
         self.jsonDict=json.loads(jsonString)
 
     @property
@@ -80,12 +138,16 @@ class FirefoxHandler:
             ret['path']=self.path
         if self.uriTemplate is not None:
             ret['uriTemplate']=self.uriTemplate
+        if self.extra:
+            ret.update(self.extra)
         return ret
     @jsonDict.setter
     def jsonDict(self,jsonDict):
-        self.name=jsonDict.get('name')
-        self.path=jsonDict.get('path')
-        self.uriTemplate=jsonDict.get('uriTemplate')
+        jsonDict=dict(jsonDict)
+        self.name=_intern(jsonDict.pop('name',None))
+        self.path=_intern(jsonDict.pop('path',None))
+        self.uriTemplate=_intern(jsonDict.pop('uriTemplate',None))
+        self.extra=jsonDict or None
 
     def getCallString(self,url):
         """
@@ -110,23 +172,120 @@ class FirefoxHandler:
                 raise NotImplementedError("no \%s in handler - not sure what to do.\n  Handler = %s"%ret)
         return ret
 
+    def getCallArgs(self,url):
+        """
+        get the argument list that runs this handler's application with this url
+        (None if the handler is a webservice)
+        """
+        if self.path is None:
+            return None
+        if self.path.find('%%s')<0:
+            return [self.path,url]
+        import shlex
+        ret=[]
+        for arg in shlex.split(self.path,posix=os.name!='nt'):
+            if len(arg)>1 and arg[0]=='"' and arg[-1]=='"': # windows keeps the quotes
+                arg=arg[1:-1]
+            ret.append(arg.replace('%%s',url))
+        return ret
+
+    @property
+    def acceptsMany(self):
+        """
+        whether this handler is an application that takes its files as
+        trailing arguments, so that many can be opened with one process
+
+        (only applications known to open every file they are given, see
+        _launch.MULTI_FILE_APPLICATIONS; plenty only open the first one)
+        """
+        if self.path is None or self.path.find('%%s')>=0:
+            return False
+        return _sibling('_launch').takesManyFiles(self.path)
+
+    def getCallStringMany(self,urls):
+        """
+        get the string for calling this handler once with many urls
+
+        (only makes sense if acceptsMany)
+        """
+        if not self.acceptsMany:
+            raise Exception('Handler "%s" can only be called with one url at a time'%self.name)
+        import shlex
+        return ' '.join([self.path]+[shlex.quote(url) for url in urls])
+
+    def getCallArgsMany(self,urls):
+        """
+        get the argument list for calling this handler once with many urls
+
+        (only makes sense if acceptsMany)
+        """
+        if not self.acceptsMany:
+            raise Exception('Handler "%s" can only be called with one url at a time'%self.name)
+        return [self.path]+list(urls)
+
+    @staticmethod
+    def _spawn(args,callString):
+        """
+        run a handler application and wait for it
+
+        Its output (and what is being run) goes to stderr, so that it does
+        not get mixed up with anything written to stdout, like batch reports.
+
+        :property args: what to pass to subprocess.Popen()
+        :property callString: what to call it in messages
+
+        Raises an Exception if the application exits with an error
+        """
+        import subprocess
+        print('Executing:',callString,file=sys.stderr)
+        with _timed('spawn'):
+            po=subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+            out,_=po.communicate()
+        if out:
+            sys.stderr.write(out.decode('utf-8','replace'))
+        if po.returncode!=0:
+            raise Exception('"%s" exited with code %d'%(callString,po.returncode))
+
     def __call__(self,url):
         """
         call this like a function, using data at a url as the input
+
+        Raises an Exception if the handler application exits with an error
         """
         cs=self.getCallString(url)
         if cs is None:
             raise Exception('Unable to run "%s" with no associated application or webservice uri to call'%url)
         if self.path is not None:
-            print('Executing:',cs)
-            po=subprocess.Popen(cs,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-            out,_=po.communicate()
-            print(out)
+            self._spawn(self.getCallArgs(url),cs)
         else:
             import webbrowser
-            print('Opening URL:',cs)
+            print('Opening URL:',cs,file=sys.stderr)
             webbrowser.open(cs)
 
+    def callMany(self,urls):
+        """
+        call this handler once with many urls (only makes sense if acceptsMany)
+
+        Use _launch.chunkArgs() to keep the argument list within the os limit.
+        """
+        self._spawn(self.getCallArgsMany(urls),self.getCallStringMany(urls))
+
+    async def acall(self,url,timeout=None):
+        """
+        awaitable version of calling this handler
+
+        :property url: the url/path to pass to the handler
+        :property timeout: seconds to wait for the handler (None=forever)
+
+        :return: a HandlerResult rather than printing the output
+        """
+        cs=self.getCallString(url)
+        if cs is None:
+            raise Exception('Unable to run "%s" with no associated application or webservice uri to call'%url)
+        if self.path is not None:
+            return await _sibling('_async').runCommand(self.getCallArgs(url),timeout,cs)
+        return await _sibling('_async').openBrowser(cs,timeout)
+
     @property
     def target(self):
         """
@@ -160,18 +319,21 @@ class FirefoxHandlerSet:
     There can be multiple handlers for a given type
     """
 
-    ACTION_EXECUTE_OS_DEFAULT_APPLICATION=0
-    ACTION_MYSTERY=1 # TODO: I have never seen this set
-    ACTION_EXECUTE_APPLICATION=2
-    ACTION_OPEN_IN_FIREFOX=3
-    ACTION_EXECUTE_APPLICATION_X=4 # TODO: don't know what the difference is
+    ACTION_EXECUTE_OS_DEFAULT_APPLICATION=HandlerAction.EXECUTE_OS_DEFAULT_APPLICATION
+    ACTION_MYSTERY=HandlerAction.MYSTERY
+    ACTION_EXECUTE_APPLICATION=HandlerAction.EXECUTE_APPLICATION
+    ACTION_OPEN_IN_FIREFOX=HandlerAction.OPEN_IN_FIREFOX
+    ACTION_EXECUTE_APPLICATION_X=HandlerAction.EXECUTE_APPLICATION_X
+
+    __slots__=('name','extensions','_action','stubEntry','ask','extra','handlers')
 
-    def __init__(self,name='',extensions=None,handlers=None,action=None,stubEntry=False,ask=False):
-        self.name=name # can sometimes be empty
+    def __init__(self,name='',extensions=None,handlers=None,action=None,stubEntry=False,ask=False,**extra):
+        self.name=_intern(name) # can sometimes be empty
         self.extensions=extensions # any file extensions associated with this
         self.action=action # one of the FirefoxHandlerSet.ACTION_* constants
         self.stubEntry=stubEntry # TODO: not sure what this means
         self.ask=ask # whether or not to prompt the user - we don't care about this
+        self.extra=extra or None # any json values we do not know about, kept so they can be saved back
         self.handlers=[]
         if handlers is not None:
             for h in handlers:
@@ -181,6 +343,22 @@ class FirefoxHandlerSet:
                     h=FirefoxHandler(**h)
                 self.handlers.append(h)
 
+    @property
+    def action(self):
+        """
+        one of the FirefoxHandlerSet.ACTION_* constants (a HandlerAction)
+        or a plain int if it is a value we do not know about
+        """
+        return self._action
+    @action.setter
+    def action(self,action):
+        if action is not None:
+            try:
+                action=HandlerAction(action)
+            except ValueError:
+                pass
+        self._action=action
+
     @property
     def actionName(self):
         """
@@ -220,19 +398,24 @@ class FirefoxHandlerSet:
             ret['ask']=self.ask
         handlers=[]
         for handler in self.handlers:
-            handlers.append(handler.jsonDict)
+            # an empty handler was a null in the original json
+            handlers.append(handler.jsonDict or None)
         if handlers:
             ret['handlers']=handlers
+        if self.extra:
+            ret.update(self.extra)
         return ret
     @jsonDict.setter
     def jsonDict(self,jsonDict):
-        self.name=jsonDict.get('name')
-        self.extensions=jsonDict.get('extensions')
-        self.action=jsonDict.get('action')
-        self.stubEntry=jsonDict.get('stubEntry',False)
-        self.ask=jsonDict.get('ask',False)
+        jsonDict=dict(jsonDict)
+        self.name=_intern(jsonDict.pop('name',None))
+        self.extensions=jsonDict.pop('extensions',None)
+        self.action=jsonDict.pop('action',None)
+        self.stubEntry=jsonDict.pop('stubEntry',False)
+        self.ask=jsonDict.pop('ask',False)
         self.handlers=[]
-        handlers=jsonDict.get('handlers')
+        handlers=jsonDict.pop('handlers',None)
+        self.extra=jsonDict or None
         if handlers is not None:
             for h in handlers:
                 if h is None: # not sure what this means
@@ -246,9 +429,11 @@ class FirefoxHandlerSet:
         """
         a json string
         """
+        import json
         return json.dumps(self.jsonDict)
     @json.setter
     def json(self,jsonString):
+        import json
         self.jsonDict=json.loads(jsonString)
 
     def getHandler(self,handlerName=None):
@@ -278,14 +463,38 @@ class FirefoxHandlerSet:
             webbrowser.open(url)
         elif self.action==self.ACTION_EXECUTE_OS_DEFAULT_APPLICATION:
             # TODO: only works on windows
+            import subprocess
             po=subprocess.Popen(['start',url],shell=True,
                 stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
             out,_=po.communicate()
-            print(out)
+            if out:
+                sys.stderr.write(out.decode('utf-8','replace'))
+            if po.returncode!=0:
+                raise Exception('Opening "%s" failed with code %d'%(url,po.returncode))
         else:
             raise Exception('Unknown action %d'%self.action)
         return ''
 
+    async def acall(self,url,handlerName=None,timeout=None):
+        """
+        awaitable version of calling this like a function
+
+        if handlerName is None, use the default handler for this type
+
+        :return: a HandlerResult rather than printing the output
+        """
+        asyncTools=_sibling('_async')
+        if self.action in (self.ACTION_EXECUTE_APPLICATION,self.ACTION_EXECUTE_APPLICATION_X):
+            return await self.getHandler(handlerName).acall(url,timeout)
+        if self.action==self.ACTION_OPEN_IN_FIREFOX:
+            return await asyncTools.openBrowser(url,timeout)
+        if self.action==self.ACTION_EXECUTE_OS_DEFAULT_APPLICATION:
+            # TODO: only works on windows
+            import subprocess
+            cs=subprocess.list2cmdline(['start',url])
+            return await asyncTools.runCommand(cs,timeout)
+        raise Exception('Unknown action %d'%self.action)
+
     def __repr__(self,indent=''):
         ret=[]
         if self.name:
@@ -302,6 +511,168 @@ class FirefoxHandlerSet:
         return indent+(('\n'+indent).join(ret))
 
 
+class LazyHandlerSets(MutableMapping):
+    """
+    A mapping of names to FirefoxHandlerSet objects that only builds
+    each entry from the raw json the first time it is accessed
+    """
+
+    def __init__(self,rawDict=None):
+        if rawDict is None:
+            rawDict={}
+        self._raw=rawDict # name:json-compatible dict
+        self._built={} # name:FirefoxHandlerSet for entries accessed so far
+
+    def __getitem__(self,name):
+        handlerSet=self._built.get(name)
+        if handlerSet is None:
+            handlerSet=FirefoxHandlerSet(**self._raw[name])
+            self._built[name]=handlerSet
+        return handlerSet
+
+    def __setitem__(self,name,handlerSet):
+        self._raw[name]=None
+        self._built[name]=handlerSet
+
+    def __delitem__(self,name):
+        del self._raw[name]
+        self._built.pop(name,None)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __contains__(self,name):
+        return name in self._raw
+
+    def raw(self,name):
+        """
+        the raw json-compatible dict for an entry that has not been built yet
+        (None if it has been built)
+        """
+        if name in self._built:
+            return None
+        return self._raw[name]
+
+    def setRaw(self,name,rawDict):
+        """
+        replace an entry with raw json data, to be built when next accessed
+        """
+        self._raw[name]=rawDict
+        self._built.pop(name,None)
+
+    def copy(self):
+        """
+        an independent copy of this mapping (the FirefoxHandlerSet objects are shared)
+        """
+        ret=LazyHandlerSets(dict(self._raw))
+        ret._built=dict(self._built)
+        return ret
+
+    def itemsUncached(self):
+        """
+        yield (name,FirefoxHandlerSet) for every entry, without keeping
+        the ones that had to be built (for one-pass things like saving)
+        """
+        for name,raw in self._raw.items():
+            handlerSet=self._built.get(name)
+            if handlerSet is None:
+                handlerSet=FirefoxHandlerSet(**raw)
+            yield name,handlerSet
+
+    def extensionItems(self):
+        """
+        yield (name,extensions) for every entry without building anything
+        """
+        for name,raw in self._raw.items():
+            handlerSet=self._built.get(name)
+            if handlerSet is not None:
+                yield name,handlerSet.extensions
+            else:
+                yield name,raw.get('extensions')
+
+
+class ModelSnapshot:
+    """
+    Everything loaded from a profile, as one object so that it can be
+    swapped for a new one all at once
+
+    In threadSafe mode a snapshot is never changed once other threads can
+    see it (apart from filling in ext2mime and reverseIndex, which are
+    derived from the rest); edits are made to a copy() which then replaces it.
+    """
+
+    __slots__=('version','mimeTypeHandlers','urlProtocolHandlers','extra','ext2mime','reverseIndex')
+
+    def __init__(self):
+        self.version=None
+        self.mimeTypeHandlers=None
+        self.urlProtocolHandlers=None
+        self.extra=None
+        self.ext2mime=None # derived from mimeTypeHandlers when first needed
+        self.reverseIndex=None # derived from everything when first needed
+
+    def copy(self):
+        """
+        a copy that can be edited without disturbing this one
+        """
+        ret=ModelSnapshot()
+        ret.version=self.version
+        ret.extra=self.extra
+        for name in ('mimeTypeHandlers','urlProtocolHandlers','ext2mime','reverseIndex'):
+            value=getattr(self,name)
+            if value is not None:
+                value=value.copy()
+            setattr(ret,name,value)
+        return ret
+
+
+def _modelField(name):
+    """
+    a property for one field of a FirefoxFormats object's current ModelSnapshot
+    """
+    def getter(self):
+        return getattr(self._model,name)
+    def setter(self,value):
+        setattr(self._model,name,value)
+    return property(getter,setter)
+
+
+class ModelChanges:
+    """
+    What changed when a FirefoxFormats model was updated
+    """
+
+    def __init__(self):
+        self.addedMimeTypes=[]
+        self.removedMimeTypes=[]
+        self.modifiedMimeTypes=[]
+        self.addedSchemes=[]
+        self.removedSchemes=[]
+        self.modifiedSchemes=[]
+
+    def forKind(self,kind):
+        """
+        get the (added,removed,modified) lists for 'mimeTypes' or 'schemes'
+        """
+        if kind=='mimeTypes':
+            return self.addedMimeTypes,self.removedMimeTypes,self.modifiedMimeTypes
+        return self.addedSchemes,self.removedSchemes,self.modifiedSchemes
+
+    def __bool__(self):
+        return any(self.forKind('mimeTypes')) or any(self.forKind('schemes'))
+
+    def __repr__(self):
+        ret=[]
+        for kind in ('mimeTypes','schemes'):
+            for what,names in zip(('added','removed','modified'),self.forKind(kind)):
+                for name in names:
+                    ret.append('%s %s: %s'%(what,kind[:-1],name))
+        return '\n'.join(ret)
+
+
 class FirefoxFormats:
     """
     This program is used to schmooze formats from firefox and add new ones
@@ -320,24 +691,162 @@ class FirefoxFormats:
         https://docs.microsoft.com/en-us/microsoftteams/platform/concepts/build-and-test/deep-links
     """
 
-    def __init__(self,filename=None,osUser=None,profileId=None):
+    _version=_modelField('version')
+    _mimeTypeHandlers=_modelField('mimeTypeHandlers')
+    _urlProtocolHandlers=_modelField('urlProtocolHandlers')
+    _extra=_modelField('extra')
+    _ext2mime=_modelField('ext2mime')
+    _reverseIndex=_modelField('reverseIndex')
+
+    def __init__(self,filename=None,osUser=None,profileId=None,useCache=None,lazy=False,
+            threadSafe=False,mimeLayers=None):
+        """
+        :property lazy: only build FirefoxHandlerSet objects for the entries
+            that are actually used, rather than all of them on load
+        :property mimeLayers: where ext2mime gets file extensions from, highest
+            precedence first (default=_mimeDb.MIME_LAYERS, that is the profile,
+            then mime.types, then shared-mime-info, then a built-in table)
+        :property threadSafe: allow one object to be shared between threads.
+            Only one thread ever loads the profile (the others wait for it),
+            and edits/reloads are made to a copy of the model that is then
+            swapped in, so readers never need a lock and never see half an edit.
+            Use snapshot() to get a view that will not change at all.
+        :property useCache: keep a parsed copy of the profile on disk to speed
+            up the next load (default is on unless the FIREFOXFORMATS_NO_CACHE
+            environment variable is set)
+        """
+        if useCache is None:
+            useCache=_sibling('_cache').cacheEnabled()
+        self.useCache=useCache
+        self.lazy=lazy
         self._osUser=osUser
         self._profileId=profileId
         self._filename=filename
+        self._model=ModelSnapshot()
+        self._httpMime=None
+        self._mimeLayers=mimeLayers
+        self._lock=None
+        self.threadSafe=threadSafe
+
+    @property
+    def threadSafe(self):
+        """
+        whether this object can be shared between threads (see __init__)
+        """
+        return self._lock is not None
+    @threadSafe.setter
+    def threadSafe(self,threadSafe):
+        if not threadSafe:
+            self._lock=None
+        elif self._lock is None:
+            import threading
+            self._lock=threading.RLock()
+
+    @property
+    def mimeLayers(self):
+        """
+        where ext2mime gets file extensions from, highest precedence first
+        (see _mimeDb for the layer names)
+        """
+        if self._mimeLayers is None:
+            return _sibling('_mimeDb').MIME_LAYERS
+        return self._mimeLayers
+    @mimeLayers.setter
+    def mimeLayers(self,mimeLayers):
+        if self.threadSafe:
+            with self._lock:
+                model=self._model.copy()
+                model.ext2mime=None
+                self._mimeLayers=mimeLayers
+                self._model=model
+            return
+        self._mimeLayers=mimeLayers
         self._ext2mime=None
-        self._mimeTypeHandlers=None
-        self._urlProtocolHandlers=None
-        self._version=None
 
     def _clear(self):
         """
         clearing data will force a reload next time anything is requested
         """
         self._filename=None
-        self._ext2mime=None
-        self._mimeTypeHandlers=None
-        self._urlProtocolHandlers=None
-        self._version=None
+        self._model=ModelSnapshot()
+
+    def _loadOnce(self):
+        """
+        load if nothing is loaded yet
+
+        (in threadSafe mode, if several threads get here at once
+        only the first loads and the rest wait for it)
+        """
+        if not self.threadSafe:
+            self.load()
+            return
+        with self._lock:
+            if self._filename is None or self._model.mimeTypeHandlers is None:
+                self.load()
+
+    def _copyOnWrite(self,method,*args,fresh=False):
+        """
+        in threadSafe mode, run a method that changes the model on a copy
+        of this object and its model, then swap the new model in at once
+
+        :property method: the (unbound) method to run
+        :property fresh: start with an empty model rather than a copy
+            (for things that replace the whole model anyway)
+
+        :return: whatever the method returned
+        """
+        import copy
+        with self._lock:
+            shadow=copy.copy(self)
+            shadow.threadSafe=False
+            if fresh:
+                shadow._model=ModelSnapshot()
+            else:
+                shadow._model=self._model.copy()
+            ret=method(shadow,*args)
+            self._filename=shadow._filename
+            self._model=shadow._model
+        return ret
+
+    def snapshot(self):
+        """
+        get a view of the model as it is right now that later edits and
+        reloads will not change (it can be edited, but that only changes
+        the snapshot)
+
+        :return: a threadSafe FirefoxFormats object
+        """
+        import copy
+        self._loadOnce()
+        ret=copy.copy(self)
+        ret._lock=None
+        # its own model (and handler dicts), since unless this object is
+        # threadSafe its edits are made to the model in place
+        if self.threadSafe:
+            with self._lock:
+                ret._model=self._model.copy()
+        else:
+            ret._model=self._model.copy()
+        ret.threadSafe=True
+        return ret
+
+    @property
+    def filename(self):
+        """
+        the handlers.json file (default=the one in the selected profile)
+        """
+        if self._filename is None:
+            self._loadOnce()
+        return self._filename
+    @filename.setter
+    def filename(self,filename):
+        if self.threadSafe:
+            with self._lock:
+                self._clear()
+                self._filename=filename
+            return
+        self._clear()
+        self._filename=filename
 
     @property
     def osUser(self):
@@ -347,6 +856,11 @@ class FirefoxFormats:
         return self._osUser
     @osUser.setter
     def osUser(self,osUser):
+        if self.threadSafe:
+            with self._lock:
+                self._osUser=osUser
+                self._clear()
+            return
         self._osUser=osUser
         self._clear()
 
@@ -358,6 +872,11 @@ class FirefoxFormats:
         return self._profileId
     @profileId.setter
     def profileId(self,profileId):
+        if self.threadSafe:
+            with self._lock:
+                self._profileId=profileId
+                self._clear()
+            return
         self._profileId=profileId
         self._clear()
 
@@ -367,39 +886,89 @@ class FirefoxFormats:
         """
         handlers for a certain mime type
         """
-        if self._mimeTypeHandlers is None:
-            self.load()
-        return self._mimeTypeHandlers
+        model=self._model
+        if model.mimeTypeHandlers is None:
+            self._loadOnce()
+            model=self._model
+        return model.mimeTypeHandlers
     @property
     def urlProtocolHandlers(self):
         """
         handlers for a certain url type (eg. ftp: mailto: etc)
         """
-        if self._urlProtocolHandlers is None:
-            self.load()
-        return self._urlProtocolHandlers
+        model=self._model
+        if model.urlProtocolHandlers is None:
+            self._loadOnce()
+            model=self._model
+        return model.urlProtocolHandlers
     @property
     def version(self):
         """
         the version of this format
         """
-        if self._version is None:
-            self.load()
-        return self._version
+        model=self._model
+        if model.version is None:
+            self._loadOnce()
+            model=self._model
+        return model.version
 
     @property
     def ext2mime(self):
         """
-        file extenstion to mime type mapping dictionary
+        file extenstion to mime type mapping (an ExtensionIndex)
+
+        This has the extensions from every one of the mimeLayers, merged so
+        that a lookup is still one probe per candidate extension.
         """
-        if self._ext2mime is None:
-            self._ext2mime={}
-            for mimeType,handlers in self.mimeTypeHandlers.items():
-                extensions=handlers.extensions
-                if extensions is not None:
-                    for ext in extensions:
-                        self._ext2mime[ext]=mimeType
-        return self._ext2mime
+        model=self._model
+        if model.mimeTypeHandlers is None:
+            self._loadOnce()
+            model=self._model
+        if model.ext2mime is None:
+            # (built from one snapshot and stored in that same snapshot,
+            # even if another thread swaps in a new one meanwhile)
+            mimeTypeHandlers=model.mimeTypeHandlers
+            with _timed('ext2mime'):
+                if isinstance(mimeTypeHandlers,LazyHandlerSets):
+                    items=mimeTypeHandlers.extensionItems()
+                else:
+                    items=((k,v.extensions) for k,v in mimeTypeHandlers.items())
+                compiled=_sibling('_mimeDb').compileLayers(self.mimeLayers)
+                ext2mime=_sibling('_extIndex').ExtensionIndex(fallback=compiled.below)
+                if compiled.withFirefox:
+                    for mimeType,extensions in items:
+                        if extensions is not None:
+                            for ext in extensions:
+                                ext2mime.add(ext,mimeType)
+                for ext,mimeType in compiled.above.items():
+                    ext2mime.add(ext,mimeType)
+            model.ext2mime=ext2mime
+        return model.ext2mime
+
+    @property
+    def reverseIndex(self):
+        """
+        handler application, action and webservice host -> entries
+        (a ReverseIndex, built the first time it is asked for and then
+        kept up to date as entries are changed)
+        """
+        model=self._model
+        if model.mimeTypeHandlers is None:
+            self._loadOnce()
+            model=self._model
+        if model.reverseIndex is None:
+            with _timed('reverseIndex'):
+                reverseIndex=_sibling('_reverseIndex').ReverseIndex()
+                for kind,entries in (('mimeTypes',model.mimeTypeHandlers),
+                        ('schemes',model.urlProtocolHandlers)):
+                    lazy=isinstance(entries,LazyHandlerSets)
+                    for name in entries:
+                        entry=entries.raw(name) if lazy else None
+                        if entry is None:
+                            entry=entries[name]
+                        reverseIndex.add(kind,name,entry)
+            model.reverseIndex=reverseIndex
+        return model.reverseIndex
 
     def load(self,filename=None):
         """
@@ -407,29 +976,188 @@ class FirefoxFormats:
 
         (Called automatically as needed)
         """
+        if self.threadSafe:
+            return self._copyOnWrite(FirefoxFormats.load,filename,fresh=True)
         if filename is None:
             if self._filename is None:
                 # find the current profile
                 currentProfile=getFirefoxProfilePath(self.osUser,self.profileId)
                 self._filename='%shandlers.json'%(currentProfile)
-                print('Loading firefox profile:\n  %s'%self._filename)
+                print('Loading firefox profile:\n  %s'%self._filename,file=sys.stderr)
             filename=self._filename
         else:
             self._filename=filename
-        f=open(filename,'rb')
-        data=f.read()
-        f.close()
+        cacheKind='lazymodel' if self.lazy else 'model'
+        if self.useCache:
+            cache=_sibling('_cache')
+            with _timed('cacheLoad'):
+                model=cache.loadCached(filename,cacheKind)
+            if model is not None:
+                self._ext2mime=None
+                self._reverseIndex=None
+                self._version,self._mimeTypeHandlers,self._urlProtocolHandlers,self._extra=model
+                return
+        with _timed('read'):
+            with open(filename,'rb') as f:
+                # taken before reading, so that a change made while we read
+                # leaves the cache looking out of date rather than up to date
+                signature=_sibling('_cache').fileSignature(f.fileno())
+                data=f.read()
         self.json=data
+        if self.useCache:
+            model=(self._version,self._mimeTypeHandlers,self._urlProtocolHandlers,self._extra)
+            cache.saveCached(filename,model,cacheKind,signature=signature)
+
+    def reload(self):
+        """
+        re-read the profile and update only the entries that changed
+
+        :return: ModelChanges saying what changed
+        """
+        if self.threadSafe:
+            return self._copyOnWrite(FirefoxFormats.reload)
+        if self._filename is None or self._mimeTypeHandlers is None:
+            self.load()
+            return ModelChanges()
+        cache=_sibling('_cache')
+        with open(self._filename,'rb') as f:
+            signature=cache.fileSignature(f.fileno())
+            data=f.read()
+        import json
+        changes=self.update(json.loads(data))
+        if self.useCache:
+            model=(self._version,self._mimeTypeHandlers,self._urlProtocolHandlers,self._extra)
+            cache.saveCached(self._filename,model,
+                'lazymodel' if self.lazy else 'model',signature=signature)
+        return changes
+
+    def update(self,jsonDict):
+        """
+        bring the model in line with new json data, only touching
+        the entries (and ext2mime keys) that are different
+
+        :return: ModelChanges saying what changed
+        """
+        if self.threadSafe:
+            return self._copyOnWrite(FirefoxFormats.update,jsonDict)
+        changes=ModelChanges()
+        self._version=jsonDict.get('defaultHandlersVersion')
+        self._extra=self._extraKeys(jsonDict)
+        for kind,newEntries in (('mimeTypes',jsonDict.get('mimeTypes',{})),
+                ('schemes',jsonDict.get('schemes',{}))):
+            added,removed,modified=changes.forKind(kind)
+            current=self._entries(kind)
+            for name in [name for name in current if name not in newEntries]:
+                self._removeEntry(kind,name)
+                removed.append(name)
+            for name,rawDict in newEntries.items():
+                if name not in current:
+                    added.append(name)
+                else:
+                    raw=self._rawEntry(kind,name)
+                    if raw is not None:
+                        if raw==rawDict:
+                            continue
+                    elif FirefoxHandlerSet(**rawDict).jsonDict==current[name].jsonDict:
+                        continue
+                    modified.append(name)
+                self._setEntry(kind,name,rawDict)
+        return changes
+
+    def _entries(self,kind):
+        """
+        get the mapping of entries for 'mimeTypes' or 'schemes'
+        """
+        if kind=='mimeTypes':
+            return self.mimeTypeHandlers
+        return self.urlProtocolHandlers
+
+    def _rawEntry(self,kind,name):
+        """
+        the raw json of an entry if it is still lying around (lazy mode)
+        """
+        entries=self._entries(kind)
+        if isinstance(entries,LazyHandlerSets):
+            return entries.raw(name)
+        return None
+
+    def _setEntry(self,kind,name,rawDict):
+        """
+        add or replace a single entry, keeping ext2mime and the
+        reverse index up to date
+        """
+        entries=self._entries(kind)
+        if name in entries:
+            self._removeExtensions(kind,name)
+        if isinstance(entries,LazyHandlerSets):
+            entries.setRaw(name,rawDict)
+            extensions=rawDict.get('extensions')
+        else:
+            entries[name]=FirefoxHandlerSet(**rawDict)
+            extensions=entries[name].extensions
+        if kind=='mimeTypes' and self._ext2mime is not None and extensions \
+                and self._ext2mimeIncremental():
+            for ext in extensions:
+                self._ext2mime.add(ext,name)
+        if self._reverseIndex is not None:
+            self._reverseIndex.add(kind,name,rawDict)
+
+    def _removeEntry(self,kind,name):
+        """
+        remove a single entry, keeping ext2mime and the reverse index up to date
+        """
+        self._removeExtensions(kind,name)
+        del self._entries(kind)[name]
+        if self._reverseIndex is not None:
+            self._reverseIndex.remove(kind,name)
+
+    def _removeExtensions(self,kind,name):
+        """
+        take an entry's extensions out of ext2mime
+        """
+        if kind!='mimeTypes' or self._ext2mime is None:
+            return
+        if not self._ext2mimeIncremental():
+            # something outranks the profile, so rebuild it when next needed
+            self._ext2mime=None
+            return
+        raw=self._rawEntry(kind,name)
+        if raw is not None:
+            extensions=raw.get('extensions')
+        else:
+            extensions=self._entries(kind)[name].extensions
+        for ext in extensions or ():
+            self._ext2mime.remove(ext,name)
+
+    def _ext2mimeIncremental(self):
+        """
+        whether ext2mime can be updated one entry at a time
+        (only when the profile is the top mime layer)
+        """
+        layers=self.mimeLayers
+        return bool(layers) and layers[0]=='firefox'
+
+    def clearCache(self):
+        """
+        throw away any on-disk cache of this profile
+        """
+        if self._filename is None:
+            self._loadOnce()
+        return _sibling('_cache').clearCache(self._filename)
 
     @property
     def json(self):
         """
         a json string
         """
+        import json
         return json.dumps(self.jsonDict)
     @json.setter
     def json(self,jsonString):
-        self.jsonDict=json.loads(jsonString)
+        import json
+        with _timed('parse'):
+            jsonDict=json.loads(jsonString)
+        self.jsonDict=jsonDict
 
     @property
     def jsonDict(self):
@@ -442,50 +1170,132 @@ class FirefoxFormats:
         schemesDict={}
         for k,v in self.urlProtocolHandlers.items():
             schemesDict[k]=v.jsonDict
-        return {
+        ret={
             'defaultHandlersVersion':self.version,
             'mimeTypes':mimesDict,
             'schemes':schemesDict
             }
+        if self._extra:
+            ret.update(self._extra)
+        return ret
     @jsonDict.setter
     def jsonDict(self,jsonDict):
-        self._ext2mime=None
-        self._version=jsonDict.get('defaultHandlersVersion')
-        self._mimeTypeHandlers={}
-        self._urlProtocolHandlers={}
-        for name,v in jsonDict.get('mimeTypes',{}).items():
-            handlers=FirefoxHandlerSet(**v)
-            if name in self.mimeTypeHandlers:
-                raise Exception('NAME COLLISION "%s"'%name)
-            self._mimeTypeHandlers[name]=handlers
-        for name,v in jsonDict.get('schemes',{}).items():
-            handlers=FirefoxHandlerSet(**v)
-            if name in self.urlProtocolHandlers:
-                raise Exception('NAME COLLISION "%s"'%name)
-            self._urlProtocolHandlers[name]=handlers
+        if self.threadSafe:
+            self._copyOnWrite(FirefoxFormats.jsonDict.fset,jsonDict,fresh=True)
+            return
+        with _timed('build'):
+            self._ext2mime=None
+            self._reverseIndex=None
+            self._version=jsonDict.get('defaultHandlersVersion')
+            self._extra=self._extraKeys(jsonDict)
+            if self.lazy:
+                self._mimeTypeHandlers=LazyHandlerSets(jsonDict.get('mimeTypes',{}))
+                self._urlProtocolHandlers=LazyHandlerSets(jsonDict.get('schemes',{}))
+                return
+            self._mimeTypeHandlers={}
+            self._urlProtocolHandlers={}
+            for name,v in jsonDict.get('mimeTypes',{}).items():
+                handlers=FirefoxHandlerSet(**v)
+                if name in self.mimeTypeHandlers:
+                    raise Exception('NAME COLLISION "%s"'%name)
+                self._mimeTypeHandlers[name]=handlers
+            for name,v in jsonDict.get('schemes',{}).items():
+                handlers=FirefoxHandlerSet(**v)
+                if name in self.urlProtocolHandlers:
+                    raise Exception('NAME COLLISION "%s"'%name)
+                self._urlProtocolHandlers[name]=handlers
+
+    @staticmethod
+    def _extraKeys(jsonDict):
+        """
+        the top-level json values we do not know about, kept so they can be saved back
+        """
+        return {k:v for k,v in jsonDict.items()
+            if k not in ('defaultHandlersVersion','mimeTypes','schemes')}
 
     def __repr__(self):
         """
         string representation of this object
         """
-        ret=[]
-        ret.append('MimeTypes:')
-        for k,v in self.mimeTypeHandlers.items():
-            ret.append('  '+k)
-            ret.append(v.__repr__(indent='    '))
-        ret.append('URL protocols:')
-        for k,v in self.urlProtocolHandlers.items():
-            ret.append('  '+k)
-            ret.append(v.__repr__(indent='    '))
-        return '\n'.join(ret)
+        return '\n'.join(self.iterListing())
 
-    def doMime(self,url,mime=None,handler=None):
+    def _iterEntries(self,kind):
         """
-        execute the handler for a mime type
+        yield (name,FirefoxHandlerSet) for 'mimeTypes' or 'schemes'
+        without building up lazily-loaded entries along the way
+        """
+        entries=self._entries(kind)
+        if isinstance(entries,LazyHandlerSets):
+            return entries.itemsUncached()
+        return entries.items()
 
-        :property url:
-        :property mime: the mime type of the resource at this url address
-        :property handler: the name of a specific handler to use (if absent, use default hander)
+    def iterListing(self):
+        """
+        yield the human-readable listing (same as repr()) a bit at a time
+        """
+        yield 'MimeTypes:'
+        for k,v in self._iterEntries('mimeTypes'):
+            yield '  '+k
+            yield v.__repr__(indent='    ')
+        yield 'URL protocols:'
+        for k,v in self._iterEntries('schemes'):
+            yield '  '+k
+            yield v.__repr__(indent='    ')
+
+    def writeListing(self,f):
+        """
+        write the human-readable listing to a file-like object as it is generated
+        """
+        for line in self.iterListing():
+            f.write(line)
+            f.write('\n')
+
+    def writeJson(self,f,separators=None,ensure_ascii=True):
+        """
+        write the same json as the json property to a file-like object,
+        one entry at a time rather than building it all in memory first
+
+        :property separators: same as for json.dumps()
+        :property ensure_ascii: same as for json.dumps()
+        """
+        import json
+        encode=json.JSONEncoder(separators=separators,ensure_ascii=ensure_ascii).encode
+        itemSeparator,keySeparator=separators or (', ',': ')
+        f.write('{'+encode('defaultHandlersVersion')+keySeparator+encode(self.version))
+        for key,kind in (('mimeTypes','mimeTypes'),('schemes','schemes')):
+            f.write(itemSeparator+encode(key)+keySeparator+'{')
+            first=True
+            for k,v in self._iterEntries(kind):
+                if not first:
+                    f.write(itemSeparator)
+                first=False
+                f.write(encode(k)+keySeparator+encode(v.jsonDict))
+            f.write('}')
+        for k,v in (self._extra or {}).items():
+            f.write(itemSeparator+encode(k)+keySeparator+encode(v))
+        f.write('}')
+
+    def writeNdjson(self,f):
+        """
+        write the model as newline-delimited json, one line per entry, eg:
+            {"type": "defaultHandlersVersion", "value": {"en-US": 4}}
+            {"type": "mimeType", "name": "application/pdf", "value": {...}}
+            {"type": "scheme", "name": "mailto", "value": {...}}
+        """
+        import json
+        encode=json.JSONEncoder().encode
+        f.write(encode({'type':'defaultHandlersVersion','value':self.version})+'\n')
+        for kind,typeName in (('mimeTypes','mimeType'),('schemes','scheme')):
+            for k,v in self._iterEntries(kind):
+                f.write(encode({'type':typeName,'name':k,'value':v.jsonDict})+'\n')
+        for k,v in (self._extra or {}).items():
+            f.write(encode({'type':'extra','name':k,'value':v})+'\n')
+
+    def resolveMime(self,mime):
+        """
+        get the FirefoxHandlerSet for a mime type
+
+        :property mime: the mime type of the resource
         """
         if mime is None:
             # TODO: if mime is None, can we figure it out by doing sending like HTTP OPTIONS?
@@ -493,30 +1303,231 @@ class FirefoxFormats:
         handlers=self.mimeTypeHandlers.get(mime)
         if handlers is None:
             raise Exception('No registered hander for mime type "%s"'%mime)
-        return handlers(url,handler)
+        return handlers
 
-    def doUrl(self,url,handler=None):
+    def resolveUrl(self,url,handler=None):
         """
-        execute the handler for a url type
+        get the FirefoxHandlerSet for a url
 
         :property url: if this is http or https and there is no specific handler
-            specified, then we will call doMime() instead
-        :property handler: the name of a specific handler to use (if absent, use default hander)
+            specified, then it is resolved by mime type instead
+        :property handler: the name of a specific handler to use
         """
         proto=url.split(':',1)[0]
         if handler is None and proto in ('http','https'):
-            self.doMime(url)
+            mime=self.urlToMime(url)
+            if mime is None:
+                raise Exception('Unable to determine the mime type of "%s"'%url)
+            return self.resolveMime(mime)
         handlers=self.urlProtocolHandlers.get(proto)
         if handlers is None:
             raise Exception('No registered hander for url type "%s:"'%proto)
-        return handlers(url,handler)
+        return handlers
+
+    @property
+    def httpMime(self):
+        """
+        the HttpMimeResolver used to find the mime types of http(s) urls
+        (it keeps connections and answers around, so is shared between calls)
+        """
+        if self._httpMime is None:
+            self._httpMime=_sibling('_httpMime').HttpMimeResolver()
+        return self._httpMime
+
+    def _urlPathToMime(self,url):
+        """
+        get a mime type from the file extension on the path of a url
+        """
+        import urllib.parse
+        path=urllib.parse.urlsplit(url).path
+        if not path:
+            return None
+        return self.fileExtensionToMime(urllib.parse.unquote(path))
+
+    def urlToMime(self,url):
+        """
+        get the mime type of a http(s) url by asking the server for its
+        Content-Type, falling back to the file extension on the url
+
+        :return: the mime type or None if it could not be determined
+        """
+        try:
+            with _timed('httpMime'):
+                mime=self.httpMime.mimeType(url)
+        except _sibling('_httpMime').HttpMimeError:
+            mime=None
+        if mime is None or mime not in self.mimeTypeHandlers:
+            mime=self._urlPathToMime(url) or mime
+        return mime
+
+    def urlsToMime(self,urls,jobs=8):
+        """
+        get the mime types of a lot of http(s) urls, asking the servers
+        concurrently and only once per url
+
+        :property jobs: how many requests may be going at once
+
+        :return: {url:mimeType or None}
+        """
+        ret=self.httpMime.mimeTypes(urls,jobs)
+        for url,mime in ret.items():
+            if not isinstance(mime,str) or mime not in self.mimeTypeHandlers:
+                ret[url]=self._urlPathToMime(url) or (mime if isinstance(mime,str) else None)
+        return ret
+
+    def resolveExtn(self,path):
+        """
+        get the FirefoxHandlerSet for a file, based upon its file extension
+        (or if that is not known, what the start of the file looks like)
+        """
+        mime=self.fileExtensionToMime(path)
+        if mime is None:
+            try:
+                mime=self.sniffMime(path)
+            except OSError:
+                pass
+            if mime is None:
+                raise Exception('unknown file extension for "%s"'%path)
+        return self.resolveMime(mime)
+
+    def resolve(self,urlOrPath,handler=None):
+        """
+        get the FirefoxHandlerSet for either a url or a local file path
+
+        Anything that starts with a "scheme:" is treated as a url, everything
+        else (including windows paths like "c:\\x") is treated as a file.
+        """
+        if isUrl(urlOrPath):
+            return self.resolveUrl(urlOrPath,handler)
+        return self.resolveExtn(urlOrPath)
+
+    def doMime(self,url,mime=None,handler=None):
+        """
+        execute the handler for a mime type
+
+        :property url:
+        :property mime: the mime type of the resource at this url address
+            (if absent, it is looked up for http and https urls)
+        :property handler: the name of a specific handler to use (if absent, use default hander)
+        """
+        if mime is None and url.split(':',1)[0] in ('http','https'):
+            mime=self.urlToMime(url)
+        with _timed('dispatch'):
+            return self.resolveMime(mime)(url,handler)
+
+    def doUrl(self,url,handler=None):
+        """
+        execute the handler for a url type
+
+        :property url: if this is http or https and there is no specific handler
+            specified, then we will call doMime() instead
+        :property handler: the name of a specific handler to use (if absent, use default hander)
+        """
+        with _timed('dispatch'):
+            return self.resolveUrl(url,handler)(url,handler)
+
+    async def adoMime(self,url,mime=None,handler=None,timeout=None):
+        """
+        awaitable version of doMime()
+
+        :property timeout: seconds to wait for the handler (None=forever)
+
+        :return: HandlerResult
+        """
+        import asyncio
+        loop=asyncio.get_running_loop()
+        # resolving may load the profile or ask a server, so is kept off the loop
+        if mime is None and url.split(':',1)[0] in ('http','https'):
+            mime=await loop.run_in_executor(None,self.urlToMime,url)
+        handlers=await loop.run_in_executor(None,self.resolveMime,mime)
+        return await handlers.acall(url,handler,timeout)
+
+    async def adoUrl(self,url,handler=None,timeout=None):
+        """
+        awaitable version of doUrl()
+
+        :property timeout: seconds to wait for the handler (None=forever)
+
+        :return: HandlerResult
+        """
+        if handler is None and url.split(':',1)[0] in ('http','https'):
+            return await self.adoMime(url,None,None,timeout)
+        import asyncio
+        loop=asyncio.get_running_loop()
+        handlers=await loop.run_in_executor(None,self.resolveUrl,url,handler)
+        return await handlers.acall(url,handler,timeout)
+
+    def groupByHandler(self,items,handler=None):
+        """
+        resolve many urls/paths and group them by the handler that would open them
+
+        :property items: iterable of urls or paths
+        :property handler: the name of a specific handler to use (if absent, use default hander)
+
+        :return: ([LaunchGroup],[BatchResult for items that could not be resolved])
+        """
+        return _sibling('_launch').groupItems(self,items,handler)
+
+    def doMany(self,items,handler=None,jobs=None,report=None):
+        """
+        open many urls/paths, using one process per application wherever
+        the application can take many files at once
+
+        :property items: iterable of urls or paths
+        :property handler: the name of a specific handler to use (if absent, use default hander)
+        :property jobs: how many processes may be running at once
+        :property report: callback that is called with a BatchResult for each item
+
+        :return: BatchSummary
+        """
+        return _sibling('_launch').runGrouped(self,items,jobs,handler,report)
 
     def fileExtensionToMime(self,path):
         """
         lookup the file extension of a given path
+
+        The longest registered extension of the file name wins
+        (eg. "x.tar.gz" before "x.gz") and case does not matter.
+        """
+        ext2mime=self.ext2mime
+        with _timed('lookup'):
+            return ext2mime.lookup(path)
+
+    def classifyPaths(self,paths):
+        """
+        find the mime types for a large number of paths
+
+        :property paths: iterable of file paths
+
+        :return: generator of (path,mimeType) where mimeType is None if unknown
+        """
+        return self.ext2mime.classify(paths)
+
+    def sniffMime(self,path):
+        """
+        work out the mime type of a file from its first few bytes
+
+        :return: the mime type or None if it is not recognised
+            (raises OSError if the file cannot be read)
+        """
+        with _timed('sniff'):
+            return _sibling('_sniff').sniffFile(path)
+
+    def sniffTree(self,paths,jobs=None,useExtensions=True):
+        """
+        find the mime types of every file in some directories, on a pool
+        of threads
+
+        :property paths: files and/or directories
+        :property jobs: how many threads to use
+        :property useExtensions: only sniff the files whose extension is
+            not in ext2mime
+
+        :return: generator of (path,mimeType) in the order they finish
+            (mimeType is None if it is not known)
         """
-        path=path.rsplit('.',1)[-1]
-        return self.ext2mime.get(path)
+        lookup=self.ext2mime.lookup if useExtensions else None
+        return _sibling('_sniff').sniffTree(paths,jobs,lookup)
 
     def doExtn(self,path,handler=None):
         """
@@ -524,22 +1535,294 @@ class FirefoxFormats:
 
         :property handler: the name of a specific handler to use (if absent, use default hander)
 
-        (file extension is taken from path)
+        (file extension is taken from path, and if path is a directory,
+        every file in it is opened with doTree())
         """
-        mime=self.fileExtensionToMime(path)
-        if mime is None:
-            raise Exception('unknown file extension for "%s"'%path)
-        return self.doMime(path,mime,handler)
+        if os.path.isdir(path):
+            return self.doTree(path,handler)[1]
+        with _timed('dispatch'):
+            return self.resolveExtn(path)(path,handler)
+
+    def doTree(self,paths,handler=None,include=None,exclude=None,maxDepth=None,
+            jobs=None,dryRun=False,sniff=False,report=None):
+        """
+        open every file in some directory trees with its handler, grouped
+        by mime type and handler (see _tree)
+
+        :property paths: directories (and/or files)
+        :property handler: the name of a specific handler to use (if absent, use default hander)
+        :property include: glob(s) a file must match to be taken (default=all files)
+        :property exclude: glob(s) of files and directories to leave out
+        :property maxDepth: how many levels of subdirectories to go down (None=no limit)
+        :property jobs: how many directories to scan, and handlers to run, at once
+        :property dryRun: only work out what would be run
+        :property sniff: look at the contents of files whose extension is not known
+        :property report: callback that is called with a BatchResult for each file as it completes
+
+        :return: (TreePlan,BatchSummary) or just the TreePlan for a dryRun
+        """
+        tree=_sibling('_tree')
+        if dryRun:
+            return tree.planTree(self,paths,handler,include,exclude,maxDepth,jobs,sniff)
+        return tree.runTree(self,paths,handler,include,exclude,maxDepth,jobs,sniff,report)
+
+    async def adoExtn(self,path,handler=None,timeout=None):
+        """
+        awaitable version of doExtn()
+
+        :property timeout: seconds to wait for the handler (None=forever,
+            and not used for a directory)
+
+        :return: HandlerResult, or for a directory the BatchSummary of
+            opening everything in it (see doTree())
+        """
+        import asyncio
+        loop=asyncio.get_running_loop()
+        if await loop.run_in_executor(None,os.path.isdir,path):
+            plan,summary=await loop.run_in_executor(None,self.doTree,path,handler)
+            return summary
+        handlers=await loop.run_in_executor(None,self.resolveExtn,path)
+        return await handlers.acall(path,handler,timeout)
+
+    def verify(self,jobs=None):
+        """
+        check that every handler can actually be run (applications exist
+        and are executable, webservices have a %s for the url)
+
+        :property jobs: how many checks may run at once
+
+        :return: VerifyReport
+        """
+        return _sibling('_verify').verifyHandlers(self,jobs)
+
+    def entriesForApplication(self,nameOrPath,kind=None):
+        """
+        the mime types and schemes that an application handles
+
+        :property nameOrPath: the handler name or application path
+        :property kind: only 'mimeTypes' or 'schemes' (default=both)
+
+        :return: sorted [(kind,name)]
+        """
+        return self.reverseIndex.byApplication(nameOrPath,kind)
+
+    def entriesForAction(self,action,kind=None):
+        """
+        the mime types and schemes with a given action
+
+        :property action: a HandlerAction, its value, or its name (eg. "OPEN_IN_FIREFOX")
+        :property kind: only 'mimeTypes' or 'schemes' (default=both)
+
+        :return: sorted [(kind,name)]
+        """
+        return self.reverseIndex.byAction(action,kind)
+
+    def entriesForHost(self,host,kind=None):
+        """
+        the mime types and schemes that go to a webservice on a given host
+
+        :property kind: only 'mimeTypes' or 'schemes' (default=both)
+
+        :return: sorted [(kind,name)]
+        """
+        return self.reverseIndex.byHost(host,kind)
 
     def findFormat(self,url):
         """
         get a format handler for a given url
+
+        :return: a FirefoxHandlerSet or None if nothing handles it
         """
+        try:
+            return self.resolve(url)
+        except Exception:
+            return None
 
-    def setFormat(self,formatHandler):
+    def setFormat(self,formatHandler,mimeType=None,urlProtocol=None):
         """
         set a format handler for a given format
+
+        This only changes the model.  Call save() to write it to the profile,
+        or use transaction() to make several changes and save them at once.
+
+        :property formatHandler: a FirefoxHandlerSet (or json-compatible dict
+            of one) to set, or None to remove the format
+        :property mimeType: the mime type to set the handler for
+        :property urlProtocol: the url protocol (without ":") to set the handler for
         """
+        if self.threadSafe:
+            return self._copyOnWrite(FirefoxFormats.setFormat,formatHandler,mimeType,urlProtocol)
+        if (mimeType is None)==(urlProtocol is None):
+            raise Exception('Exactly one of mimeType or urlProtocol must be specified')
+        if mimeType is not None:
+            kind,name='mimeTypes',mimeType
+        else:
+            kind,name='schemes',urlProtocol
+        if formatHandler is None:
+            if name in self._entries(kind):
+                self._removeEntry(kind,name)
+            return
+        if isinstance(formatHandler,FirefoxHandlerSet):
+            formatHandler=formatHandler.jsonDict
+        self._setEntry(kind,name,formatHandler)
+
+    def transaction(self):
+        """
+        start a batch of edits that are applied and saved all at once
+
+        Usage:
+            with fff.transaction() as t:
+                t.setFormat(handlerSet,mimeType='application/x-whatever')
+                t.setFormat(None,urlProtocol='ftp')
+
+        :return: a HandlersTransaction
+        """
+        return HandlersTransaction(self)
+
+    def _commitEdits(self,edits):
+        """
+        apply a list of (formatHandler,mimeType,urlProtocol) edits and save,
+        putting everything back the way it was if that fails
+
+        :return: whether the file had to be written
+        """
+        if self.threadSafe:
+            # a failure leaves the copy unswapped, so nobody ever sees the edits
+            return self._copyOnWrite(FirefoxFormats._commitEdits,edits)
+        undo=[]
+        try:
+            for formatHandler,mimeType,urlProtocol in edits:
+                old=self.mimeTypeHandlers.get(mimeType) if mimeType is not None \
+                    else self.urlProtocolHandlers.get(urlProtocol)
+                if old is not None:
+                    old=old.jsonDict
+                undo.append((old,mimeType,urlProtocol))
+                self.setFormat(formatHandler,mimeType,urlProtocol)
+            return self.save()
+        except BaseException:
+            for old,mimeType,urlProtocol in reversed(undo):
+                self.setFormat(old,mimeType,urlProtocol)
+            raise
+
+    def save(self,filename=None):
+        """
+        save the model back to the profile
+
+        The file is replaced atomically (written to a temporary file, synced,
+        then renamed over the original) and is not touched at all if it
+        already holds the same handlers, even if firefox wrote them out with
+        its keys in a different order.
+
+        :property filename: where to save (default=where it was loaded from)
+
+        :return: whether the file was written
+        """
+        if self.threadSafe:
+            with self._lock:
+                snapshot=self.snapshot()
+                snapshot.threadSafe=False
+                return snapshot.save(filename)
+        if filename is None:
+            if self._filename is None:
+                self.load()
+            filename=self._filename
+        import json
+        jsonDict=self.jsonDict
+        data=json.dumps(jsonDict,separators=(',',':'),ensure_ascii=False)
+        data=data.encode('utf-8')
+        try:
+            with open(filename,'rb') as f:
+                current=f.read()
+            # (what we write never has firefox's key order, so compare what it means)
+            if current==data or json.loads(current)==jsonDict:
+                return False
+        except (FileNotFoundError,ValueError): # (nothing there, or nothing usable)
+            pass
+        cache=_sibling('_cache')
+        written=[]
+        def write(f):
+            f.write(data)
+            f.flush()
+            # the rename keeps the inode and mtime, so this is what we wrote
+            written.append(cache.fileSignature(f.fileno()))
+        cache.replaceFile(filename,write,sync=True)
+        if self.useCache and filename==self._filename:
+            model=(self._version,self._mimeTypeHandlers,self._urlProtocolHandlers,self._extra)
+            cache.saveCached(filename,model,'lazymodel' if self.lazy else 'model',
+                signature=written[0])
+        return True
+
+
+class HandlersTransaction:
+    """
+    A batch of edits to a FirefoxFormats object that are applied to the
+    model and saved in one go when the transaction is committed
+
+    If saving fails, the model is put back the way it was.
+    """
+
+    def __init__(self,fff):
+        self.fff=fff
+        self.edits=[] # list of (formatHandler json dict or None,mimeType,urlProtocol)
+        self.written=None # after commit, whether the file had to be written
+
+    def setFormat(self,formatHandler,mimeType=None,urlProtocol=None):
+        """
+        set (or remove, if formatHandler is None) a format handler
+
+        (same parameters as FirefoxFormats.setFormat())
+        """
+        if (mimeType is None)==(urlProtocol is None):
+            raise Exception('Exactly one of mimeType or urlProtocol must be specified')
+        if isinstance(formatHandler,FirefoxHandlerSet):
+            formatHandler=formatHandler.jsonDict
+        self.edits.append((formatHandler,mimeType,urlProtocol))
+
+    def setMimeType(self,mimeType,formatHandler):
+        """
+        set the handler for a mime type
+        """
+        self.setFormat(formatHandler,mimeType=mimeType)
+
+    def setScheme(self,urlProtocol,formatHandler):
+        """
+        set the handler for a url protocol (without ":")
+        """
+        self.setFormat(formatHandler,urlProtocol=urlProtocol)
+
+    def removeMimeType(self,mimeType):
+        """
+        remove a mime type
+        """
+        self.setFormat(None,mimeType=mimeType)
+
+    def removeScheme(self,urlProtocol):
+        """
+        remove a url protocol
+        """
+        self.setFormat(None,urlProtocol=urlProtocol)
+
+    def commit(self):
+        """
+        apply all of the edits and save
+
+        :return: whether the file had to be written
+        """
+        self.written=self.fff._commitEdits(self.edits) # pylint: disable=protected-access
+        self.edits=[]
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        if excType is None:
+            self.commit()
+
+
+# command line options that can be answered by a running daemon
+DAEMON_OPTIONS=('--list','--ls','--doUrl','--doExtn','--doMime','--json','--ndjson',
+    '--ext2mime','--classify')
 
 
 def cmdline(args):
@@ -549,17 +1832,48 @@ def cmdline(args):
     :param args: command line arguments (WITHOUT the filename)
     """
     printhelp=False
+    jobs=None
+    coalesce=False
+    include=None
+    exclude=None
+    maxDepth=None
+    dryRun=False
+    stats=False
+    statsFile=None
+    store=None
+    storeFilename=None
     if not args:
         printhelp=True
     else:
-        fff=FirefoxFormats()
+        # these need to be on before anything else happens
+        for arg in args:
+            arg=[a.strip() for a in arg.split('=',1)]
+            if arg[0]=='--stats':
+                stats=True
+            elif arg[0]=='--statsFile' and len(arg)>1:
+                statsFile=arg[1]
+        if stats or statsFile is not None:
+            _sibling('_stats').enableStats()
+        fff=None
+        if '--noDaemon' not in args and '--daemon' not in args:
+            # when a daemon is running and it can answer everything we were
+            # asked, use it rather than loading the profile ourselves
+            for arg in args:
+                if arg.startswith('-') and arg.split('=',1)[0] not in DAEMON_OPTIONS:
+                    break
+                if arg.startswith('--doExtn=') and os.path.isdir(arg.split('=',1)[1].split(',')[-1]):
+                    break # directories are walked here, not in the daemon
+            else:
+                fff=_sibling('_daemon').connectDaemon()
+        if fff is None:
+            fff=FirefoxFormats()
         for arg in args:
             if arg.startswith('-'):
                 arg=[a.strip() for a in arg.split('=',1)]
                 if arg[0] in ['-h','--help']:
                     printhelp=True
                 elif arg[0] in ('--list','--ls'):
-                    print(fff)
+                    fff.writeListing(sys.stdout)
                 elif arg[0]=='--doUrl':
                     if len(arg)>1:
                         url=arg[1].split(':',1)
@@ -579,7 +1893,19 @@ def cmdline(args):
                             handler=handler[0]
                         else:
                             handler=None
-                        fff.doExtn(':'.join(url),handler)
+                        path=':'.join(url)
+                        if os.path.isdir(path):
+                            if dryRun:
+                                plan=fff.doTree(path,handler,include,exclude,maxDepth,jobs,True)
+                                for line in plan.iterPlan(True):
+                                    sys.stdout.write(line+'\n')
+                            else:
+                                plan,summary=fff.doTree(path,handler,include,exclude,maxDepth,
+                                    jobs,report=print)
+                                print(plan)
+                                print(summary)
+                        else:
+                            fff.doExtn(path,handler)
                 elif arg[0]=='--doMime':
                     if len(arg)>1:
                         url=arg[1].split(':',1)
@@ -596,9 +1922,14 @@ def cmdline(args):
                             handler=None
                         fff.doMime(':'.join(url),mime,handler)
                 elif arg[0]=='--json':
-                    print(fff.json)
+                    fff.writeJson(sys.stdout)
+                    sys.stdout.write('\n')
+                elif arg[0]=='--ndjson':
+                    fff.writeNdjson(sys.stdout)
                 elif arg[0]=='--ext2mime':
                     print(fff.ext2mime)
+                elif arg[0]=='--file':
+                    fff.filename=arg[1]
                 elif arg[0]=='--user':
                     if len(arg)>1:
                         fff.osUser=arg[1]
@@ -609,16 +1940,131 @@ def cmdline(args):
                         fff.profileId=arg[1]
                     else:
                         fff.profileId=None
+                elif arg[0]=='--jobs':
+                    jobs=int(arg[1])
+                elif arg[0]=='--coalesce':
+                    coalesce=True
+                elif arg[0]=='--multiFile':
+                    _sibling('_launch').MULTI_FILE_APPLICATIONS.update(arg[1].split(','))
+                elif arg[0]=='--include':
+                    include=arg[1].split(',')
+                elif arg[0]=='--exclude':
+                    exclude=arg[1].split(',')
+                elif arg[0]=='--maxDepth':
+                    maxDepth=int(arg[1])
+                elif arg[0]=='--dryRun':
+                    dryRun=True
+                elif arg[0]=='--batch':
+                    batch=_sibling('_batch')
+                    if coalesce:
+                        runBatch=_sibling('_launch').runGrouped
+                    else:
+                        runBatch=batch.runBatch
+                    if len(arg)<2 or arg[1]=='-':
+                        items=batch.readItems(sys.stdin)
+                        summary=runBatch(fff,items,jobs,report=print)
+                    else:
+                        with open(arg[1],'r') as f:
+                            items=batch.readItems(f)
+                            summary=runBatch(fff,items,jobs,report=print)
+                    print(summary)
+                elif arg[0]=='--profiles':
+                    for profile in _sibling('_profiles').listAllProfiles():
+                        print(profile)
+                elif arg[0] in ('--handledBy','--withAction','--webservice'):
+                    if arg[0]=='--handledBy':
+                        found=fff.entriesForApplication(arg[1])
+                    elif arg[0]=='--withAction':
+                        found=fff.entriesForAction(arg[1])
+                    else:
+                        found=fff.entriesForHost(arg[1])
+                    for kind,name in found:
+                        if kind=='schemes':
+                            print(name+':')
+                        else:
+                            print(name)
+                elif arg[0]=='--diff':
+                    diff=_sibling('_diff')
+                    paths=arg[1].split(',')
+                    diff.diffProfiles(paths[0],paths[1:],diff.ndjsonReport(sys.stdout))
+                elif arg[0]=='--store':
+                    storeFilename=arg[1]
+                    store=None
+                elif arg[0] in ('--import','--whoMaps','--sql'):
+                    if store is None:
+                        store=_sibling('_store').HandlerStore(storeFilename)
+                    if arg[0]=='--import':
+                        def report(source,imported,error):
+                            if error is not None:
+                                print('FAIL %s: %s'%(source,error))
+                            elif imported:
+                                print('imported %s'%source)
+                        counts=store.importMany(arg[1].split(','),report)
+                        print('%d imported, %d unchanged, %d failed'%counts)
+                    else:
+                        if arg[0]=='--whoMaps':
+                            whoMaps=arg[1].split(',',1)
+                            if len(whoMaps)>1:
+                                rows=store.extensionMismatches(whoMaps[0],whoMaps[1])
+                            else:
+                                rows=store.extensionOwners(whoMaps[0])
+                        else:
+                            rows=store.query(arg[1])
+                        for row in rows:
+                            print('\t'.join('' if v is None else str(v) for v in row))
+                elif arg[0]=='--verify':
+                    print(fff.verify(jobs))
+                elif arg[0]=='--compileIndex':
+                    filename=fff._filename
+                    if filename is None:
+                        filename='%shandlers.json'%getFirefoxProfilePath(fff.osUser,fff.profileId)
+                    # signed before it is read, so that a change made while it
+                    # is being read leaves the index looking out of date
+                    signature=_sibling('_cache').fileSignature(filename)
+                    fff.load(filename)
+                    _sibling('_binaryIndex').compileIndex(fff,arg[1],signature)
+                elif arg[0]=='--classify':
+                    write=sys.stdout.write
+                    paths=(line.rstrip('\r\n') for line in sys.stdin)
+                    for path,mime in fff.classifyPaths(paths):
+                        write('%s\t%s\n'%(path,mime or ''))
+                elif arg[0]=='--sniff':
+                    if len(arg)>1:
+                        write=sys.stdout.write
+                        for path,mime in fff.sniffTree(arg[1].split(','),jobs):
+                            write('%s\t%s\n'%(path,mime or ''))
+                elif arg[0]=='--daemon':
+                    _sibling('_daemon').serve(fff,arg[1] if len(arg)>1 else None)
+                elif arg[0] in ('--noDaemon','--stats','--statsFile'):
+                    pass
+                elif arg[0]=='--watch':
+                    watcher=_sibling('_watch').HandlersWatcher(fff,print)
+                    watcher.run()
+                elif arg[0]=='--lazy':
+                    fff.lazy=True
+                elif arg[0]=='--mimeLayers':
+                    if len(arg)>1:
+                        fff.mimeLayers=tuple(a.strip() for a in arg[1].split(',') if a.strip())
+                elif arg[0]=='--noCache':
+                    fff.useCache=False
+                elif arg[0]=='--clearCache':
+                    print('Removed %d cache files'%_sibling('_cache').clearCache())
                 else:
                     print('ERR: unknown argument "'+arg[0]+'"')
             else:
                 fff.doUrl(arg)
+        if stats:
+            print(_sibling('_stats').STATS)
+        if statsFile is not None:
+            _sibling('_stats').STATS.writePrometheus(statsFile)
     if printhelp:
         print('Usage:')
         print('  _firefoxFormats.py [options] [urls]')
         print('Options:')
+        print('   --file= ............ use a specific handlers.json instead of a profile')
         print('   --user= ............ select an os user')
         print('   --profile= ......... select a firefox profile')
+        print('   --profiles ......... list the firefox profiles of every os user')
         print('   --list ............. list all external formats known to firefox')
         print('   --ls ............... list all external formats known to firefox')
         print('   --doMime=mimetype,[handler,]url')
@@ -627,8 +2073,53 @@ def cmdline(args):
         print('                        open the handler for a url protocol')
         print('   --doExtn=[handler,]url')
         print('                        open the handler for a file extension type')
+        print('                        (or for every file in a directory, grouped by handler)')
+        print('   --include=glob[,glob...]')
+        print('                        only open files in a --doExtn directory that match')
+        print('   --exclude=glob[,glob...]')
+        print('                        leave out files/directories of a --doExtn directory that match')
+        print('   --maxDepth=n ....... how many levels of subdirectories --doExtn goes down')
+        print('   --dryRun ........... show what --doExtn on a directory would run, without running it')
         print('   --json ............. dump the json configuration to the console')
+        print('   --ndjson ........... dump the configuration as one json line per entry')
         print('   --ext2mime ......... list file extension -> mimetype mappings')
+        print('   --batch[=file] ..... open each url/path listed in a file (default=stdin)')
+        print('   --jobs=n ........... how many handlers --batch may run at the same time')
+        print('   --coalesce ......... make --batch open all files for an application with one process')
+        print('                        (for applications known to open every file they are given)')
+        print('   --multiFile=app[,app...]')
+        print('                        applications (names or paths) that open every file they are given')
+        print('   --handledBy=app .... list mime types/schemes handled by an application name or path')
+        print('   --withAction=action  list mime types/schemes with an action (eg. OPEN_IN_FIREFOX)')
+        print('   --webservice=host .. list mime types/schemes sent to a webservice host')
+        print('   --diff=baseline,path[,path...]')
+        print('                        compare handlers.json files (or directories of them)')
+        print('                        to a baseline and print the differences as ndjson')
+        print('   --store=file ....... the database for --import/--whoMaps/--sql (default=in the data directory)')
+        print('   --import=path[,path...]')
+        print('                        add handlers.json files (or directories of them) to the database')
+        print('   --whoMaps=ext[,expected]')
+        print('                        list what every profile in the database maps a file extension to')
+        print('                        (only those not going to the expected mime type/handler)')
+        print('   --sql=query ........ run a query against the database')
+        print('   --verify ........... check that every handler application/webservice is usable')
+        print('   --compileIndex=file  compile a memory-mappable lookup index of the profile')
+        print('   --classify ......... read paths from stdin and print "path<tab>mimetype"')
+        print('   --sniff=path[,path...]')
+        print('                        print "path<tab>mimetype" for every file in some directories')
+        print('                        (looking at the contents of files with unknown extensions)')
+        print('   --daemon[=socket] .. keep the profile loaded and serve requests from other calls')
+        print('                        (reloading it whenever it changes)')
+        print('   --noDaemon ......... do not use a running daemon')
+        print('   --watch ............ print changes to the profile as they happen')
+        print('   --lazy ............. only build handler objects as they are needed')
+        print('   --mimeLayers=layer[,layer...]')
+        print('                        where file extensions are looked up, highest precedence first')
+        print('                        (default=firefox,mime.types,sharedMimeInfo,bundled)')
+        print('   --noCache .......... do not use the on-disk cache of parsed profiles')
+        print('   --clearCache ....... remove all on-disk caches of parsed profiles')
+        print('   --stats ............ print how many times each phase ran and how long it took')
+        print('   --statsFile=file ... write the phase timings to a file in Prometheus text format')
         print('Urls:')
         print('   does the same thing as doUrl')
         return -1
@@ -636,5 +2127,4 @@ def cmdline(args):
 
 
 if __name__=='__main__':
-    import sys
     sys.exit(cmdline(sys.argv[1:]))
\ No newline at end of file
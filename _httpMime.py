@@ -0,0 +1,315 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Find out the mime type of http:// and https:// urls
+
+Asks the server with a HEAD request (falling back to a GET of the first
+byte for servers that do not do HEAD) and reads the Content-Type.
+
+Connections are kept alive and reused per host, and answers are cached for
+a while so the same url is never asked about twice.  Hosts that could not
+be reached, or that refuse HEAD, are remembered for a while as well.
+Several threads asking about the same url at the same time share a
+single request.
+"""
+import time
+import threading
+
+
+# how long answers are kept, in seconds
+DEFAULT_TTL=300.0
+# how long to remember things about a host (unreachable, no HEAD support)
+DEFAULT_HOST_TTL=60.0
+# how many redirects to follow before giving up
+MAX_REDIRECTS=5
+
+
+class HttpMimeError(Exception):
+    """
+    The mime type of a url could not be found out (the host could not be
+    reached, answered with something that was not http, redirected too
+    many times, ...)
+    """
+
+
+def parseContentType(contentType):
+    """
+    get the bare mime type out of a Content-Type header
+    (eg. "text/html; charset=utf-8" -> "text/html")
+
+    :return: the mime type or None
+    """
+    if not contentType:
+        return None
+    mime=contentType.split(';',1)[0].strip().lower()
+    return mime or None
+
+
+class ConnectionPool:
+    """
+    Keep-alive http(s) connections, pooled per (scheme,host,port)
+    """
+
+    def __init__(self,timeout=10.0,maxPerHost=4):
+        """
+        :property timeout: socket timeout in seconds
+        :property maxPerHost: most idle connections to keep for any one host
+        """
+        self.timeout=timeout
+        self.maxPerHost=maxPerHost
+        self._idle={}
+        self._lock=threading.Lock()
+
+    def get(self,scheme,netloc):
+        """
+        get a connection to a host, reusing an idle one if there is one
+        """
+        key=(scheme,netloc)
+        with self._lock:
+            idle=self._idle.get(key)
+            if idle:
+                return idle.pop()
+        import http.client
+        if scheme=='https':
+            return http.client.HTTPSConnection(netloc,timeout=self.timeout)
+        return http.client.HTTPConnection(netloc,timeout=self.timeout)
+
+    def release(self,scheme,netloc,connection):
+        """
+        give back a connection (whose response has been fully read) for reuse
+        """
+        key=(scheme,netloc)
+        with self._lock:
+            idle=self._idle.setdefault(key,[])
+            if len(idle)<self.maxPerHost:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """
+        close all idle connections
+        """
+        with self._lock:
+            idle,self._idle=self._idle,{}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class HttpMimeResolver:
+    """
+    Looks up (and remembers) the mime types of http(s) urls
+    """
+
+    def __init__(self,ttl=DEFAULT_TTL,hostTtl=DEFAULT_HOST_TTL,timeout=10.0,maxPerHost=4):
+        """
+        :property ttl: how long to remember the mime type of a url, in seconds
+        :property hostTtl: how long to remember that a host is unreachable
+            or does not do HEAD, in seconds
+        :property timeout: socket timeout in seconds
+        :property maxPerHost: most idle connections to keep for any one host
+        """
+        self.ttl=ttl
+        self.hostTtl=hostTtl
+        self.pool=ConnectionPool(timeout,maxPerHost)
+        self._urls={} # url: (mimeType,expires)
+        self._hosts={} # (scheme,netloc): (error or None,noHead,expires)
+        self._inFlight={} # url: Future for the lookup that is going on right now
+        self._lock=threading.Lock()
+        self.requestCount=0 # how many requests actually went out
+
+    def cached(self,url):
+        """
+        get the cached answer for a url
+
+        :return: (found,mimeType)
+        """
+        with self._lock:
+            entry=self._urls.get(url)
+            if entry is None:
+                return False,None
+            if entry[1]<time.monotonic():
+                del self._urls[url]
+                return False,None
+            return True,entry[0]
+
+    def _hostInfo(self,key):
+        """
+        what we remember about a host
+
+        :return: (error,noHead) where error is why it was unreachable (or None)
+        """
+        with self._lock:
+            entry=self._hosts.get(key)
+            if entry is None:
+                return None,False
+            if entry[2]<time.monotonic():
+                del self._hosts[key]
+                return None,False
+            return entry[0],entry[1]
+
+    def _rememberHost(self,key,error=None,noHead=False):
+        with self._lock:
+            self._hosts[key]=(error,noHead,time.monotonic()+self.hostTtl)
+
+    def _request(self,scheme,netloc,method,target):
+        """
+        do a single request on a pooled connection
+
+        :return: (status,headers)
+        """
+        import http.client
+        headers={'Accept':'*/*','Connection':'keep-alive'}
+        if method=='GET':
+            headers['Range']='bytes=0-0'
+        for attempt in (0,1):
+            connection=self.pool.get(scheme,netloc)
+            try:
+                with self._lock:
+                    self.requestCount+=1
+                connection.request(method,target,headers=headers)
+                response=connection.getresponse()
+                response.read()
+            except (http.client.RemoteDisconnected,BrokenPipeError,ConnectionResetError):
+                # a kept-alive connection the server had already closed
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.pool.release(scheme,netloc,connection)
+            return response.status,response.headers
+        return None,None
+
+    def _lookup(self,url):
+        """
+        ask the server(s) for the mime type of a url, following redirects
+        """
+        import http.client
+        import urllib.parse
+        for _ in range(MAX_REDIRECTS+1):
+            parts=urllib.parse.urlsplit(url)
+            scheme=parts.scheme.lower()
+            if scheme not in ('http','https'):
+                raise HttpMimeError('Not a http(s) url "%s"'%url)
+            key=(scheme,parts.netloc)
+            error,noHead=self._hostInfo(key)
+            if error is not None:
+                raise HttpMimeError('Host "%s" is unreachable: %s'%(parts.netloc,error))
+            target=parts.path or '/'
+            if parts.query:
+                target+='?'+parts.query
+            try:
+                status=None
+                if not noHead:
+                    status,headers=self._request(scheme,parts.netloc,'HEAD',target)
+                    if status in (405,501):
+                        self._rememberHost(key,noHead=True)
+                if status is None or status in (405,501):
+                    status,headers=self._request(scheme,parts.netloc,'GET',target)
+            except OSError as e:
+                self._rememberHost(key,error=e)
+                raise HttpMimeError('Host "%s" is unreachable: %s'%(parts.netloc,e))
+            except http.client.HTTPException as e:
+                raise HttpMimeError('Bad response from "%s": %s'%(parts.netloc,e))
+            if status in (301,302,303,307,308) and headers.get('Location'):
+                url=urllib.parse.urljoin(url,headers['Location'])
+                continue
+            if status>=400:
+                return None
+            return parseContentType(headers.get('Content-Type'))
+        raise HttpMimeError('Too many redirects for "%s"'%url)
+
+    def mimeType(self,url):
+        """
+        get the mime type of a http(s) url
+
+        If another thread is already asking about the url, this waits for
+        its answer rather than asking again.
+
+        (raises HttpMimeError if it could not be found out)
+
+        :return: the mime type, or None if the server would not say
+        """
+        from concurrent.futures import Future
+        found,mime=self.cached(url)
+        if found:
+            return mime
+        with self._lock:
+            entry=self._urls.get(url)
+            if entry is not None and entry[1]>=time.monotonic():
+                return entry[0]
+            future=self._inFlight.get(url)
+            owner=future is None
+            if owner:
+                future=Future()
+                self._inFlight[url]=future
+        if not owner:
+            return future.result()
+        try:
+            mime=self._lookup(url)
+        except BaseException as e:
+            with self._lock:
+                del self._inFlight[url]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._urls[url]=(mime,time.monotonic()+self.ttl)
+            del self._inFlight[url]
+        future.set_result(mime)
+        return mime
+
+    def mimeTypes(self,urls,jobs=8):
+        """
+        get the mime types of a lot of urls at once
+
+        Each distinct url is only asked about once, and not at all if
+        it is already cached.
+
+        :property urls: iterable of http(s) urls
+        :property jobs: how many requests may be going at once
+
+        :return: {url:mimeType or Exception}
+        """
+        ret={}
+        todo=[]
+        for url in urls:
+            if url in ret:
+                continue
+            found,mime=self.cached(url)
+            if found:
+                ret[url]=mime
+            else:
+                ret[url]=None
+                todo.append(url)
+        if todo:
+            from concurrent.futures import ThreadPoolExecutor
+            def lookup(url):
+                try:
+                    return self.mimeType(url)
+                except Exception as e:
+                    return e
+            with ThreadPoolExecutor(max_workers=max(1,min(jobs,len(todo)))) as pool:
+                for url,mime in zip(todo,pool.map(lookup,todo)):
+                    ret[url]=mime
+        return ret
+
+    def clear(self):
+        """
+        forget everything that has been cached
+        """
+        with self._lock:
+            self._urls.clear()
+            self._hosts.clear()
+
+    def close(self):
+        """
+        close all pooled connections
+        """
+        self.pool.close()
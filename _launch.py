@@ -0,0 +1,286 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Open many urls/paths with as few processes as possible
+
+Items are grouped by the handler that would open them.  Applications that
+are known to open every file they are given as trailing arguments (see
+MULTI_FILE_APPLICATIONS) get one process per handler with all of the items
+as arguments (split into chunks that fit within the os limit on how much
+room the arguments of a new process can take up).  Everything else
+(webservices, handlers with a placeholder, opening in firefox, applications
+that would only open the first file, ...) is still launched once per item.
+"""
+import os
+import time
+from ._batch import BatchResult,BatchSummary,defaultJobs
+
+
+# file names of applications that open every file passed to them, so can be
+# given many at once (many others only open the first, or only take one).
+# More can be added here, or listed in the FIREFOXFORMATS_MULTI_FILE
+# environment variable (names or full paths, separated by os.pathsep).
+MULTI_FILE_APPLICATIONS={
+    'cat','echo','less','more',
+    'vi','vim','gvim','nvim','emacs','gedit','kate','kwrite','mousepad','geany',
+    'pluma','xed','code','subl','notepad++',
+    'eog','feh','gwenview','ristretto','sxiv','nsxiv','gimp','inkscape',
+    'evince','okular','libreoffice','soffice',
+    'mpv','vlc','mplayer','smplayer','totem','celluloid','audacious',
+    }
+
+
+# room left over for what we did not count (auxv, alignment, ...)
+ARG_MARGIN=4096
+# what to assume if the os will not say how much room arguments get
+DEFAULT_ARG_MAX=131072
+# CreateProcess() limit on the length of the command line on windows
+WINDOWS_MAX_COMMAND_LINE=32767
+# size of the pointer to each argument/environment string (posix)
+POINTER_SIZE=8
+
+
+def argCost(arg):
+    """
+    how much of argLimit() passing one argument to a new process uses up
+
+    (on posix, its bytes, the terminating nul and the pointer to it; on
+    windows, its length once quoted into the command line, plus a space)
+    """
+    if os.name=='nt':
+        import subprocess
+        return len(subprocess.list2cmdline([arg]))+1
+    return len(os.fsencode(arg))+1+POINTER_SIZE
+
+
+def argLimit():
+    """
+    how much room (as counted by argCost()) the arguments of a new process
+    can safely take up on this os
+    """
+    if os.name=='nt':
+        return WINDOWS_MAX_COMMAND_LINE-ARG_MARGIN//4
+    try:
+        limit=os.sysconf('SC_ARG_MAX')
+    except (AttributeError,ValueError,OSError):
+        limit=DEFAULT_ARG_MAX
+    if limit<=0:
+        limit=DEFAULT_ARG_MAX
+    # the environment comes out of the same space
+    limit-=sum(argCost('%s=%s'%(k,v)) for k,v in os.environ.items())
+    return max(1024,limit-ARG_MARGIN)
+
+
+def takesManyFiles(path):
+    """
+    whether an application is known to open every file it is given as
+    trailing arguments (see MULTI_FILE_APPLICATIONS)
+
+    :property path: the application's path (matched on its file name,
+        or on the whole path)
+    """
+    name=os.path.basename(path)
+    if os.name=='nt':
+        name=name.lower()
+        if name.endswith('.exe'):
+            name=name[:-4]
+    if name in MULTI_FILE_APPLICATIONS or path in MULTI_FILE_APPLICATIONS:
+        return True
+    flagged=os.environ.get('FIREFOXFORMATS_MULTI_FILE')
+    if flagged:
+        flagged=flagged.split(os.pathsep)
+        return name in flagged or path in flagged
+    return False
+
+
+def chunkArgs(prefix,args,limit=None):
+    """
+    split up arguments so that each prefix+chunk argument list fits
+
+    :property prefix: the arguments every list starts with (eg. [application])
+    :property args: the arguments to split up
+    :property limit: how much room the arguments can take up (default=argLimit())
+
+    :return: generator of lists of (index,arg) where index is the position in args
+    """
+    if limit is None:
+        limit=argLimit()
+    chunk=[]
+    base=sum(argCost(arg) for arg in prefix)
+    length=base
+    for i,arg in enumerate(args):
+        cost=argCost(arg)
+        if chunk and length+cost>limit:
+            yield chunk
+            chunk=[]
+            length=base
+        chunk.append((i,arg))
+        length+=cost
+    if chunk:
+        yield chunk
+
+
+class LaunchGroup:
+    """
+    Items that all resolved to the same handler
+    """
+
+    def __init__(self,handlerSet,handler,handlerName=None):
+        self.handlerSet=handlerSet # the FirefoxHandlerSet the items resolved to
+        self.handler=handler # the FirefoxHandler that will run them (None if the action does not use one)
+        self.handlerName=handlerName # the specific handler that was asked for
+        self.items=[]
+
+    @property
+    def callTemplate(self):
+        """
+        the application path or webservice uri the items will be sent to
+        (None when firefox or the os default application is used)
+        """
+        if self.handler is None:
+            return None
+        return self.handler.target
+
+    @property
+    def coalesced(self):
+        """
+        whether the items can be launched together in one process
+        """
+        return self.handler is not None and self.handler.acceptsMany
+
+    def chunks(self,limit=None):
+        """
+        split the items up into what each process will be given
+
+        :return: generator of lists of items
+        """
+        if not self.coalesced:
+            for item in self.items:
+                yield [item]
+            return
+        for chunk in chunkArgs([self.handler.path],self.items,limit):
+            yield [arg for _,arg in chunk]
+
+    def run(self,items):
+        """
+        launch some of the items (one chunk of them if coalesced,
+        otherwise a single item)
+
+        :return: a BatchResult for each item
+        """
+        start=time.perf_counter()
+        try:
+            if self.coalesced:
+                self.handler.callMany(items)
+            else:
+                self.handlerSet(items[0],self.handlerName)
+        except Exception as e:
+            return [BatchResult(item,e,time.perf_counter()-start) for item in items]
+        elapsed=time.perf_counter()-start
+        return [BatchResult(item,None,elapsed) for item in items]
+
+    def callStrings(self,limit=None):
+        """
+        the call strings that launching this group would run
+
+        :return: generator of (items,callString) where callString is None
+            if the items are given to firefox or the os rather than a handler
+        """
+        for chunk in self.chunks(limit):
+            if self.handler is None:
+                yield chunk,None
+            elif self.coalesced:
+                yield chunk,self.handler.getCallStringMany(chunk)
+            else:
+                yield chunk,self.handler.getCallString(chunk[0])
+
+    def __repr__(self):
+        if self.coalesced:
+            how='coalesced'
+        else:
+            how='one per item'
+        return '%s (%s): %d items'%(self.callTemplate or self.handlerSet.actionName,
+            how,len(self.items))
+
+
+def groupItems(fff,items,handler=None):
+    """
+    resolve many urls/paths and group them by the handler that would open them
+
+    Applications that show up under several mime types/schemes (which
+    they often do) still only get one group.
+
+    :property fff: a FirefoxFormats object
+    :property items: iterable of urls or paths
+    :property handler: the name of a specific handler to use (if absent, use default hander)
+
+    :return: ([LaunchGroup],[BatchResult for items that could not be resolved])
+    """
+    groups={}
+    failures=[]
+    items=list(items)
+    if handler is None:
+        # ask the servers about all the web urls at once rather than one by one
+        webUrls=[item for item in items if item.split(':',1)[0] in ('http','https')]
+        if webUrls:
+            fff.urlsToMime(webUrls)
+    for item in items:
+        try:
+            handlerSet=fff.resolve(item,handler)
+            handlerObject=None
+            if handlerSet.action in (handlerSet.ACTION_EXECUTE_APPLICATION,
+                    handlerSet.ACTION_EXECUTE_APPLICATION_X):
+                handlerObject=handlerSet.getHandler(handler)
+        except Exception as e:
+            failures.append(BatchResult(item,e))
+            continue
+        if handlerObject is not None and handlerObject.acceptsMany:
+            key=('path',handlerObject.path)
+        else:
+            key=('set',id(handlerSet),id(handlerObject))
+        group=groups.get(key)
+        if group is None:
+            group=LaunchGroup(handlerSet,handlerObject,handler)
+            groups[key]=group
+        group.items.append(item)
+    return list(groups.values()),failures
+
+
+def runGrouped(fff,items,jobs=None,handler=None,report=None):
+    """
+    dispatch many urls/paths, launching one process per handler wherever
+    the handler can take many files at once
+
+    Unlike runBatch(), every item is resolved before anything is launched.
+
+    :property fff: a FirefoxFormats object
+    :property items: iterable of urls or paths
+    :property jobs: how many processes may be running at once
+    :property handler: the name of a specific handler to use (if absent, use default hander)
+    :property report: callback that is called with a BatchResult for each item as it completes
+
+    :return: a BatchSummary (counting items, not processes)
+    """
+    from concurrent.futures import ThreadPoolExecutor,as_completed
+    if jobs is None:
+        jobs=defaultJobs()
+    jobs=max(1,jobs)
+    summary=BatchSummary()
+    def finished(result):
+        summary.add(result)
+        if report is not None:
+            report(result)
+    start=time.perf_counter()
+    groups,failures=groupItems(fff,items,handler)
+    for result in failures:
+        finished(result)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures=[]
+        for group in groups:
+            for chunk in group.chunks():
+                futures.append(pool.submit(group.run,chunk))
+        for future in as_completed(futures):
+            for result in future.result():
+                finished(result)
+    summary.elapsed=time.perf_counter()-start
+    return summary
@@ -0,0 +1,397 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Layered file extension -> mime type database
+
+Firefox only records the extensions of the mime types it has been asked
+about, so on its own ext2mime does not know most files.  These layers fill
+in the rest, each one only used for extensions the ones above it do not know:
+
+    firefox ........ the extensions in the profile's handlers.json
+    mime.types ..... ~/.mime.types, /etc/mime.types and friends
+    sharedMimeInfo . freedesktop shared-mime-info globs2/globs files
+                     (under $XDG_DATA_HOME and $XDG_DATA_DIRS)
+    bundled ........ a small built-in table of common types
+
+The order can be changed (or layers left out) by passing a different list
+of layer names.  Rather than trying each layer in turn on every lookup, the
+layers are compiled into one dict, so a lookup is still a single probe per
+candidate extension.
+
+The compiled (non-firefox) layers are kept in memory and in the cache
+directory, along with the (mtime,size,inode) of every source file that was
+looked for, so they are only parsed again when one of those files changes
+(or appears, or goes away).
+"""
+import os
+from ._cache import cacheEnabled,fileSignatureOrNone,getCacheDir,replaceFile
+from ._stats import timed
+
+
+# the layers, highest precedence first
+MIME_LAYERS=('firefox','mime.types','sharedMimeInfo','bundled')
+
+# bump this whenever the layout of the cached data changes
+MIMEDB_FORMAT=1
+
+# a fallback for when the system has no mime database of its own
+BUNDLED_MIME_TYPES={
+    '7z':'application/x-7z-compressed',
+    'aac':'audio/aac',
+    'avi':'video/x-msvideo',
+    'avif':'image/avif',
+    'bmp':'image/bmp',
+    'bz2':'application/x-bzip2',
+    'c':'text/x-csrc',
+    'css':'text/css',
+    'csv':'text/csv',
+    'doc':'application/msword',
+    'docx':'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'epub':'application/epub+zip',
+    'flac':'audio/flac',
+    'gif':'image/gif',
+    'gz':'application/gzip',
+    'h':'text/x-chdr',
+    'htm':'text/html',
+    'html':'text/html',
+    'ico':'image/vnd.microsoft.icon',
+    'ics':'text/calendar',
+    'jar':'application/java-archive',
+    'jpeg':'image/jpeg',
+    'jpg':'image/jpeg',
+    'js':'text/javascript',
+    'json':'application/json',
+    'md':'text/markdown',
+    'mjs':'text/javascript',
+    'mkv':'video/x-matroska',
+    'mov':'video/quicktime',
+    'mp3':'audio/mpeg',
+    'mp4':'video/mp4',
+    'mpeg':'video/mpeg',
+    'odp':'application/vnd.oasis.opendocument.presentation',
+    'ods':'application/vnd.oasis.opendocument.spreadsheet',
+    'odt':'application/vnd.oasis.opendocument.text',
+    'oga':'audio/ogg',
+    'ogg':'audio/ogg',
+    'ogv':'video/ogg',
+    'opus':'audio/ogg',
+    'otf':'font/otf',
+    'pdf':'application/pdf',
+    'png':'image/png',
+    'ppt':'application/vnd.ms-powerpoint',
+    'pptx':'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'py':'text/x-python',
+    'rar':'application/vnd.rar',
+    'rtf':'application/rtf',
+    'sh':'application/x-sh',
+    'svg':'image/svg+xml',
+    'tar':'application/x-tar',
+    'tar.bz2':'application/x-bzip-compressed-tar',
+    'tar.gz':'application/x-compressed-tar',
+    'tar.xz':'application/x-xz-compressed-tar',
+    'tgz':'application/x-compressed-tar',
+    'tif':'image/tiff',
+    'tiff':'image/tiff',
+    'ttf':'font/ttf',
+    'txt':'text/plain',
+    'wav':'audio/wav',
+    'weba':'audio/webm',
+    'webm':'video/webm',
+    'webp':'image/webp',
+    'woff':'font/woff',
+    'woff2':'font/woff2',
+    'xhtml':'application/xhtml+xml',
+    'xls':'application/vnd.ms-excel',
+    'xlsx':'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xml':'application/xml',
+    'xz':'application/x-xz',
+    'zip':'application/zip',
+    'zst':'application/zstd',
+    }
+
+
+def mimeTypesFiles():
+    """
+    the mime.types files that are looked for, highest precedence first
+    """
+    return [
+        os.path.join(os.path.expanduser('~'),'.mime.types'),
+        '/etc/mime.types',
+        '/etc/httpd/mime.types',
+        '/etc/httpd/conf/mime.types',
+        '/etc/apache/mime.types',
+        '/etc/apache2/mime.types',
+        '/usr/local/etc/httpd/conf/mime.types',
+        '/usr/local/lib/netscape/mime.types',
+        '/usr/local/etc/mime.types']
+
+
+def sharedMimeInfoDirs():
+    """
+    the freedesktop mime directories that are looked in, highest precedence first
+    """
+    dataHome=os.environ.get('XDG_DATA_HOME') \
+        or os.path.join(os.path.expanduser('~'),'.local','share')
+    dataDirs=os.environ.get('XDG_DATA_DIRS') or '/usr/local/share:/usr/share'
+    ret=[]
+    for directory in [dataHome]+dataDirs.split(os.pathsep):
+        if directory:
+            directory=os.path.join(directory,'mime')
+            if directory not in ret:
+                ret.append(directory)
+    return ret
+
+
+def sharedMimeInfoFiles():
+    """
+    the shared-mime-info glob files that are looked for, highest precedence first
+    (globs2 is preferred, so globs is only read if there is no globs2 beside it)
+    """
+    ret=[]
+    for directory in sharedMimeInfoDirs():
+        ret.append(os.path.join(directory,'globs2'))
+        ret.append(os.path.join(directory,'globs'))
+    return ret
+
+
+def readMimeTypes(filename):
+    """
+    read a mime.types file ("mime/type ext ext ..." per line)
+
+    :return: {ext:mimeType} (where an extension is listed twice, the last one wins)
+    """
+    ret={}
+    try:
+        with open(filename,'r',encoding='utf-8',errors='replace') as f:
+            for line in f:
+                words=line.split('#',1)[0].split()
+                if len(words)<2 or words[0].find('/')<0:
+                    continue
+                for ext in words[1:]:
+                    ret[ext.lower().lstrip('.')]=words[0]
+    except OSError:
+        pass
+    return ret
+
+
+def _globExtension(pattern):
+    """
+    the extension of a simple "*.ext" glob pattern, or None for anything fancier
+    """
+    if not pattern.startswith('*.'):
+        return None
+    ext=pattern[2:]
+    if not ext or any(c in ext for c in '*?[]'):
+        return None
+    return ext.lower()
+
+
+def readGlobs(filename):
+    """
+    read a shared-mime-info globs2 ("weight:mime/type:pattern[:flags]")
+    or globs ("mime/type:pattern") file
+
+    Only plain "*.ext" patterns are used, and case-sensitive ones are
+    skipped since extensions are matched without regard to case.
+
+    :return: {ext:mimeType} (where an extension is listed twice, the heaviest wins)
+    """
+    ret={}
+    weights={}
+    globs2=os.path.basename(filename)=='globs2'
+    try:
+        with open(filename,'r',encoding='utf-8',errors='replace') as f:
+            for line in f:
+                line=line.rstrip('\r\n')
+                if not line or line.startswith('#'):
+                    continue
+                fields=line.split(':')
+                if globs2:
+                    if len(fields)<3 or (len(fields)>3 and 'cs' in fields[3].split(',')):
+                        continue
+                    try:
+                        weight=int(fields[0])
+                    except ValueError:
+                        continue
+                    mimeType,pattern=fields[1],fields[2]
+                else:
+                    if len(fields)<2:
+                        continue
+                    weight=50
+                    mimeType,pattern=fields[0],':'.join(fields[1:])
+                ext=_globExtension(pattern)
+                if ext is None or mimeType.startswith('__'): # eg. __NOGLOBS__
+                    continue
+                if weight>weights.get(ext,-1):
+                    ret[ext]=mimeType
+                    weights[ext]=weight
+    except OSError:
+        pass
+    return ret
+
+
+def layerSources(layer):
+    """
+    the files a layer is read from, highest precedence first
+    """
+    if layer=='mime.types':
+        return mimeTypesFiles()
+    if layer=='sharedMimeInfo':
+        return sharedMimeInfoFiles()
+    if layer in ('firefox','bundled'):
+        return []
+    raise Exception('Unknown mime layer "%s"'%layer)
+
+
+def readLayer(layer):
+    """
+    everything a (non-firefox) layer knows
+
+    :return: {ext:mimeType}
+    """
+    ret={}
+    if layer=='bundled':
+        ret.update(BUNDLED_MIME_TYPES)
+    elif layer=='mime.types':
+        for filename in layerSources(layer):
+            for ext,mimeType in readMimeTypes(filename).items():
+                ret.setdefault(ext,mimeType)
+    elif layer=='sharedMimeInfo':
+        sources=layerSources(layer)
+        for filename in sources:
+            if filename.endswith('globs') and filename+'2' in sources \
+                    and os.path.exists(filename+'2'):
+                continue
+            for ext,mimeType in readGlobs(filename).items():
+                ret.setdefault(ext,mimeType)
+    else:
+        layerSources(layer) # complain about unknown layers
+    return ret
+
+
+class CompiledLayers:
+    """
+    The non-firefox layers, merged into the dicts that go below and
+    above the firefox layer
+    """
+
+    def __init__(self,layers,signatures,below,above,withFirefox):
+        self.layers=layers # the layer names, highest precedence first
+        self.signatures=signatures # ((filename,signature)) of every source looked for
+        self.below=below # {ext:mimeType} of the layers firefox takes precedence over
+        self.above=above # {ext:mimeType} of the layers that take precedence over firefox
+        self.withFirefox=withFirefox # whether the firefox layer is used at all
+
+
+def _sourceSignatures(layers):
+    ret=[]
+    for layer in layers:
+        for filename in layerSources(layer):
+            ret.append((filename,fileSignatureOrNone(filename)))
+    return tuple(ret)
+
+
+def layersSignature(layers=None):
+    """
+    a number that changes whenever what some layers would give does
+    (when any of their source files changes, appears or goes away), for
+    things compiled from the layers to tell whether they are out of date
+
+    :property layers: layer names, highest precedence first (default=MIME_LAYERS)
+
+    :return: a 64 bit number
+    """
+    import zlib
+    if layers is None:
+        layers=MIME_LAYERS
+    layers=tuple(layers)
+    key=repr((MIMEDB_FORMAT,layers,_sourceSignatures(layers))).encode('utf-8')
+    return (zlib.crc32(key)<<32)|zlib.adler32(key)
+
+
+def _merge(layers):
+    """
+    merge layers (highest precedence first) into one dict
+    """
+    ret={}
+    for layer in reversed(layers):
+        ret.update(readLayer(layer))
+    return ret
+
+
+def _cacheFilename(layers):
+    import zlib
+    key=','.join(layers).encode('utf-8')
+    return os.path.join(getCacheDir(),'mimeDb.%08x.pickle'%zlib.crc32(key))
+
+
+def _loadCompiled(layers,signatures):
+    """
+    the compiled layers from the cache directory, if none of the sources changed
+    """
+    import pickle
+    if not cacheEnabled():
+        return None
+    try:
+        with open(_cacheFilename(layers),'rb') as f:
+            if pickle.load(f)!=(MIMEDB_FORMAT,layers,signatures):
+                return None
+            below,above,withFirefox=pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,AttributeError,
+            ImportError,IndexError,TypeError,ValueError):
+        return None
+    return CompiledLayers(layers,signatures,below,above,withFirefox)
+
+
+def _saveCompiled(compiled):
+    """
+    save the compiled layers to the cache directory (failing quietly)
+    """
+    import pickle
+    if not cacheEnabled():
+        return
+    def write(f):
+        pickle.dump((MIMEDB_FORMAT,compiled.layers,compiled.signatures),f,
+            pickle.HIGHEST_PROTOCOL)
+        pickle.dump((compiled.below,compiled.above,compiled.withFirefox),f,
+            pickle.HIGHEST_PROTOCOL)
+    try:
+        replaceFile(_cacheFilename(compiled.layers),write)
+    except (OSError,pickle.PicklingError):
+        pass
+
+
+# {layers:CompiledLayers}
+_compiled={}
+
+
+def compileLayers(layers=None):
+    """
+    get the non-firefox layers merged into one lookup, parsing the source
+    files only if they have changed since last time
+
+    :property layers: layer names, highest precedence first (default=MIME_LAYERS)
+
+    :return: CompiledLayers
+    """
+    if layers is None:
+        layers=MIME_LAYERS
+    layers=tuple(layers)
+    if layers==('firefox',):
+        return CompiledLayers(layers,(),{},{},True)
+    signatures=_sourceSignatures(layers)
+    compiled=_compiled.get(layers)
+    if compiled is not None and compiled.signatures==signatures:
+        return compiled
+    with timed('mimeDb'):
+        compiled=_loadCompiled(layers,signatures)
+        if compiled is None:
+            if 'firefox' in layers:
+                i=layers.index('firefox')
+                compiled=CompiledLayers(layers,signatures,_merge(layers[i+1:]),
+                    _merge(layers[:i]),True)
+            else:
+                compiled=CompiledLayers(layers,signatures,_merge(layers),{},False)
+            _saveCompiled(compiled)
+    _compiled[layers]=compiled
+    return compiled
@@ -0,0 +1,297 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Find firefox profiles on windows, mac and linux
+
+The default profile is worked out the way firefox does it, from
+installs.ini (the profile each firefox install uses) and profiles.ini
+(Default=1), falling back to looking for a "*.default" directory.
+
+Working out the default profile is remembered (in memory and in a small
+text file in the cache directory) along with the (mtime,size,inode) of the
+ini files, so a cold start only has to stat them rather than parse them.
+"""
+import os
+import sys
+from ._cache import cacheEnabled,cacheFilename,fileSignatureOrNone,replaceFile
+
+
+class FirefoxProfile:
+    """
+    A firefox profile directory
+    """
+
+    def __init__(self,name,path,osUser=None,isDefault=False):
+        self.name=name # the name firefox shows for the profile
+        self.path=path # absolute path to the profile directory
+        self.osUser=osUser # the os user it belongs to (None=current user)
+        self.isDefault=isDefault # whether this is the profile firefox opens by default
+
+    @property
+    def profileId(self):
+        """
+        the name of the profile directory (eg. "abcd1234.default-release")
+        """
+        return os.path.basename(self.path.rstrip('/\\'))
+
+    @property
+    def handlersFilename(self):
+        """
+        the handlers.json file of this profile
+        """
+        return os.path.join(self.path,'handlers.json')
+
+    def __repr__(self):
+        ret='%s (%s)'%(self.name,self.path)
+        if self.osUser is not None:
+            ret='%s: %s'%(self.osUser,ret)
+        if self.isDefault:
+            ret+=' [default]'
+        return ret
+
+
+def _homeDir(osUser=None):
+    """
+    the home directory of an os user (default=current user)
+    """
+    if osUser is None:
+        return os.path.expanduser('~')
+    if os.name=='nt':
+        return os.path.join(os.path.dirname(os.path.expanduser('~')),osUser)
+    home=os.path.expanduser('~'+osUser)
+    if home.startswith('~'): # no such user as far as pwd knows
+        home=os.path.join(os.path.dirname(os.path.expanduser('~')),osUser)
+    return home
+
+
+def firefoxDataDir(osUser=None):
+    """
+    the directory that holds profiles.ini for an os user (default=current user)
+    """
+    if os.name=='nt':
+        appdata=os.environ.get('APPDATA')
+        if appdata and osUser is not None:
+            username=os.environ.get('USERNAME')
+            if username:
+                appdata=appdata.replace('\\%s\\'%username,'\\%s\\'%osUser)
+        elif not appdata:
+            appdata=os.path.join(_homeDir(osUser),'AppData','Roaming')
+        return os.path.join(appdata,'Mozilla','Firefox')
+    home=_homeDir(osUser)
+    if sys.platform=='darwin':
+        return os.path.join(home,'Library','Application Support','Firefox')
+    candidates=(
+        os.path.join(home,'.mozilla','firefox'),
+        os.path.join(home,'snap','firefox','common','.mozilla','firefox'),
+        os.path.join(home,'.var','app','org.mozilla.firefox','.mozilla','firefox'))
+    for candidate in candidates:
+        if os.path.exists(os.path.join(candidate,'profiles.ini')):
+            return candidate
+    return candidates[0]
+
+
+def _readIni(filename):
+    """
+    parse an ini file, ignoring it if it is missing or broken
+
+    :return: {section:{key:value}}
+    """
+    import configparser
+    parser=configparser.RawConfigParser(strict=False,interpolation=None)
+    parser.optionxform=str # keys are case sensitive (IsRelative, Path, ...)
+    try:
+        parser.read(filename,encoding='utf-8')
+    except (OSError,configparser.Error,UnicodeDecodeError):
+        return {}
+    return {section:dict(parser.items(section)) for section in parser.sections()}
+
+
+def _profilePath(dataDir,section):
+    """
+    the absolute path of the profile in an ini section
+    """
+    path=section.get('Path') or section.get('Default') or ''
+    if section.get('IsRelative','1')!='0':
+        path=os.path.join(dataDir,*path.split('/'))
+    return os.path.normpath(path)
+
+
+def _scanProfileDirs(dataDir):
+    """
+    profile directories when there is no profiles.ini
+    (windows keeps them in Profiles/, linux right in the data directory)
+    """
+    profilesDir=os.path.join(dataDir,'Profiles')
+    if not os.path.isdir(profilesDir):
+        profilesDir=dataDir
+    try:
+        with os.scandir(profilesDir) as it:
+            return [entry.path for entry in it
+                if entry.name.find('.')>=0 and entry.is_dir()]
+    except OSError:
+        return []
+
+
+def readProfiles(dataDir,osUser=None):
+    """
+    all of the profiles in a firefox data directory
+
+    :return: [FirefoxProfile] with the default one marked
+    """
+    profilesIni=_readIni(os.path.join(dataDir,'profiles.ini'))
+    installsIni=_readIni(os.path.join(dataDir,'installs.ini'))
+    # each firefox install says which profile it uses (newer versions
+    # also copy this into profiles.ini as [Install...] sections)
+    installs=list(installsIni.values())
+    installs.extend(section for name,section in profilesIni.items() if name.startswith('Install'))
+    installDefaults=set()
+    for section in installs:
+        if section.get('Default'):
+            installDefaults.add(_profilePath(dataDir,{'Path':section['Default'],
+                'IsRelative':section.get('IsRelative','1')}))
+    profiles=[]
+    for name,section in profilesIni.items():
+        if not name.startswith('Profile') or not section.get('Path'):
+            continue
+        path=_profilePath(dataDir,section)
+        profiles.append(FirefoxProfile(section.get('Name',os.path.basename(path)),
+            path,osUser,False))
+    if not profiles:
+        for path in _scanProfileDirs(dataDir):
+            profiles.append(FirefoxProfile(os.path.basename(path),path,osUser,False))
+    default=None
+    for profile in profiles:
+        if profile.path in installDefaults:
+            default=profile
+            break
+    if default is None:
+        for name,section in profilesIni.items():
+            if name.startswith('Profile') and section.get('Default')=='1':
+                path=_profilePath(dataDir,section)
+                default=next((p for p in profiles if p.path==path),None)
+                break
+    if default is None and profiles:
+        # the old way: the .default profile with the shortest name
+        candidates=[p for p in profiles if p.profileId.find('.default')>=0] or profiles
+        default=min(candidates,key=lambda p:len(p.path))
+    if default is not None:
+        default.isDefault=True
+    return profiles
+
+
+# {(dataDir,profileId):(iniSignatures,path)}
+_resolved={}
+
+
+def _cachedResolution(dataDir,signatures):
+    """
+    the default profile path from the on-disk cache, if the ini files are unchanged
+    """
+    if not cacheEnabled():
+        return None
+    try:
+        with open(cacheFilename(dataDir,'profile'),'r',encoding='utf-8') as f:
+            lines=f.read().split('\n')
+    except OSError:
+        return None
+    if len(lines)<2 or lines[0]!=repr(signatures):
+        return None
+    return lines[1] or None
+
+
+def _saveResolution(dataDir,signatures,path):
+    """
+    remember the default profile path in the on-disk cache
+    """
+    if not cacheEnabled():
+        return
+    try:
+        replaceFile(cacheFilename(dataDir,'profile'),
+            lambda f:f.write('%r\n%s\n'%(signatures,path)),text=True)
+    except OSError:
+        pass
+
+
+def findProfile(osUser=None,profileId=None):
+    """
+    get the path of a firefox profile directory
+
+    :property osUser: user on the os to find (default=current user)
+    :property profileId: firefox profile directory or name (default=the
+        profile firefox itself would open)
+    """
+    dataDir=firefoxDataDir(osUser)
+    signatures=(fileSignatureOrNone(os.path.join(dataDir,'profiles.ini')),
+        fileSignatureOrNone(os.path.join(dataDir,'installs.ini')))
+    key=(dataDir,profileId)
+    cached=_resolved.get(key)
+    if cached is not None and cached[0]==signatures:
+        return cached[1]
+    path=None
+    if profileId is None and signatures[0] is not None:
+        path=_cachedResolution(dataDir,signatures)
+    if path is None:
+        profiles=readProfiles(dataDir,osUser)
+        if profileId is None:
+            path=next((p.path for p in profiles if p.isDefault),None)
+            if path is None:
+                raise Exception('no firefox profiles found in "%s"'%dataDir)
+            if signatures[0] is not None:
+                _saveResolution(dataDir,signatures,path)
+        else:
+            for profile in profiles:
+                if profileId in (profile.profileId,profile.name,profile.path):
+                    path=profile.path
+                    break
+            else:
+                path=os.path.join(dataDir,'Profiles',profileId)
+                if not os.path.isdir(path):
+                    path=os.path.join(dataDir,profileId)
+                if not os.path.isdir(path):
+                    raise Exception('no firefox profile "%s" in "%s"'%(profileId,dataDir))
+    _resolved[key]=(signatures,path)
+    return path
+
+
+def listProfiles(osUser=None):
+    """
+    all of the firefox profiles of an os user (default=current user)
+
+    :return: [FirefoxProfile]
+    """
+    dataDir=firefoxDataDir(osUser)
+    if not os.path.isdir(dataDir):
+        return []
+    return readProfiles(dataDir,osUser)
+
+
+def listAllProfiles():
+    """
+    all of the firefox profiles of every os user we can see
+
+    Users are found by scanning the directory that the current user's
+    home directory is in (eg. /home, /Users or C:\\Users).
+
+    :return: [FirefoxProfile]
+    """
+    me=os.path.expanduser('~')
+    homes=os.path.dirname(me)
+    ret=[]
+    try:
+        with os.scandir(homes) as it:
+            users=sorted(entry.name for entry in it if entry.is_dir())
+    except OSError:
+        users=[]
+    for user in users:
+        if os.path.join(homes,user)==me:
+            osUser=None
+        else:
+            osUser=user
+        try:
+            profiles=listProfiles(osUser)
+        except OSError: # not allowed to look
+            continue
+        for profile in profiles:
+            profile.osUser=user
+        ret.extend(profiles)
+    return ret
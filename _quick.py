@@ -0,0 +1,138 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Quick lookups for scripts that shell out once per file
+
+Only pure queries are answered (file extension -> mime type, and mime type
+or url scheme -> handler target).  They are answered straight out of a
+memory-mapped BinaryIndex kept in the cache directory, which is only rebuilt
+(by loading the profile the slow way) when handlers.json or one of the
+system mime type files changes, so a warm call never imports json or
+subprocess, parses anything or builds objects.
+
+The answers are the same as FirefoxFormats gives (file extensions come from
+all of its default mimeLayers), whether or not caching is turned on.
+
+Usage:
+    python -m firefoxFormats._quick [options] ext2mime|mime|scheme query [query ...]
+"""
+import os
+import sys
+from ._cache import cacheEnabled,cacheFilename,fileSignature
+from ._binaryIndex import BinaryIndex
+from ._mimeDb import layersSignature
+
+
+def handlersFilename(osUser=None,profileId=None):
+    """
+    the handlers.json file of a firefox profile
+    """
+    from ._profiles import findProfile
+    return os.path.join(findProfile(osUser,profileId),'handlers.json')
+
+
+def openIndex(filename):
+    """
+    get a BinaryIndex for a handlers.json file, (re)compiling it
+    into the cache directory only if it is missing or out of date
+    """
+    indexFilename=cacheFilename(filename,'index')
+    signature=fileSignature(filename)
+    try:
+        index=BinaryIndex(indexFilename)
+        if index.sourceSignature==signature and index.layersSignature==layersSignature():
+            return index
+        index.close()
+    except Exception: # missing, or not an index we understand
+        pass
+    from ._firefoxFormats import FirefoxFormats
+    from ._binaryIndex import compileIndex
+    fff=FirefoxFormats(filename=filename)
+    compileIndex(fff,indexFilename,signature)
+    return BinaryIndex(indexFilename)
+
+
+def lookup(index,what,query):
+    """
+    answer a single query
+
+    :property index: a BinaryIndex or FirefoxFormats object
+    :property what: 'ext2mime', 'mime' or 'scheme'
+    :property query: a path, mime type or scheme (without ":")
+
+    :return: the answer, or None if there is none
+    """
+    if what=='ext2mime':
+        return index.fileExtensionToMime(query)
+    if isinstance(index,BinaryIndex):
+        if what=='mime':
+            return index.mimeTarget(query)
+        return index.schemeTarget(query)
+    if what=='mime':
+        handlers=index.mimeTypeHandlers.get(query)
+    else:
+        handlers=index.urlProtocolHandlers.get(query)
+    if handlers is None or not handlers.handlers:
+        return None
+    return handlers.getHandler().target
+
+
+def cmdline(args):
+    """
+    Run the command line
+
+    :param args: command line arguments (WITHOUT the filename)
+    """
+    filename=None
+    osUser=None
+    profileId=None
+    what=None
+    queries=[]
+    for arg in args:
+        if what is None and arg.startswith('-'):
+            arg=[a.strip() for a in arg.split('=',1)]
+            if arg[0]=='--file':
+                filename=arg[1]
+            elif arg[0]=='--user':
+                osUser=arg[1]
+            elif arg[0]=='--profile':
+                profileId=arg[1]
+            else:
+                what='help'
+        elif what is None:
+            what=arg
+        else:
+            queries.append(arg)
+    if what not in ('ext2mime','mime','scheme') or not queries:
+        print('Usage:')
+        print('  _quick.py [options] ext2mime|mime|scheme query [query ...]')
+        print('Options:')
+        print('   --file= ............ use a specific handlers.json instead of a profile')
+        print('   --user= ............ select an os user')
+        print('   --profile= ......... select a firefox profile')
+        print('Queries:')
+        print('   ext2mime path ...... print the mime type of a file')
+        print('   mime mimetype ...... print the application/webservice for a mime type')
+        print('   scheme scheme ...... print the application/webservice for a url scheme')
+        print('Prints one line per query (blank if unknown) and returns 1 if any were unknown.')
+        return -1
+    if filename is None:
+        filename=handlersFilename(osUser,profileId)
+    if cacheEnabled():
+        index=openIndex(filename)
+    else:
+        from ._firefoxFormats import FirefoxFormats
+        index=FirefoxFormats(filename=filename,useCache=False)
+    ret=0
+    write=sys.stdout.write
+    for query in queries:
+        answer=lookup(index,what,query)
+        if answer is None:
+            answer=''
+            ret=1
+        write(answer+'\n')
+    return ret
+
+
+if __name__=='__main__':
+    sys.exit(cmdline(sys.argv[1:]))
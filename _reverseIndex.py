@@ -0,0 +1,178 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Reverse indexes over the mime types and schemes of a profile
+
+Answers "what does this application handle?", "what is set to open in
+firefox?" and "what goes to this webservice?" with dict lookups, so the
+cost depends on how many answers there are, not on how big the profile is.
+
+Entries are identified by (kind,name) where kind is 'mimeTypes' or
+'schemes', and are added and removed one at a time as the model changes.
+"""
+
+
+def _host(uriTemplate):
+    """
+    the (lowercase) host of a webservice uriTemplate, or None
+    """
+    i=uriTemplate.find('://')
+    if i<0:
+        return None
+    host=uriTemplate[i+3:]
+    for end in '/?#':
+        j=host.find(end)
+        if j>=0:
+            host=host[:j]
+    host=host.rsplit('@',1)[-1]
+    if host.startswith('['): # ipv6
+        return host[:host.find(']')+1].lower() or None
+    return host.split(':',1)[0].lower() or None
+
+
+def entryFacts(entry):
+    """
+    what gets indexed about an entry
+
+    :property entry: a FirefoxHandlerSet or its raw json dict
+
+    :return: (action,[(handlerName,path,uriTemplate)])
+    """
+    if isinstance(entry,dict):
+        handlers=[]
+        for handler in entry.get('handlers') or ():
+            if handler:
+                handlers.append((handler.get('name'),handler.get('path'),handler.get('uriTemplate')))
+        return entry.get('action'),handlers
+    handlers=[]
+    for handler in entry.handlers or ():
+        if handler is not None:
+            handlers.append((handler.name,handler.path,handler.uriTemplate))
+    return entry.action,handlers
+
+
+class ReverseIndex:
+    """
+    handler name/path, action and webservice host -> entries
+    """
+
+    def __init__(self):
+        self._byName={} # handler name:{(kind,name)}
+        self._byPath={} # application path:{(kind,name)}
+        self._byAction={} # action:{(kind,name)}
+        self._byHost={} # webservice host:{(kind,name)}
+        self._keys={} # (kind,name):[(indexName,key)] so entries can be taken out again
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self,kind,name,entry):
+        """
+        index an entry (replacing what was there for it before)
+
+        :property entry: a FirefoxHandlerSet or its raw json dict
+        """
+        entryId=(kind,name)
+        if entryId in self._keys:
+            self.remove(kind,name)
+        action,handlers=entryFacts(entry)
+        keys=[]
+        if action is not None:
+            keys.append(('_byAction',int(action)))
+        for handlerName,path,uriTemplate in handlers:
+            if handlerName:
+                keys.append(('_byName',handlerName))
+            if path is not None:
+                keys.append(('_byPath',path))
+            if uriTemplate is not None:
+                host=_host(uriTemplate)
+                if host is not None:
+                    keys.append(('_byHost',host))
+        for indexName,key in keys:
+            getattr(self,indexName).setdefault(key,set()).add(entryId)
+        self._keys[entryId]=keys
+
+    def remove(self,kind,name):
+        """
+        take an entry out of the index
+        """
+        for indexName,key in self._keys.pop((kind,name),()):
+            index=getattr(self,indexName)
+            entries=index.get(key)
+            if entries is not None:
+                entries.discard((kind,name))
+                if not entries:
+                    del index[key]
+
+    def copy(self):
+        """
+        an independent copy of this index
+        """
+        ret=ReverseIndex()
+        for indexName in ('_byName','_byPath','_byAction','_byHost'):
+            setattr(ret,indexName,{key:set(entries)
+                for key,entries in getattr(self,indexName).items()})
+        ret._keys=dict(self._keys)
+        return ret
+
+    @staticmethod
+    def _sorted(entries,kind=None):
+        """
+        a stable, sorted list of entries, optionally only of one kind
+        """
+        if not entries:
+            return []
+        return sorted(e for e in entries if kind is None or e[0]==kind)
+
+    def byApplication(self,nameOrPath,kind=None):
+        """
+        the entries handled by an application, given its handler name or path
+
+        :property kind: only 'mimeTypes' or 'schemes' (default=both)
+
+        :return: sorted [(kind,name)]
+        """
+        entries=set(self._byName.get(nameOrPath,()))
+        entries.update(self._byPath.get(nameOrPath,()))
+        return self._sorted(entries,kind)
+
+    def byAction(self,action,kind=None):
+        """
+        the entries with a given action (a HandlerAction, its value or its name)
+
+        :return: sorted [(kind,name)]
+        """
+        if isinstance(action,str):
+            from ._firefoxFormats import HandlerAction
+            name=action.strip().upper()
+            if name.startswith('ACTION_'):
+                name=name[7:]
+            if name.isdigit():
+                action=int(name)
+            else:
+                found=HandlerAction.__members__.get(name)
+                if found is None:
+                    raise Exception('Unknown action "%s" (should be one of %s)'%(action,
+                        ', '.join(HandlerAction.__members__)))
+                action=found
+        return self._sorted(self._byAction.get(int(action)),kind)
+
+    def byHost(self,host,kind=None):
+        """
+        the entries that go to a webservice on a given host
+
+        :return: sorted [(kind,name)]
+        """
+        return self._sorted(self._byHost.get(host.lower()),kind)
+
+    def applications(self):
+        """
+        every application path that handles something
+        """
+        return sorted(self._byPath)
+
+    def hosts(self):
+        """
+        every webservice host that handles something
+        """
+        return sorted(self._byHost)
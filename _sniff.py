@@ -0,0 +1,270 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Work out the mime type of a file from its first few bytes
+
+For files whose extension says nothing (or that have none), only the
+first SNIFF_SIZE bytes are read, into a buffer that is reused from one
+file to the next, and matched against a table of magic signatures.
+
+Rather than trying every signature in turn, the table is compiled into a
+dict keyed on the first byte, so only the handful of signatures that could
+possibly match are looked at (plus the few that do not start at offset 0).
+Anything that matches nothing but looks like text is text/plain.
+
+Whole directory trees can be sniffed on a pool of threads (each with its
+own buffer) with sniffTree().
+"""
+import os
+import threading
+
+
+# how much of each file is read
+SNIFF_SIZE=4096
+
+# (((offset,bytes),...),mimeType) where every part has to match
+# (two-byte magic numbers get a second part, so text starting with "BM" or
+# "MZ" is not taken for one)
+MAGIC_SIGNATURES=(
+    (((0,b'%PDF-'),),'application/pdf'),
+    (((0,b'\x89PNG\r\n\x1a\n'),),'image/png'),
+    (((0,b'\xff\xd8\xff'),),'image/jpeg'),
+    (((0,b'GIF87a'),),'image/gif'),
+    (((0,b'GIF89a'),),'image/gif'),
+    (((0,b'BM'),(6,b'\x00\x00\x00\x00')),'image/bmp'),
+    (((0,b'II*\x00'),),'image/tiff'),
+    (((0,b'MM\x00*'),),'image/tiff'),
+    (((0,b'\x00\x00\x01\x00'),),'image/vnd.microsoft.icon'),
+    (((0,b'RIFF'),(8,b'WEBP')),'image/webp'),
+    (((0,b'RIFF'),(8,b'WAVE')),'audio/wav'),
+    (((0,b'RIFF'),(8,b'AVI ')),'video/x-msvideo'),
+    (((4,b'ftyp'),(8,b'avif')),'image/avif'),
+    (((4,b'ftyp'),(8,b'heic')),'image/heic'),
+    (((4,b'ftyp'),(8,b'qt  ')),'video/quicktime'),
+    (((4,b'ftyp'),),'video/mp4'),
+    (((0,b'\x1aE\xdf\xa3'),),'video/webm'),
+    (((0,b'OggS'),),'audio/ogg'),
+    (((0,b'fLaC'),),'audio/flac'),
+    (((0,b'ID3'),),'audio/mpeg'),
+    (((0,b'PK\x03\x04'),(30,b'mimetypeapplication/epub+zip')),'application/epub+zip'),
+    (((0,b'PK\x03\x04'),(30,b'mimetypeapplication/vnd.oasis.opendocument.text')),
+        'application/vnd.oasis.opendocument.text'),
+    (((0,b'PK\x03\x04'),(30,b'mimetypeapplication/vnd.oasis.opendocument.spreadsheet')),
+        'application/vnd.oasis.opendocument.spreadsheet'),
+    (((0,b'PK\x03\x04'),(30,b'mimetypeapplication/vnd.oasis.opendocument.presentation')),
+        'application/vnd.oasis.opendocument.presentation'),
+    (((0,b'PK\x03\x04'),),'application/zip'),
+    (((0,b'PK\x05\x06'),),'application/zip'),
+    (((0,b'\x1f\x8b'),),'application/gzip'),
+    (((0,b'BZh'),),'application/x-bzip2'),
+    (((0,b'\xfd7zXZ\x00'),),'application/x-xz'),
+    (((0,b'(\xb5/\xfd'),),'application/zstd'),
+    (((0,b"7z\xbc\xaf'\x1c"),),'application/x-7z-compressed'),
+    (((0,b'Rar!\x1a\x07'),),'application/vnd.rar'),
+    (((257,b'ustar'),),'application/x-tar'),
+    (((0,b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'),),'application/x-ole-storage'),
+    (((0,b'{\\rtf'),),'application/rtf'),
+    (((0,b'%!PS'),),'application/postscript'),
+    (((0,b'SQLite format 3\x00'),),'application/vnd.sqlite3'),
+    (((0,b'\x7fELF'),),'application/x-executable'),
+    (((0,b'MZ'),(0x18,b'\x40\x00')),'application/vnd.microsoft.portable-executable'),
+    (((0,b'wOFF'),),'font/woff'),
+    (((0,b'wOF2'),),'font/woff2'),
+    (((0,b'OTTO'),),'font/otf'),
+    (((0,b'\x00\x01\x00\x00\x00'),),'font/ttf'),
+    )
+
+# what text starts with (after any whitespace, lowercased) -> mime type
+TEXT_SIGNATURES=(
+    (b'<!doctype html','text/html'),
+    (b'<html','text/html'),
+    (b'<svg','image/svg+xml'),
+    (b'<?xml','application/xml'),
+    )
+
+
+class SignatureTable:
+    """
+    MAGIC_SIGNATURES compiled for matching by leading byte
+    """
+
+    def __init__(self,signatures=None):
+        """
+        :property signatures: [(((offset,bytes),...),mimeType)]
+            (default=MAGIC_SIGNATURES)
+        """
+        if signatures is None:
+            signatures=MAGIC_SIGNATURES
+        self._byFirstByte={} # byte value:[(parts,mimeType)] for signatures starting at offset 0
+        self._elsewhere=[] # [(parts,mimeType)] for the rest
+        for parts,mimeType in signatures:
+            parts=tuple(sorted(parts))
+            if parts[0][0]==0:
+                self._byFirstByte.setdefault(parts[0][1][0],[]).append((parts,mimeType))
+            else:
+                self._elsewhere.append((parts,mimeType))
+        # the most specific signatures get the first chance to match
+        def specificity(signature):
+            return -sum(len(data) for _,data in signature[0])
+        for candidates in self._byFirstByte.values():
+            candidates.sort(key=specificity)
+        self._elsewhere.sort(key=specificity)
+
+    def match(self,buffer,length=None):
+        """
+        find the mime type of some leading bytes of a file
+
+        :property buffer: bytes or bytearray
+        :property length: how much of the buffer is valid (default=all of it)
+
+        :return: the mime type, or None if it is not recognised
+        """
+        if length is None:
+            length=len(buffer)
+        if not length:
+            return None
+        candidates=self._byFirstByte.get(buffer[0])
+        if candidates is not None:
+            for parts,mimeType in candidates:
+                for offset,data in parts:
+                    if not buffer.startswith(data,offset,length):
+                        break
+                else:
+                    return mimeType
+        for parts,mimeType in self._elsewhere:
+            for offset,data in parts:
+                if not buffer.startswith(data,offset,length):
+                    break
+            else:
+                return mimeType
+        return sniffText(bytes(buffer[:length]))
+
+
+def sniffText(data):
+    """
+    the mime type of something that looks like text, or None if it does not
+    """
+    if data.startswith(b'\xef\xbb\xbf'):
+        data=data[3:]
+    if data.find(b'\x00')>=0:
+        return None
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start<len(data)-3: # (not just a character cut off at the end)
+            return None
+    start=data[:64].lstrip().lower()
+    for prefix,mimeType in TEXT_SIGNATURES:
+        if start.startswith(prefix):
+            if mimeType=='application/xml' and data.find(b'<svg')>=0:
+                return 'image/svg+xml'
+            return mimeType
+    return 'text/plain'
+
+
+DEFAULT_TABLE=SignatureTable()
+
+
+class Sniffer:
+    """
+    Sniffs files one after another, reusing the same read buffer
+
+    (not thread safe; use one per thread)
+    """
+
+    def __init__(self,table=None,size=SNIFF_SIZE):
+        self.table=table or DEFAULT_TABLE
+        self._buffer=bytearray(size)
+        self._view=memoryview(self._buffer)
+
+    def sniff(self,path):
+        """
+        the mime type of a file from its first few bytes, or None
+
+        (raises OSError if it cannot be read)
+        """
+        with open(path,'rb',buffering=0) as f:
+            length=f.readinto(self._view)
+        return self.table.match(self._buffer,length)
+
+
+_local=threading.local()
+
+
+def sniffFile(path):
+    """
+    the mime type of a file from its first few bytes, or None
+    (using a Sniffer kept for the calling thread)
+
+    (raises OSError if it cannot be read)
+    """
+    sniffer=getattr(_local,'sniffer',None)
+    if sniffer is None:
+        sniffer=Sniffer()
+        _local.sniffer=sniffer
+    return sniffer.sniff(path)
+
+
+def iterFiles(paths):
+    """
+    yield every file in a list of files and directories
+    (see _tree.walkTree())
+    """
+    from ._tree import walkTree
+    return walkTree(paths,jobs=1)
+
+
+def _sniffChunk(paths,lookup):
+    ret=[]
+    for path in paths:
+        mimeType=None
+        if lookup is not None:
+            mimeType=lookup(path)
+        if mimeType is None:
+            try:
+                mimeType=sniffFile(path)
+            except OSError:
+                pass
+        ret.append((path,mimeType))
+    return ret
+
+
+def sniffTree(paths,jobs=None,lookup=None,chunkSize=64):
+    """
+    sniff every file in a list of files and directories on a pool of threads
+
+    :property paths: files and/or directories
+    :property jobs: how many threads to use (default=a few per cpu, since
+        this is mostly waiting on the disk)
+    :property lookup: optional lookup(path) to try first (eg. an
+        ExtensionIndex's lookup), so only files it does not know are read
+    :property chunkSize: how many files each thread is given at a time
+
+    :return: generator of (path,mimeType) in the order they finish
+        (mimeType is None if it is not recognised or cannot be read)
+    """
+    if jobs is None:
+        jobs=min(32,(os.cpu_count() or 1)*4)
+    jobs=max(1,jobs)
+    files=iterFiles(paths)
+    if jobs==1:
+        for path in files:
+            yield _sniffChunk((path,),lookup)[0]
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    from ._batch import BoundedSubmitter
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        submitter=BoundedSubmitter(pool,jobs)
+        chunk=[]
+        for path in files:
+            chunk.append(path)
+            if len(chunk)<chunkSize:
+                continue
+            for results in submitter.submit(_sniffChunk,chunk,lookup):
+                yield from results
+            chunk=[]
+        if chunk:
+            for results in submitter.submit(_sniffChunk,chunk,lookup):
+                yield from results
+        for results in submitter.drain():
+            yield from results
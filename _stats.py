@@ -0,0 +1,218 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing of where the time goes
+
+The interesting phases (finding the profile, reading, parsing, building the
+model, building ext2mime, lookups, dispatching and spawning handlers) are
+wrapped in timed(phase).  Nothing is measured until either enableStats()
+is called or a callback is added with addStatsCallback(), so it costs next
+to nothing when nobody is looking.
+
+The totals can be printed, or written out in Prometheus text format.
+"""
+import time
+
+
+# upper bounds (in seconds) of the Prometheus histogram buckets
+BUCKETS=(0.0001,0.0005,0.001,0.005,0.01,0.05,0.1,0.5,1.0,5.0,10.0)
+
+_enabled=False
+_callbacks=[]
+
+
+class PhaseStats:
+    """
+    Counters and latencies for one phase
+    """
+
+    __slots__=('phase','count','total','min','max','buckets')
+
+    def __init__(self,phase):
+        self.phase=phase
+        self.count=0
+        self.total=0.0
+        self.min=None
+        self.max=0.0
+        self.buckets=[0]*len(BUCKETS) # how many took <= each of BUCKETS
+
+    def add(self,elapsed):
+        """
+        record one timing (in seconds)
+        """
+        self.count+=1
+        self.total+=elapsed
+        if self.min is None or elapsed<self.min:
+            self.min=elapsed
+        if elapsed>self.max:
+            self.max=elapsed
+        for i,bound in enumerate(BUCKETS):
+            if elapsed<=bound:
+                self.buckets[i]+=1
+                break
+
+    @property
+    def average(self):
+        """
+        average time in seconds
+        """
+        if not self.count:
+            return 0.0
+        return self.total/self.count
+
+    def __repr__(self):
+        return '%-12s %8d %10.3f %10.3f %10.3f %10.3f'%(self.phase,self.count,
+            self.total*1000,self.average*1000,(self.min or 0.0)*1000,self.max*1000)
+
+
+class StatsRegistry:
+    """
+    All of the PhaseStats collected so far
+    """
+
+    def __init__(self):
+        import threading
+        self.phases={}
+        self._lock=threading.Lock()
+
+    def record(self,phase,elapsed):
+        """
+        record one timing (in seconds) of a phase
+        """
+        with self._lock:
+            stats=self.phases.get(phase)
+            if stats is None:
+                stats=PhaseStats(phase)
+                self.phases[phase]=stats
+            stats.add(elapsed)
+
+    def reset(self):
+        """
+        forget everything recorded so far
+        """
+        with self._lock:
+            self.phases={}
+
+    def prometheus(self):
+        """
+        the stats in Prometheus text exposition format
+        """
+        name='firefoxformats_phase_seconds'
+        ret=['# HELP %s Time spent in each phase of firefoxFormats.'%name,
+            '# TYPE %s histogram'%name]
+        with self._lock:
+            phases=sorted(self.phases.values(),key=lambda stats:stats.phase)
+            for stats in phases:
+                cumulative=0
+                for bound,count in zip(BUCKETS,stats.buckets):
+                    cumulative+=count
+                    ret.append('%s_bucket{phase="%s",le="%s"} %d'%(name,stats.phase,bound,cumulative))
+                ret.append('%s_bucket{phase="%s",le="+Inf"} %d'%(name,stats.phase,stats.count))
+                ret.append('%s_sum{phase="%s"} %r'%(name,stats.phase,stats.total))
+                ret.append('%s_count{phase="%s"} %d'%(name,stats.phase,stats.count))
+            ret.append('# HELP firefoxformats_phase_max_seconds Slowest time seen for each phase.')
+            ret.append('# TYPE firefoxformats_phase_max_seconds gauge')
+            for stats in phases:
+                ret.append('firefoxformats_phase_max_seconds{phase="%s"} %r'%(stats.phase,stats.max))
+        return '\n'.join(ret)+'\n'
+
+    def writePrometheus(self,filename):
+        """
+        write the stats in Prometheus text format to a file
+
+        (written to a temporary file first so a scraper, eg. node_exporter's
+        textfile collector, never sees half a file)
+        """
+        from ._cache import replaceFile
+        data=self.prometheus()
+        replaceFile(filename,lambda f:f.write(data),text=True)
+
+    def __repr__(self):
+        ret=['%-12s %8s %10s %10s %10s %10s'%('phase','count','total ms','avg ms','min ms','max ms')]
+        with self._lock:
+            for stats in self.phases.values():
+                ret.append(repr(stats))
+        return '\n'.join(ret)
+
+
+STATS=StatsRegistry()
+
+
+def enableStats(enabled=True):
+    """
+    turn collecting stats into STATS on or off
+    """
+    global _enabled
+    _enabled=enabled
+
+
+def statsEnabled():
+    """
+    whether anything is being timed
+    """
+    return _enabled or bool(_callbacks)
+
+
+def addStatsCallback(callback):
+    """
+    call callback(phase,elapsedSeconds) every time a phase finishes
+    """
+    _callbacks.append(callback)
+
+
+def removeStatsCallback(callback):
+    """
+    stop calling a callback added with addStatsCallback()
+    """
+    _callbacks.remove(callback)
+
+
+class _Timer:
+    """
+    Context manager that times one phase
+    """
+
+    __slots__=('phase','start')
+
+    def __init__(self,phase):
+        self.phase=phase
+        self.start=0.0
+
+    def __enter__(self):
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        elapsed=time.perf_counter()-self.start
+        if _enabled:
+            STATS.record(self.phase,elapsed)
+        for callback in _callbacks:
+            callback(self.phase,elapsed)
+
+
+class _NullTimer:
+    """
+    Context manager that does nothing (for when nobody is looking)
+    """
+
+    __slots__=()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        pass
+
+
+_NULL_TIMER=_NullTimer()
+
+
+def timed(phase):
+    """
+    time a phase, eg:
+        with timed('parse'):
+            ...
+    """
+    if not _enabled and not _callbacks:
+        return _NULL_TIMER
+    return _Timer(phase)
@@ -0,0 +1,355 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+A SQLite database of the handlers of many profiles
+
+Rather than keeping a FirefoxFormats object in memory per profile to answer
+questions across a whole fleet ("which profiles map .xyz to something other
+than our viewer?"), import them all into one indexed database and ask it.
+
+Each profile is stored with a hash of its contents, so importing the same
+files again only re-imports the ones that actually changed.
+
+Tables:
+    profiles(id,source,hash,size,mtime,version,imported)
+    mimeTypes(id,profile,name,action,ask,stubEntry,json)
+    schemes(id,profile,name,action,ask,stubEntry,json)
+    extensions(profile,ext,mimeType)
+    handlers(profile,kind,entry,position,name,path,uriTemplate)
+"""
+import os
+import time
+
+
+SCHEMA_VERSION=1
+
+SCHEMA='''
+CREATE TABLE IF NOT EXISTS profiles(
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    hash BLOB NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    version TEXT,
+    imported REAL);
+CREATE TABLE IF NOT EXISTS mimeTypes(
+    id INTEGER PRIMARY KEY,
+    profile INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    action INTEGER,
+    ask INTEGER,
+    stubEntry INTEGER,
+    json TEXT);
+CREATE TABLE IF NOT EXISTS schemes(
+    id INTEGER PRIMARY KEY,
+    profile INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    action INTEGER,
+    ask INTEGER,
+    stubEntry INTEGER,
+    json TEXT);
+CREATE TABLE IF NOT EXISTS extensions(
+    profile INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    ext TEXT NOT NULL,
+    mimeType TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS handlers(
+    profile INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    path TEXT,
+    uriTemplate TEXT);
+CREATE INDEX IF NOT EXISTS mimeTypesByName ON mimeTypes(name);
+CREATE INDEX IF NOT EXISTS mimeTypesByProfile ON mimeTypes(profile);
+CREATE INDEX IF NOT EXISTS schemesByName ON schemes(name);
+CREATE INDEX IF NOT EXISTS schemesByProfile ON schemes(profile);
+CREATE INDEX IF NOT EXISTS extensionsByExt ON extensions(ext);
+CREATE INDEX IF NOT EXISTS extensionsByProfile ON extensions(profile);
+CREATE INDEX IF NOT EXISTS handlersByEntry ON handlers(kind,entry,position);
+CREATE INDEX IF NOT EXISTS handlersByPath ON handlers(path);
+CREATE INDEX IF NOT EXISTS handlersByName ON handlers(name);
+CREATE INDEX IF NOT EXISTS handlersByProfile ON handlers(profile);
+'''
+
+
+def defaultStoreFilename():
+    """
+    where the store lives if nobody says otherwise
+
+    (in the user's data directory rather than the cache directory, since
+    it is not something that can be rebuilt from a single profile, and
+    clearing the cache empties the cache directory)
+    """
+    if os.name=='nt':
+        base=os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base=os.environ.get('XDG_DATA_HOME') \
+            or os.path.join(os.path.expanduser('~'),'.local','share')
+    return os.path.join(base,'firefoxFormats','handlers.sqlite')
+
+
+def _hash(data):
+    import hashlib
+    return hashlib.blake2b(data,digest_size=16).digest()
+
+
+class HandlerStore:
+    """
+    A SQLite database of the handlers of many profiles
+    """
+
+    def __init__(self,filename=None):
+        """
+        :property filename: the database file (default=defaultStoreFilename())
+        """
+        import sqlite3
+        if filename is None:
+            filename=defaultStoreFilename()
+        if filename!=':memory:':
+            directory=os.path.dirname(os.path.abspath(filename))
+            os.makedirs(directory,exist_ok=True)
+        self.filename=filename
+        self._queryDb=None # the read-only connection for query()
+        self.db=sqlite3.connect(filename)
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        version=self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0,SCHEMA_VERSION):
+            raise Exception('"%s" is a version %d store, expected %d'%(filename,version,SCHEMA_VERSION))
+        self.db.executescript(SCHEMA)
+        self.db.execute('PRAGMA user_version=%d'%SCHEMA_VERSION)
+
+    def close(self):
+        """
+        close the database
+        """
+        if self._queryDb is not None:
+            self._queryDb.close()
+            self._queryDb=None
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        self.close()
+
+    def _storedHash(self,source):
+        row=self.db.execute('SELECT hash FROM profiles WHERE source=?',(source,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _insert(self,source,contentHash,jsonDict,size=None,mtime=None):
+        """
+        replace everything stored for a profile (call within a transaction)
+        """
+        import json
+        db=self.db
+        db.execute('DELETE FROM profiles WHERE source=?',(source,))
+        version=jsonDict.get('defaultHandlersVersion')
+        if version is not None:
+            version=json.dumps(version,sort_keys=True)
+        profileId=db.execute('INSERT INTO profiles(source,hash,size,mtime,version,imported) '
+            'VALUES(?,?,?,?,?,?)',(source,contentHash,size,mtime,version,time.time())).lastrowid
+        extensions=[]
+        handlers=[]
+        for kind in ('mimeTypes','schemes'):
+            rows=[]
+            for name,raw in (jsonDict.get(kind) or {}).items():
+                action=raw.get('action')
+                rows.append((profileId,name,None if action is None else int(action),
+                    int(bool(raw.get('ask'))),int(bool(raw.get('stubEntry'))),
+                    json.dumps(raw,separators=(',',':'))))
+                if kind=='mimeTypes':
+                    for ext in raw.get('extensions') or ():
+                        extensions.append((profileId,ext.lower(),name))
+                for position,handler in enumerate(raw.get('handlers') or ()):
+                    if handler:
+                        handlers.append((profileId,kind,name,position,handler.get('name'),
+                            handler.get('path'),handler.get('uriTemplate')))
+            db.executemany('INSERT INTO %s(profile,name,action,ask,stubEntry,json) '
+                'VALUES(?,?,?,?,?,?)'%kind,rows)
+        db.executemany('INSERT INTO extensions(profile,ext,mimeType) VALUES(?,?,?)',extensions)
+        db.executemany('INSERT INTO handlers(profile,kind,entry,position,name,path,uriTemplate) '
+            'VALUES(?,?,?,?,?,?,?)',handlers)
+
+    def importFile(self,filename,source=None):
+        """
+        import (or re-import) a handlers.json file
+
+        :property source: what to call the profile (default=the absolute path)
+
+        :return: whether it was imported (False if it was unchanged)
+        """
+        import json
+        if source is None:
+            source=os.path.abspath(filename)
+        with open(filename,'rb') as f:
+            st=os.fstat(f.fileno())
+            data=f.read()
+        contentHash=_hash(data)
+        if self._storedHash(source)==contentHash:
+            return False
+        jsonDict=json.loads(data)
+        with self.db:
+            self._insert(source,contentHash,jsonDict,st.st_size,st.st_mtime_ns)
+        return True
+
+    def importFormats(self,fff,source=None):
+        """
+        import (or re-import) a FirefoxFormats object
+
+        :property source: what to call the profile (default=its filename)
+
+        :return: whether it was imported (False if it was unchanged)
+        """
+        import json
+        jsonDict=fff.jsonDict
+        if source is None:
+            source=os.path.abspath(fff.filename)
+        contentHash=_hash(json.dumps(jsonDict,sort_keys=True,separators=(',',':')).encode('utf-8'))
+        if self._storedHash(source)==contentHash:
+            return False
+        with self.db:
+            self._insert(source,contentHash,jsonDict)
+        return True
+
+    def importMany(self,items,report=None):
+        """
+        import many profiles
+
+        :property items: file paths, directories (searched for *.json files)
+            and/or FirefoxFormats objects
+        :property report: called with (source,imported,error) for each one
+
+        :return: (imported,unchanged,failed) counts
+        """
+        from ._diff import iterProfileFiles
+        counts=[0,0,0]
+        def importOne(source,do):
+            try:
+                imported=do()
+            except (OSError,ValueError,AttributeError,TypeError) as e:
+                counts[2]+=1
+                if report is not None:
+                    report(source,False,e)
+                return
+            counts[0 if imported else 1]+=1
+            if report is not None:
+                report(source,imported,None)
+        files=[]
+        for item in items:
+            if isinstance(item,str):
+                files.append(item)
+            else:
+                importOne(getattr(item,'_filename',None),lambda item=item:self.importFormats(item))
+        for filename in iterProfileFiles(files):
+            importOne(filename,lambda filename=filename:self.importFile(filename))
+        return tuple(counts)
+
+    def forget(self,source):
+        """
+        remove a profile from the store
+
+        :return: whether it was there
+        """
+        with self.db:
+            return self.db.execute('DELETE FROM profiles WHERE source=?',(source,)).rowcount>0
+
+    def prune(self):
+        """
+        remove profiles whose source file no longer exists
+
+        :return: how many were removed
+        """
+        gone=[source for source, in self.db.execute('SELECT source FROM profiles')
+            if not os.path.exists(source)]
+        for source in gone:
+            self.forget(source)
+        return len(gone)
+
+    def query(self,sql,params=()):
+        """
+        run a read-only query against the store
+
+        The query runs on a connection of its own with PRAGMA query_only=ON,
+        so anything that would change the store fails with an error.
+
+        :return: list of row tuples
+        """
+        import sqlite3
+        if self.filename==':memory:':
+            # (a second connection would get an empty database of its own)
+            self.db.execute('PRAGMA query_only=ON')
+            try:
+                return self.db.execute(sql,params).fetchall()
+            finally:
+                self.db.execute('PRAGMA query_only=OFF')
+        if self._queryDb is None:
+            self._queryDb=sqlite3.connect(self.filename)
+            self._queryDb.execute('PRAGMA query_only=ON')
+        return self._queryDb.execute(sql,params).fetchall()
+
+    @property
+    def profiles(self):
+        """
+        the sources of all of the profiles in the store
+        """
+        return [source for source, in self.db.execute('SELECT source FROM profiles ORDER BY source')]
+
+    def extensionOwners(self,ext):
+        """
+        what every profile does with a file extension
+
+        :return: [(profile,mimeType,defaultHandler)] where defaultHandler is
+            the application path or webservice of the first handler (or None)
+        """
+        return self.query('''SELECT p.source,e.mimeType,COALESCE(h.path,h.uriTemplate)
+            FROM extensions e JOIN profiles p ON p.id=e.profile
+            LEFT JOIN handlers h ON h.profile=e.profile AND h.kind='mimeTypes'
+                AND h.entry=e.mimeType AND h.position=0
+            WHERE e.ext=? ORDER BY p.source,e.mimeType''',(ext.lower().lstrip('.'),))
+
+    def extensionMismatches(self,ext,expected):
+        """
+        the profiles that map a file extension to something other than expected
+
+        :property expected: the mime type, handler name, application path
+            or webservice that it should go to
+
+        :return: [(profile,mimeType,defaultHandler)]
+        """
+        return self.query('''SELECT p.source,e.mimeType,COALESCE(h.path,h.uriTemplate)
+            FROM extensions e JOIN profiles p ON p.id=e.profile
+            LEFT JOIN handlers h ON h.profile=e.profile AND h.kind='mimeTypes'
+                AND h.entry=e.mimeType AND h.position=0
+            WHERE e.ext=? AND e.mimeType IS NOT ?
+                AND h.name IS NOT ? AND h.path IS NOT ? AND h.uriTemplate IS NOT ?
+            ORDER BY p.source,e.mimeType''',
+            (ext.lower().lstrip('.'),expected,expected,expected,expected))
+
+    def profilesWith(self,name,kind='mimeTypes'):
+        """
+        the profiles that have a mime type or scheme
+
+        :return: [(profile,action)]
+        """
+        if kind not in ('mimeTypes','schemes'):
+            raise Exception('Unknown kind "%s"'%kind)
+        return self.query('''SELECT p.source,m.action FROM %s m JOIN profiles p ON p.id=m.profile
+            WHERE m.name=? ORDER BY p.source'''%kind,(name,))
+
+    def profilesUsing(self,nameOrPath):
+        """
+        where an application (by handler name or path) is used
+
+        :return: [(profile,kind,entry,position)]
+        """
+        return self.query('''SELECT p.source,h.kind,h.entry,h.position
+            FROM handlers h JOIN profiles p ON p.id=h.profile
+            WHERE h.path=? UNION SELECT p.source,h.kind,h.entry,h.position
+            FROM handlers h JOIN profiles p ON p.id=h.profile
+            WHERE h.name=? ORDER BY 1,2,3''',(nameOrPath,nameOrPath))
@@ -0,0 +1,356 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Open every file in a directory tree with its handler
+
+The tree is scanned with os.scandir on a pool of threads (one directory
+per task), and files are classified through ext2mime as each directory
+comes back, so work starts long before the scan is finished.
+
+Files are grouped by mime type and handler.  Applications that take their
+files as trailing arguments are launched as soon as a group has a full
+command line worth of files (see _launch), so a directory of hundreds of
+thousands of files needs a handful of processes rather than one per file.
+
+Files can be picked with include/exclude globs and a depth limit, and
+planTree() works out what would be run without running anything.
+
+Only regular files are taken (fifos, sockets and devices would block or
+make no sense to open).  Symlinks to files are taken, but symlinks to
+directories are not followed, the same as os.walk(), so a walk can not
+loop or wander out of the tree.
+"""
+import os
+import time
+from ._batch import BatchResult,BatchSummary,BoundedSubmitter,defaultJobs
+from ._launch import LaunchGroup,argCost,argLimit
+
+
+def _compileGlobs(globs):
+    """
+    compile glob patterns into (nameMatch,pathMatch) functions
+
+    Patterns with a "/" in them are matched against the path relative to
+    the root of the tree, the rest against just the file name.
+
+    :return: (nameMatch,pathMatch) where either can be None
+    """
+    import re
+    import fnmatch
+    if not globs:
+        return None,None
+    if isinstance(globs,str):
+        globs=[globs]
+    nameGlobs=[]
+    pathGlobs=[]
+    for glob in globs:
+        if glob.find('/')>=0:
+            pathGlobs.append(fnmatch.translate(glob.strip('/')))
+        else:
+            nameGlobs.append(fnmatch.translate(glob))
+    flags=re.IGNORECASE if os.name=='nt' else 0
+    ret=[]
+    for patterns in (nameGlobs,pathGlobs):
+        if patterns:
+            ret.append(re.compile('|'.join(patterns),flags).match)
+        else:
+            ret.append(None)
+    return tuple(ret)
+
+
+class _Filter:
+    """
+    Which files and directories a walk takes
+    """
+
+    def __init__(self,include=None,exclude=None):
+        self.includeName,self.includePath=_compileGlobs(include)
+        self.excludeName,self.excludePath=_compileGlobs(exclude)
+        self.hasInclude=self.includeName is not None or self.includePath is not None
+
+    def excluded(self,name,relPath):
+        """
+        whether a file or directory is excluded
+        """
+        return (self.excludeName is not None and self.excludeName(name) is not None) \
+            or (self.excludePath is not None and self.excludePath(relPath) is not None)
+
+    def included(self,name,relPath):
+        """
+        whether a file is wanted (directories are always walked unless excluded)
+        """
+        if self.excluded(name,relPath):
+            return False
+        if not self.hasInclude:
+            return True
+        return (self.includeName is not None and self.includeName(name) is not None) \
+            or (self.includePath is not None and self.includePath(relPath) is not None)
+
+
+def _scanDir(directory,relDir,depth,walkFilter):
+    """
+    scan one directory
+
+    :return: ([file paths],[(directory,relDir,depth)])
+    """
+    files=[]
+    subdirs=[]
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                relPath=entry.name if not relDir else relDir+'/'+entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not walkFilter.excluded(entry.name,relPath):
+                            subdirs.append((entry.path,relPath,depth+1))
+                        continue
+                    # (a symlink to a directory is neither)
+                    isFile=entry.is_file()
+                except OSError:
+                    continue
+                if isFile and walkFilter.included(entry.name,relPath):
+                    files.append(entry.path)
+    except OSError:
+        pass
+    return files,subdirs
+
+
+def walkTree(roots,include=None,exclude=None,maxDepth=None,jobs=None):
+    """
+    yield every regular file in some directory trees, scanning directories
+    in parallel (symlinks to directories within them are not followed)
+
+    :property roots: directories (and/or files, which are passed straight through)
+    :property include: glob(s) a file must match to be taken (default=all files)
+    :property exclude: glob(s) of files and directories to leave out
+    :property maxDepth: how many levels of subdirectories to go down
+        (0=only the files right in each root, None=no limit)
+    :property jobs: how many directories to scan at once
+
+    :return: generator of file paths, in the order directories finish scanning
+    """
+    if isinstance(roots,str):
+        roots=[roots]
+    walkFilter=_Filter(include,exclude)
+    if jobs is None:
+        jobs=defaultJobs()
+    jobs=max(1,jobs)
+    directories=[]
+    for root in roots:
+        if os.path.isdir(root):
+            directories.append((root,'',0))
+        else:
+            yield root
+    if jobs==1:
+        while directories:
+            files,subdirs=_scanDir(*directories.pop(),walkFilter)
+            yield from files
+            directories.extend(d for d in subdirs if maxDepth is None or d[2]<=maxDepth)
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        submitter=BoundedSubmitter(pool,jobs)
+        while directories or submitter.pending:
+            if directories:
+                results=submitter.submit(_scanDir,*directories.pop(),walkFilter)
+            else:
+                results=submitter.wait()
+            for files,subdirs in results:
+                directories.extend(d for d in subdirs if maxDepth is None or d[2]<=maxDepth)
+                yield from files
+
+
+class TreeGroup(LaunchGroup):
+    """
+    The files of a tree that have the same mime type and handler
+    """
+
+    def __init__(self,mimeType,handlerSet,handler,handlerName=None):
+        LaunchGroup.__init__(self,handlerSet,handler,handlerName)
+        self.mimeType=mimeType
+        self._pending=[] # items not yet handed off to be launched
+        self._pendingLength=0 # argCost() of the application and the pending items
+
+    def __repr__(self):
+        return '%s -> %s'%(self.mimeType,LaunchGroup.__repr__(self))
+
+
+class TreePlan:
+    """
+    What opening a directory tree does (or would do)
+    """
+
+    def __init__(self):
+        self.groups=[] # [TreeGroup]
+        self.unknown=[] # paths whose mime type is not known
+        self.failures=[] # [BatchResult] for files whose mime type has no usable handler
+        self.fileCount=0 # how many files were found
+        self.elapsed=0.0 # how long the scan took, in seconds
+
+    def iterPlan(self,verbose=False):
+        """
+        yield the lines of a human-readable plan
+
+        :property verbose: also list every file and call string
+        """
+        for group in sorted(self.groups,key=lambda g:(g.mimeType,g.callTemplate or '')):
+            yield repr(group)
+            if verbose:
+                for items,callString in group.callStrings():
+                    if callString is None:
+                        yield '    [%s] %s'%(group.handlerSet.actionName,' '.join(items))
+                    else:
+                        yield '    %s'%callString
+        if self.failures:
+            yield 'no handler: %d files'%len(self.failures)
+            if verbose:
+                for result in self.failures:
+                    yield '    %r'%result
+        if self.unknown:
+            yield 'unknown mime type: %d files'%len(self.unknown)
+            if verbose:
+                for path in self.unknown:
+                    yield '    %s'%path
+        yield '%d files, %d groups, %d processes (scanned in %0.3fs)'%(self.fileCount,
+            len(self.groups),self.processCount,self.elapsed)
+
+    @property
+    def processCount(self):
+        """
+        how many times a handler is launched
+        """
+        return sum(sum(1 for _ in group.chunks()) for group in self.groups)
+
+    def __repr__(self):
+        return '\n'.join(self.iterPlan())
+
+
+def _classifyTree(fff,roots,handler,include,exclude,maxDepth,jobs,sniff,launch):
+    """
+    walk and classify a tree into a TreePlan
+
+    :property launch: called with (group,items) whenever some items are
+        ready to be launched (None to only make the plan)
+    """
+    plan=TreePlan()
+    start=time.perf_counter()
+    lookup=fff.ext2mime.lookup
+    sniffFile=None
+    if sniff:
+        from ._sniff import sniffFile
+    resolved={} # mimeType:TreeGroup or the exception resolving it raised
+    limit=argLimit()
+    for path in walkTree(roots,include,exclude,maxDepth,jobs):
+        plan.fileCount+=1
+        mimeType=lookup(path)
+        if mimeType is None and sniffFile is not None:
+            try:
+                mimeType=sniffFile(path)
+            except OSError:
+                pass
+        if mimeType is None:
+            plan.unknown.append(path)
+            continue
+        group=resolved.get(mimeType)
+        if group is None:
+            try:
+                handlerSet=fff.resolveMime(mimeType)
+                handlerObject=None
+                if handlerSet.action in (handlerSet.ACTION_EXECUTE_APPLICATION,
+                        handlerSet.ACTION_EXECUTE_APPLICATION_X):
+                    handlerObject=handlerSet.getHandler(handler)
+                group=TreeGroup(mimeType,handlerSet,handlerObject,handler)
+                plan.groups.append(group)
+            except Exception as e:
+                group=e
+            resolved[mimeType]=group
+        if isinstance(group,Exception):
+            plan.failures.append(BatchResult(path,group))
+            continue
+        group.items.append(path)
+        if launch is None:
+            continue
+        if not group.coalesced:
+            launch(group,[path])
+            continue
+        cost=argCost(path)
+        if not group._pending:
+            group._pendingLength=argCost(group.handler.path)
+        elif group._pendingLength+cost>limit:
+            launch(group,group._pending)
+            group._pending=[]
+            group._pendingLength=argCost(group.handler.path)
+        group._pending.append(path)
+        group._pendingLength+=cost
+    if launch is not None:
+        for group in plan.groups:
+            if group._pending:
+                launch(group,group._pending)
+                group._pending=[]
+                group._pendingLength=0
+    plan.elapsed=time.perf_counter()-start
+    return plan
+
+
+def planTree(fff,roots,handler=None,include=None,exclude=None,maxDepth=None,
+        jobs=None,sniff=False):
+    """
+    work out what opening every file in some directory trees would do,
+    without running anything
+
+    :property fff: a FirefoxFormats object
+    :property roots: directories (and/or files)
+    :property handler: the name of a specific handler to use (if absent, use default hander)
+    :property include: glob(s) a file must match to be taken (default=all files)
+    :property exclude: glob(s) of files and directories to leave out
+    :property maxDepth: how many levels of subdirectories to go down (None=no limit)
+    :property jobs: how many directories to scan at once
+    :property sniff: look at the contents of files whose extension is not known
+
+    :return: TreePlan
+    """
+    return _classifyTree(fff,roots,handler,include,exclude,maxDepth,jobs,sniff,None)
+
+
+def runTree(fff,roots,handler=None,include=None,exclude=None,maxDepth=None,
+        jobs=None,sniff=False,report=None):
+    """
+    open every file in some directory trees with its handler
+
+    Handlers are launched while the tree is still being scanned: files for
+    applications that take many files at once go out a full command line
+    at a time, everything else one file at a time.
+
+    (see planTree() for the other properties)
+
+    :property jobs: how many directories to scan, and handlers to run, at once
+    :property report: callback that is called with a BatchResult for each file as it completes
+
+    :return: (TreePlan,BatchSummary)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if jobs is None:
+        jobs=defaultJobs()
+    jobs=max(1,jobs)
+    summary=BatchSummary()
+    def finished(result):
+        summary.add(result)
+        if report is not None:
+            report(result)
+    start=time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        submitter=BoundedSubmitter(pool,jobs)
+        def launch(group,chunk):
+            for results in submitter.submit(group.run,chunk):
+                for result in results:
+                    finished(result)
+        plan=_classifyTree(fff,roots,handler,include,exclude,maxDepth,jobs,sniff,launch)
+        for results in submitter.drain():
+            for result in results:
+                finished(result)
+    for result in plan.failures:
+        finished(result)
+    for path in plan.unknown:
+        finished(BatchResult(path,Exception('unknown file extension for "%s"'%path)))
+    summary.elapsed=time.perf_counter()-start
+    return plan,summary
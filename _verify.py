@@ -0,0 +1,209 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Check that the handlers in a profile can actually be run
+
+Finds applications that no longer exist (or are not executable) and
+webservice uriTemplates with no "%s" for the url to go in, rather than
+waiting for them to fail when something is opened.
+
+Whether an application is ok is remembered by path along with its
+pathSignature(), so it is only re-checked when the file (or its
+permissions) change.
+"""
+import os
+import threading
+
+
+class HandlerProblem:
+    """
+    Something wrong with one handler
+    """
+
+    def __init__(self,kind,name,handlerName,target,problem):
+        self.kind=kind # 'mimeTypes' or 'schemes'
+        self.name=name # the mime type or scheme
+        self.handlerName=handlerName # the name of the handler
+        self.target=target # the application path or webservice uriTemplate
+        self.problem=problem # what is wrong with it
+
+    @property
+    def jsonDict(self):
+        """
+        a json-compatible dict
+        """
+        return {'kind':self.kind,'name':self.name,'handler':self.handlerName,
+            'target':self.target,'problem':self.problem}
+
+    def __repr__(self):
+        if self.kind=='schemes':
+            what='%s:'%self.name
+        else:
+            what=self.name
+        return '%s [%s] %s: %s'%(what,self.handlerName or 'unnamed',self.target,self.problem)
+
+
+class VerifyReport:
+    """
+    The results of checking all of the handlers in a profile
+    """
+
+    def __init__(self,profile):
+        self.profile=profile # the handlers.json that was checked
+        self.checked=0 # how many handlers were looked at
+        self.problems=[] # HandlerProblem for each broken handler
+
+    @property
+    def ok(self):
+        """
+        whether every handler checked out
+        """
+        return not self.problems
+
+    def __repr__(self):
+        ret=['%s: %d handlers, %d broken'%(self.profile,self.checked,len(self.problems))]
+        for problem in self.problems:
+            ret.append('  %s'%problem)
+        return '\n'.join(ret)
+
+
+def pathSignature(path):
+    """
+    the things that tell us whether an application path needs checking again
+
+    Unlike _cache.fileSignature() this includes the permissions, since a
+    chmod -x changes whether the application can run without touching
+    its contents.  (The ctime changes on a chmod/chown too, so it is in
+    here as well, for changes to the owner or the acl.)
+
+    :return: (mtime,size,inode,mode,ctime) tuple
+    """
+    st=os.stat(path)
+    return (st.st_mtime_ns,st.st_size,st.st_ino,st.st_mode,st.st_ctime_ns)
+
+
+class PathCheckCache:
+    """
+    Remembers whether application paths are ok, until they change on disk
+    """
+
+    def __init__(self,entries=None):
+        """
+        :property entries: {path:(signature,problem)} from a previous run
+        """
+        self.entries=dict(entries or {})
+        self._lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+
+    def check(self,path):
+        """
+        get what is wrong with an application path
+
+        :return: the problem, or None if it looks runnable
+        """
+        try:
+            signature=pathSignature(path)
+        except OSError:
+            signature=None
+        with self._lock:
+            entry=self.entries.get(path)
+            if entry is not None and entry[0]==signature:
+                self.hits+=1
+                return entry[1]
+            self.misses+=1
+        problem=checkPath(path,signature is not None)
+        with self._lock:
+            self.entries[path]=(signature,problem)
+        return problem
+
+
+def checkPath(path,exists=None):
+    """
+    find out what is wrong with an application path
+
+    :property exists: whether we already know the path exists (saves a stat)
+
+    :return: the problem, or None if it looks runnable
+    """
+    if exists is None:
+        exists=os.path.exists(path)
+    if not exists:
+        return 'application does not exist'
+    if os.path.isdir(path):
+        if path.lower().endswith('.app'): # a mac application bundle
+            return None
+        return 'application is a directory'
+    if os.name!='nt' and not os.access(path,os.X_OK):
+        return 'application is not executable'
+    return None
+
+
+def checkUriTemplate(uriTemplate):
+    """
+    find out what is wrong with a webservice uriTemplate
+
+    :return: the problem, or None if it looks usable
+    """
+    from ._firefoxFormats import isUrl
+    if not isUrl(uriTemplate):
+        return 'webservice is not a url'
+    if uriTemplate.find('%s')<0:
+        return 'webservice has no %s for the url'
+    return None
+
+
+def verifyHandlers(fff,jobs=None,cache=None):
+    """
+    check every handler of every mime type and scheme in a profile
+
+    Application paths are checked concurrently on a thread pool, each
+    distinct path only once.
+
+    :property fff: a FirefoxFormats object
+    :property jobs: how many checks may run at once
+    :property cache: a PathCheckCache to use (default is the one kept
+        in the on-disk cache for this profile, if caching is on)
+
+    :return: VerifyReport
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from ._batch import defaultJobs
+    from . import _cache
+    if jobs is None:
+        jobs=defaultJobs()
+    profile=fff.filename
+    saveCache=False
+    if cache is None:
+        entries=None
+        if fff.useCache:
+            entries=_cache.loadCached(profile,'verify')
+            saveCache=True
+        cache=PathCheckCache(entries)
+    report=VerifyReport(profile)
+    found=[] # (kind,name,handler)
+    paths=set()
+    for kind in ('mimeTypes','schemes'):
+        for name,handlerSet in fff._iterEntries(kind): # pylint: disable=protected-access
+            for handler in handlerSet.handlers or ():
+                if handler is None or not handler.jsonDict: # firefox's placeholder for the system default
+                    continue
+                found.append((kind,name,handler))
+                if handler.path is not None:
+                    paths.add(handler.path)
+    paths=list(paths)
+    with ThreadPoolExecutor(max_workers=max(1,min(jobs,len(paths) or 1))) as pool:
+        pathProblems=dict(zip(paths,pool.map(cache.check,paths)))
+    for kind,name,handler in found:
+        report.checked+=1
+        if handler.path is not None:
+            problem=pathProblems[handler.path]
+        elif handler.uriTemplate is not None:
+            problem=checkUriTemplate(handler.uriTemplate)
+        else:
+            problem='no application or webservice'
+        if problem is not None:
+            report.problems.append(HandlerProblem(kind,name,handler.name,handler.target,problem))
+    if saveCache and cache.misses:
+        _cache.saveCached(profile,cache.entries,'verify')
+    return report
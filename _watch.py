@@ -0,0 +1,177 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Watch a profile's handlers.json and incrementally reload it when it changes
+
+Uses inotify where it is available (linux) and falls back to polling the
+file's stat() otherwise.
+"""
+import os
+import sys
+from ._cache import fileSignature
+
+
+# inotify event flags (from <sys/inotify.h>)
+IN_MODIFY=0x00000002
+IN_CLOSE_WRITE=0x00000008
+IN_MOVED_TO=0x00000080
+IN_CREATE=0x00000100
+IN_NONBLOCK=0o4000
+IN_CLOEXEC=0o2000000
+
+
+def _inotify():
+    """
+    get the libc with inotify functions, or None if there is no inotify
+    """
+    if not os.path.exists('/proc/sys/fs/inotify'):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc=ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',use_errno=True)
+        libc.inotify_init1 # pylint: disable=pointless-statement
+    except (OSError,AttributeError):
+        return None
+    return libc
+
+
+class HandlersWatcher:
+    """
+    Watches the handlers.json file behind a FirefoxFormats object and calls
+    FirefoxFormats.reload() whenever it changes on disk
+    """
+
+    def __init__(self,fff,callback=None,interval=1.0,usePolling=False):
+        """
+        :property fff: the FirefoxFormats object to keep up to date
+        :property callback: called with a ModelChanges object whenever
+            something actually changed
+        :property interval: how often to poll (in seconds) when there is no inotify
+        :property usePolling: always poll, even if inotify is available
+        """
+        self.fff=fff
+        self.callback=callback
+        self.interval=interval
+        self.usePolling=usePolling
+        import threading
+        self._stop=threading.Event()
+        self._thread=None
+        self._signature=None
+
+    @property
+    def filename(self):
+        """
+        the file being watched
+        """
+        if self.fff._filename is None: # pylint: disable=protected-access
+            self.fff.load()
+        return self.fff._filename # pylint: disable=protected-access
+
+    def _signatureNow(self):
+        """
+        the current (mtime,size,inode) of the file, or None if it is missing
+        """
+        try:
+            return fileSignature(self.filename)
+        except OSError:
+            return None
+
+    def check(self):
+        """
+        reload if the file has changed since last time
+
+        :return: ModelChanges, or None if nothing was reloaded
+        """
+        signature=self._signatureNow()
+        if signature is None or signature==self._signature:
+            return None
+        try:
+            changes=self.fff.reload()
+        except (OSError,ValueError): # gone again, or caught firefox half way through writing it
+            return None
+        self._signature=signature
+        if changes and self.callback is not None:
+            self.callback(changes)
+        return changes
+
+    def _pollLoop(self):
+        """
+        check the file every interval seconds
+        """
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _inotifyLoop(self,libc):
+        """
+        wait for inotify to say the file's directory changed
+        """
+        import select
+        fd=libc.inotify_init1(IN_NONBLOCK|IN_CLOEXEC)
+        if fd<0:
+            return self._pollLoop()
+        try:
+            directory,name=os.path.split(os.path.abspath(self.filename))
+            mask=IN_MODIFY|IN_CLOSE_WRITE|IN_MOVED_TO|IN_CREATE
+            if libc.inotify_add_watch(fd,directory.encode(),mask)<0:
+                return self._pollLoop()
+            name=name.encode()
+            while not self._stop.is_set():
+                readable,_,_=select.select([fd],[],[],0.5)
+                if not readable:
+                    continue
+                try:
+                    data=os.read(fd,65536)
+                except BlockingIOError:
+                    continue
+                # each event is: int wd, uint32 mask, cookie, len, char name[len]
+                changed=False
+                i=0
+                while i+16<=len(data):
+                    length=int.from_bytes(data[i+12:i+16],sys.byteorder)
+                    if data[i+16:i+16+length].rstrip(b'\0')==name:
+                        changed=True
+                    i+=16+length
+                if changed:
+                    self.check()
+        finally:
+            os.close(fd)
+        return None
+
+    def run(self):
+        """
+        watch on the current thread until stop() is called (or Ctrl+C)
+        """
+        self._signature=self._signatureNow()
+        libc=None if self.usePolling else _inotify()
+        try:
+            if libc is not None:
+                self._inotifyLoop(libc)
+            else:
+                self._pollLoop()
+        except KeyboardInterrupt:
+            pass
+
+    def start(self):
+        """
+        start watching on a background thread
+
+        (this makes fff threadSafe, so that other threads using it while it
+        is reloaded see either the old model or the new one, never half of each)
+        """
+        if self._thread is None:
+            self.fff.threadSafe=True
+            self._stop.clear()
+            self.filename # pylint: disable=pointless-statement
+            import threading
+            self._thread=threading.Thread(target=self.run,daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        stop watching
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread=None
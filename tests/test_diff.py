@@ -0,0 +1,105 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Comparing handlers.json files against a baseline (_diff)
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _diff():
+    """
+    import the _diff module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._diff')
+
+
+BASELINE={
+    'defaultHandlersVersion':{'en-US':4},
+    'mimeTypes':{
+        'application/pdf':{'action':3,'extensions':['pdf']},
+        'text/plain':{'action':2,'extensions':['txt'],'handlers':[{'name':'cat','path':'/bin/cat'}]},
+        },
+    'schemes':{
+        'irc':{'action':2,'handlers':[{'name':'echo','path':'/bin/echo'}]},
+        },
+    }
+
+
+class TestDiff(unittest.TestCase):
+    """
+    diffProfiles() on a directory of profiles
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.baseline=self.write('baseline.json',BASELINE)
+        self.module=_diff()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self,name,jsonDict,**kwargs):
+        filename=os.path.join(self.directory,name)
+        os.makedirs(os.path.dirname(filename),exist_ok=True)
+        with open(filename,'w') as f:
+            json.dump(jsonDict,f,**kwargs)
+        return filename
+
+    def diff(self):
+        records=self.module.diffProfiles(self.baseline,[os.path.join(self.directory,'fleet')])
+        return {os.path.basename(r['profile']):r for r in records if r['type']=='summary'},\
+            [r for r in records if r['type']!='summary']
+
+    def test_same(self):
+        self.write('fleet/same.json',BASELINE)
+        # laid out differently, but the same entries
+        reordered={k:BASELINE[k] for k in reversed(list(BASELINE))}
+        reordered['mimeTypes']={'text/plain':{'handlers':[{'path':'/bin/cat','name':'cat'}],
+            'extensions':['txt'],'action':2},'application/pdf':{'extensions':['pdf'],'action':3}}
+        self.write('fleet/reordered.json',reordered,indent=2)
+        summaries,records=self.diff()
+        self.assertEqual(records,[])
+        self.assertEqual({name:r['differences'] for name,r in summaries.items()},
+            {'same.json':0,'reordered.json':0})
+
+    def test_changes(self):
+        changed=json.loads(json.dumps(BASELINE))
+        changed['mimeTypes']['application/pdf']['action']=2
+        changed['mimeTypes']['text/plain']['handlers'].insert(0,{'name':'less','path':'/bin/less'})
+        changed['mimeTypes']['image/png']={'action':3,'extensions':['png']}
+        del changed['schemes']['irc']
+        self.write('fleet/changed.json',changed)
+        summaries,records=self.diff()
+        self.assertEqual(summaries['changed.json']['differences'],4)
+        found={(r['name'],r['change']):r for r in records}
+        self.assertEqual(found[('application/pdf','modified')]['fields'],{'action':[3,2]})
+        self.assertEqual(found[('text/plain','modified')]['handlers'],
+            {'added':[{'name':'less','path':'/bin/less'}]})
+        self.assertEqual(found[('image/png','added')]['value'],{'action':3,'extensions':['png']})
+        self.assertEqual(found[('irc','removed')]['value'],BASELINE['schemes']['irc'])
+
+    def test_broken(self):
+        with open(os.path.join(self.directory,'baseline.json')) as f:
+            data=f.read()
+        os.makedirs(os.path.join(self.directory,'fleet'))
+        with open(os.path.join(self.directory,'fleet','broken.json'),'w') as f:
+            f.write(data[:20])
+        records=self.module.diffProfiles(self.baseline,[os.path.join(self.directory,'fleet')])
+        self.assertEqual([r['type'] for r in records],['error'])
+
+
+if __name__=='__main__':
+    unittest.main()
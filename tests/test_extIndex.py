@@ -0,0 +1,97 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+The file extension -> mime type index (_extIndex)
+"""
+import os
+import sys
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _extIndex():
+    """
+    import the _extIndex module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._extIndex')
+
+
+class TestExtensionIndex(unittest.TestCase):
+    """
+    ExtensionIndex lookups, owners and fallback
+    """
+
+    def setUp(self):
+        self.module=_extIndex()
+
+    def test_suffixes(self):
+        self.assertEqual(list(self.module.iterSuffixes('/d.x/a.tar.GZ',3)),['gz','tar.gz'])
+        self.assertEqual(list(self.module.iterSuffixes('C:\\d.x\\noext',3)),[])
+
+    def test_longestMatch(self):
+        index=self.module.ExtensionIndex([('gz','application/gzip'),('TAR.GZ','application/x-gtar')])
+        self.assertEqual(index.maxParts,2)
+        self.assertEqual(index.lookup('/a.b/x.TAR.gz'),'application/x-gtar')
+        self.assertEqual(index.lookup('x.gz'),'application/gzip')
+        self.assertEqual(index.lookup('C:\\d.gz\\x.tar.gz'),'application/x-gtar')
+        # dots in directory names do not count
+        self.assertIsNone(index.lookup('dir.tar.gz/file'))
+        self.assertIsNone(index.lookup('x.tgz'))
+        self.assertEqual(list(index.classify(['a.gz','b'])),[('a.gz','application/gzip'),('b',None)])
+
+    def test_caseInsensitive(self):
+        index=self.module.ExtensionIndex([('PDF','application/pdf')])
+        self.assertIn('pdf',index)
+        self.assertIn('Pdf',index)
+        self.assertEqual(index['pDf'],'application/pdf')
+        self.assertEqual(list(index),['pdf'])
+
+    def test_owners(self):
+        index=self.module.ExtensionIndex()
+        index.add('txt','text/plain')
+        index.add('txt','text/x-log')
+        # the newest claim wins
+        self.assertEqual(index.lookup('a.txt'),'text/x-log')
+        # removing it from the other one leaves it be
+        index.remove('txt','text/x-other')
+        self.assertEqual(index.lookup('a.txt'),'text/x-log')
+        # removing it from the winner goes back to the one before
+        index.remove('txt','text/x-log')
+        self.assertEqual(index.lookup('a.txt'),'text/plain')
+        index.remove('txt','text/plain')
+        self.assertIsNone(index.lookup('a.txt'))
+        self.assertEqual(len(index),0)
+
+    def test_fallback(self):
+        fallback={'gz':'application/gzip','tar.gz':'application/x-gtar'}
+        index=self.module.ExtensionIndex([('gz','application/x-custom')],fallback=fallback)
+        self.assertEqual(index.lookup('x.gz'),'application/x-custom')
+        # multi-part extensions from the fallback count towards maxParts
+        self.assertEqual(index.lookup('x.tar.gz'),'application/x-gtar')
+        index.remove('gz')
+        self.assertEqual(index.lookup('x.gz'),'application/gzip')
+        index.remove('gz','application/gzip')
+        self.assertEqual(index.lookup('x.gz'),'application/gzip')
+        self.assertEqual(fallback,{'gz':'application/gzip','tar.gz':'application/x-gtar'})
+
+    def test_copy(self):
+        index=self.module.ExtensionIndex([('txt','text/plain'),('txt','text/x-log')])
+        copy=index.copy()
+        copy.add('new','application/x-new')
+        copy.remove('txt','text/x-log')
+        self.assertNotIn('new',index)
+        self.assertEqual(index.lookup('a.txt'),'text/x-log')
+        index.remove('txt','text/x-log')
+        self.assertEqual(index.lookup('a.txt'),'text/plain')
+        self.assertEqual(copy.lookup('a.txt'),'text/plain')
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Looking up the mime types of urls (_httpMime) against a local http server
+"""
+import os
+import sys
+import time
+import threading
+import importlib
+import unittest
+import http.server
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _httpMime():
+    """
+    import the _httpMime module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._httpMime')
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers /file.pdf as a pdf, /noHead/... only to GET, and
+    /redirect/... with a redirect to the rest of the path
+    """
+    protocol_version='HTTP/1.1'
+
+    def _answer(self,method):
+        server=self.server
+        with server.lock:
+            server.requests.append((method,self.path))
+        time.sleep(server.delay)
+        if self.path.startswith('/redirect/'):
+            self.send_response(302)
+            self.send_header('Location',self.path[len('/redirect'):])
+        elif method=='HEAD' and self.path.startswith('/noHead/'):
+            self.send_response(405)
+        elif self.path.endswith('.pdf'):
+            self.send_response(200)
+            self.send_header('Content-Type','application/pdf; charset=binary')
+        else:
+            self.send_response(404)
+        self.send_header('Content-Length','0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._answer('HEAD')
+
+    def do_GET(self):
+        self._answer('GET')
+
+    def log_message(self,*args):
+        pass
+
+
+class TestHttpMime(unittest.TestCase):
+    """
+    HttpMimeResolver against a local http.server
+    """
+
+    def setUp(self):
+        self.server=http.server.ThreadingHTTPServer(('127.0.0.1',0),_Handler)
+        self.server.daemon_threads=True
+        self.server.lock=threading.Lock()
+        self.server.requests=[]
+        self.server.delay=0.0
+        self.thread=threading.Thread(target=self.server.serve_forever,daemon=True)
+        self.thread.start()
+        self.base='http://127.0.0.1:%d'%self.server.server_address[1]
+        self.module=_httpMime()
+        self.resolver=self.module.HttpMimeResolver(timeout=5.0)
+
+    def tearDown(self):
+        self.resolver.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_contentType(self):
+        self.assertEqual(self.resolver.mimeType(self.base+'/file.pdf'),'application/pdf')
+        self.assertEqual(self.server.requests,[('HEAD','/file.pdf')])
+        # the second time comes out of the cache
+        self.assertEqual(self.resolver.mimeType(self.base+'/file.pdf'),'application/pdf')
+        self.assertEqual(len(self.server.requests),1)
+
+    def test_notFound(self):
+        self.assertIsNone(self.resolver.mimeType(self.base+'/missing.txt'))
+
+    def test_noHead(self):
+        self.assertEqual(self.resolver.mimeType(self.base+'/noHead/a.pdf'),'application/pdf')
+        self.assertEqual(self.server.requests,[('HEAD','/noHead/a.pdf'),('GET','/noHead/a.pdf')])
+        # the host is remembered as not doing HEAD
+        self.resolver.mimeType(self.base+'/noHead/b.pdf')
+        self.assertEqual(self.server.requests[-1],('GET','/noHead/b.pdf'))
+
+    def test_redirect(self):
+        self.assertEqual(self.resolver.mimeType(self.base+'/redirect/file.pdf'),'application/pdf')
+
+    def test_singleFlight(self):
+        self.server.delay=0.2
+        url=self.base+'/file.pdf'
+        results=[]
+        def lookup():
+            results.append(self.resolver.mimeType(url))
+        threads=[threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results,['application/pdf']*8)
+        self.assertEqual(len(self.server.requests),1)
+        self.assertEqual(self.resolver.requestCount,1)
+
+    def test_unreachable(self):
+        import socket
+        # a port that nothing is listening on
+        with socket.socket() as s:
+            s.bind(('127.0.0.1',0))
+            port=s.getsockname()[1]
+        with self.assertRaises(self.module.HttpMimeError):
+            self.resolver.mimeType('http://127.0.0.1:%d/file.pdf'%port)
+
+    def test_notHttp(self):
+        with self.assertRaises(self.module.HttpMimeError):
+            self.resolver.mimeType('ftp://127.0.0.1/file.pdf')
+
+
+if __name__=='__main__':
+    unittest.main()
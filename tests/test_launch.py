@@ -0,0 +1,138 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Grouping --batch items by handler and splitting up their arguments (_launch)
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _module(name):
+    """
+    import a module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'.'+name)
+
+
+HANDLERS={
+    'defaultHandlersVersion':{},
+    'mimeTypes':{
+        'application/x-one':{'action':2,'extensions':['onex','onez'],
+            'handlers':[{'name':'echo','path':'/bin/echo'}]},
+        'application/x-two':{'action':2,'extensions':['twox'],
+            'handlers':[{'name':'echo','path':'/bin/echo'}]},
+        'application/x-viewer':{'action':2,'extensions':['viewx'],
+            'handlers':[{'name':'someviewer','path':'/usr/bin/someviewer'}]},
+        'application/x-template':{'action':2,'extensions':['tplx'],
+            'handlers':[{'name':'echo','path':'/bin/echo %%s'}]},
+        },
+    'schemes':{},
+    }
+
+
+class TestChunkArgs(unittest.TestCase):
+    """
+    chunkArgs() keeps every argument list within the limit
+    """
+
+    def setUp(self):
+        self.module=_module('_launch')
+
+    def test_fits(self):
+        chunks=list(self.module.chunkArgs(['app'],['a','b','c'],limit=1000))
+        self.assertEqual(chunks,[[(0,'a'),(1,'b'),(2,'c')]])
+
+    def test_split(self):
+        args=['%02d'%i for i in range(10)]
+        argCost=self.module.argCost
+        limit=argCost('app')+3*argCost('00')
+        chunks=list(self.module.chunkArgs(['app'],args,limit=limit))
+        self.assertEqual([len(chunk) for chunk in chunks],[3,3,3,1])
+        # the indexes are positions in args, across the chunks
+        self.assertEqual([i for chunk in chunks for i,_ in chunk],list(range(10)))
+        self.assertEqual([arg for chunk in chunks for _,arg in chunk],args)
+
+    def test_tooLong(self):
+        # an argument that does not fit on its own still gets a chunk
+        chunks=list(self.module.chunkArgs(['app'],['a','x'*100,'b'],limit=10))
+        self.assertEqual([[arg for _,arg in chunk] for chunk in chunks],[['a'],['x'*100],['b']])
+
+    def test_empty(self):
+        self.assertEqual(list(self.module.chunkArgs(['app'],[],limit=10)),[])
+
+
+class TestGroupItems(unittest.TestCase):
+    """
+    groupItems() only coalesces applications known to open many files
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.filename=os.path.join(self.directory,'handlers.json')
+        with open(self.filename,'w') as f:
+            json.dump(HANDLERS,f)
+        self.module=_module('_launch')
+        self.fff=_module('_firefoxFormats').FirefoxFormats(self.filename,useCache=False)
+        self.fff.load()
+        self.environ=os.environ.pop('FIREFOXFORMATS_MULTI_FILE',None)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        if self.environ is None:
+            os.environ.pop('FIREFOXFORMATS_MULTI_FILE',None)
+        else:
+            os.environ['FIREFOXFORMATS_MULTI_FILE']=self.environ
+
+    def groups(self,items):
+        groups,failures=self.module.groupItems(self.fff,items)
+        return {(group.callTemplate,group.coalesced):group.items for group in groups},failures
+
+    def test_knownApplication(self):
+        self.assertTrue(self.module.takesManyFiles('/bin/echo'))
+        # one group for echo, even though it comes from two mime types
+        groups,failures=self.groups(['a.onex','b.twox','c.onez'])
+        self.assertEqual(groups,{('/bin/echo',True):['a.onex','b.twox','c.onez']})
+        self.assertEqual(failures,[])
+
+    def test_unknownApplication(self):
+        self.assertFalse(self.module.takesManyFiles('/usr/bin/someviewer'))
+        groups,failures=self.groups(['a.viewx','b.viewx','c.onex'])
+        self.assertEqual(groups,{
+            ('/usr/bin/someviewer',False):['a.viewx','b.viewx'],
+            ('/bin/echo',True):['c.onex']})
+        group=self.module.groupItems(self.fff,['a.viewx','b.viewx'])[0][0]
+        self.assertEqual(list(group.chunks()),[['a.viewx'],['b.viewx']])
+
+    def test_flagged(self):
+        os.environ['FIREFOXFORMATS_MULTI_FILE']=os.pathsep.join(['other','/usr/bin/someviewer'])
+        self.assertTrue(self.module.takesManyFiles('/usr/bin/someviewer'))
+        groups,_=self.groups(['a.viewx','b.viewx'])
+        self.assertEqual(groups,{('/usr/bin/someviewer',True):['a.viewx','b.viewx']})
+
+    def test_placeholder(self):
+        # an application given a %%s template takes one file at a time
+        groups,_=self.groups(['a.tplx','b.tplx'])
+        self.assertEqual(list(groups.values()),[['a.tplx','b.tplx']])
+        self.assertEqual(list(groups)[0][1],False)
+
+    def test_unresolvable(self):
+        groups,failures=self.groups(['a.onex','nothing.unknownx'])
+        self.assertEqual(groups,{('/bin/echo',True):['a.onex']})
+        self.assertEqual([result.item for result in failures],['nothing.unknownx'])
+        self.assertIsNotNone(failures[0].error)
+
+
+if __name__=='__main__':
+    unittest.main()
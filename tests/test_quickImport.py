@@ -0,0 +1,50 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+The quick lookup path (_quick) has to stay quick to import
+"""
+import os
+import sys
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _benchmark():
+    """
+    import the _benchmark module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._benchmark')
+
+
+class TestQuickImport(unittest.TestCase):
+    """
+    Checks on what importing the quick lookup path costs
+    """
+
+    def test_importBudget(self):
+        benchmark=_benchmark()
+        # the best of a few tries, so a busy machine does not fail it
+        for _ in range(3):
+            problems=benchmark.checkImportBudget(benchmark.QUICK_IMPORT_BUDGET_MS)
+            if not problems:
+                break
+        self.assertEqual(problems,[])
+
+    def test_noForbiddenImports(self):
+        benchmark=_benchmark()
+        _,imported=benchmark.measureImportTime()
+        for name in benchmark.QUICK_FORBIDDEN_IMPORTS:
+            self.assertNotIn(name,imported)
+        for name in benchmark.QUICK_FORBIDDEN_MODULES:
+            self.assertNotIn('%s.%s'%(PACKAGE,name),imported)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Saving a FirefoxFormats model back to handlers.json, transactions and snapshots
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _firefoxFormats():
+    """
+    import the _firefoxFormats module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._firefoxFormats')
+
+
+# laid out the way firefox writes it, which is not the order save() uses
+FIREFOX_JSON=(
+    '{"defaultHandlersVersion":{},"isDownloadsImprovementsAlreadyMigrated":true,'
+    '"mimeTypes":{"application/pdf":{"action":3,"extensions":["pdf"]},'
+    '"text/plain":{"action":2,"ask":true,"handlers":[{"name":"cat","path":"/bin/cat"}],'
+    '"extensions":["txt"]}},'
+    '"schemes":{"mailto":{"stubEntry":true,"action":4,'
+    '"handlers":[null,{"name":"Gmail","uriTemplate":"https://mail.example.com/?u=%s"}]}}}')
+
+
+class TestSave(unittest.TestCase):
+    """
+    FirefoxFormats.save(), transaction() and snapshot()
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.filename=os.path.join(self.directory,'handlers.json')
+        with open(self.filename,'w') as f:
+            f.write(FIREFOX_JSON)
+        self.module=_firefoxFormats()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def formats(self,**kwargs):
+        fff=self.module.FirefoxFormats(self.filename,useCache=False,**kwargs)
+        fff.load()
+        return fff
+
+    def contents(self):
+        with open(self.filename,'r') as f:
+            return f.read()
+
+    def test_noChange(self):
+        for lazy in (False,True):
+            fff=self.formats(lazy=lazy)
+            inode=os.stat(self.filename).st_ino
+            self.assertFalse(fff.save())
+            self.assertEqual(self.contents(),FIREFOX_JSON)
+            self.assertEqual(os.stat(self.filename).st_ino,inode)
+
+    def test_change(self):
+        fff=self.formats()
+        fff.setFormat({'action':3,'extensions':['png']},mimeType='image/png')
+        self.assertTrue(fff.save())
+        saved=json.loads(self.contents())
+        self.assertEqual(saved['mimeTypes']['image/png'],{'action':3,'extensions':['png']})
+        self.assertEqual(saved['schemes'],json.loads(FIREFOX_JSON)['schemes'])
+        self.assertTrue(saved['isDownloadsImprovementsAlreadyMigrated'])
+        # and now it is the same again
+        self.assertFalse(fff.save())
+
+    def test_transaction(self):
+        for threadSafe in (False,True):
+            fff=self.formats(threadSafe=threadSafe)
+            with fff.transaction() as t:
+                t.removeScheme('mailto')
+                t.setMimeType('image/png',{'action':3,'extensions':['png']})
+            self.assertTrue(t.written)
+            self.assertNotIn('mailto',json.loads(self.contents())['schemes'])
+            self.assertEqual(fff.fileExtensionToMime('a.png'),'image/png')
+            with open(self.filename,'w') as f:
+                f.write(FIREFOX_JSON)
+
+    def test_exceptionInTransaction(self):
+        fff=self.formats()
+        with self.assertRaises(KeyError):
+            with fff.transaction() as t:
+                t.removeScheme('mailto')
+                raise KeyError('oops')
+        self.assertIn('mailto',fff.urlProtocolHandlers)
+        self.assertEqual(self.contents(),FIREFOX_JSON)
+
+    def test_rollback(self):
+        for threadSafe in (False,True):
+            fff=self.formats(threadSafe=threadSafe)
+            cat=fff.mimeTypeHandlers['text/plain'].jsonDict
+            with self.assertRaises(TypeError):
+                with fff.transaction() as t:
+                    t.removeScheme('mailto')
+                    t.setMimeType('text/plain',{'action':2,'extensions':['txt','txtx']})
+                    # cannot be saved as json, so the save fails after the edits are made
+                    t.setMimeType('image/png',{'action':3,'extensions':[object()]})
+            self.assertIn('mailto',fff.urlProtocolHandlers)
+            self.assertNotIn('image/png',fff.mimeTypeHandlers)
+            self.assertEqual(fff.mimeTypeHandlers['text/plain'].jsonDict,cat)
+            self.assertNotEqual(fff.fileExtensionToMime('a.txtx'),'text/plain')
+            self.assertEqual(self.contents(),FIREFOX_JSON)
+
+    def test_snapshot(self):
+        for threadSafe in (False,True):
+            fff=self.formats(threadSafe=threadSafe)
+            snapshot=fff.snapshot()
+            mailto=snapshot.urlProtocolHandlers['mailto'].jsonDict
+            fff.setFormat({'action':2,'handlers':[{'name':'echo','path':'/bin/echo'}]},urlProtocol='mailto')
+            fff.setFormat({'action':3,'extensions':['txtx']},mimeType='image/x-new')
+            self.assertEqual(snapshot.urlProtocolHandlers['mailto'].jsonDict,mailto)
+            self.assertNotIn('image/x-new',snapshot.mimeTypeHandlers)
+            self.assertIsNone(snapshot.fileExtensionToMime('a.txtx'))
+            # and editing the snapshot leaves the original be
+            snapshot.setFormat({'action':3,'extensions':['pdfx']},mimeType='application/pdf')
+            self.assertEqual(fff.mimeTypeHandlers['application/pdf'].extensions,['pdf'])
+            self.assertEqual(fff.fileExtensionToMime('a.txtx'),'image/x-new')
+            self.assertEqual(snapshot.fileExtensionToMime('a.pdfx'),'application/pdf')
+            self.assertNotEqual(fff.fileExtensionToMime('a.pdfx'),'application/pdf')
+
+
+if __name__=='__main__':
+    unittest.main()
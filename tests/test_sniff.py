@@ -0,0 +1,142 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Working out mime types from the first few bytes of files (_sniff)
+"""
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _sniff():
+    """
+    import the _sniff module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._sniff')
+
+
+def _zip(mimetype):
+    """
+    the start of a zip file whose first member is an uncompressed "mimetype"
+    (the way epub and opendocument files begin)
+    """
+    return b'PK\x03\x04'+b'\x00'*22+b'\x08\x00\x00\x00'+b'mimetype'+mimetype
+
+
+SAMPLES={
+    'application/pdf':b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n',
+    'image/png':b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+    'application/gzip':b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x03',
+    'application/x-tar':b'file.txt'+b'\x00'*249+b'ustar\x0000'+b'\x00'*32,
+    'image/webp':b'RIFF\x24\x00\x00\x00WEBPVP8 ',
+    'audio/wav':b'RIFF\x24\x00\x00\x00WAVEfmt ',
+    'application/epub+zip':_zip(b'application/epub+zip'),
+    'application/zip':b'PK\x03\x04\x14\x00\x00\x00\x08\x00'+b'\x00'*16+b'\x05\x00\x00\x00a.txt',
+    'image/bmp':b'BM\x36\x00\x0c\x00\x00\x00\x00\x00\x36\x00\x00\x00\x28\x00',
+    'application/vnd.microsoft.portable-executable':b'MZ\x90\x00\x03\x00\x00\x00\x04\x00\x00\x00'
+        b'\xff\xff\x00\x00\xb8\x00\x00\x00\x00\x00\x00\x00\x40\x00\x00\x00',
+    'text/html':b'  <!DOCTYPE html>\n<html><body></body></html>',
+    'image/svg+xml':b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg"/>',
+    'application/xml':b'<?xml version="1.0"?>\n<root/>',
+    'text/plain':b'just some words\n',
+    }
+
+
+class TestSignatureTable(unittest.TestCase):
+    """
+    Matching leading bytes against the signature table
+    """
+
+    def setUp(self):
+        self.module=_sniff()
+        self.table=self.module.DEFAULT_TABLE
+
+    def test_signatures(self):
+        for mimeType,data in SAMPLES.items():
+            self.assertEqual(self.table.match(data),mimeType,data)
+
+    def test_validLength(self):
+        # only the valid part of a (reused) buffer counts
+        buffer=bytearray(64)
+        buffer[:5]=b'%PDF-'
+        self.assertEqual(self.table.match(buffer,5),'application/pdf')
+        self.assertIsNone(self.table.match(buffer,0))
+        self.assertNotEqual(self.table.match(buffer,4),'application/pdf')
+
+    def test_binary(self):
+        self.assertIsNone(self.table.match(b'\x01\x02\x03\x00\xfe\xff'))
+        self.assertIsNone(self.table.match(b'\xfe\xfe\xfe\xfe\xfe\xfe\xfe\xfe'))
+
+    def test_weakSignatures(self):
+        # text that just happens to start like a bmp or a windows executable
+        self.assertEqual(self.table.match(b'BMW parts list\n'),'text/plain')
+        self.assertEqual(self.table.match(b'MZ-80 emulator notes\nthat go on for a bit\n'),'text/plain')
+        self.assertEqual(self.table.match(b'BM'),'text/plain')
+
+    def test_cutOffCharacter(self):
+        # a multi-byte character cut off by the end of the buffer is still text
+        self.assertEqual(self.table.match('café'.encode('utf-8')[:-1]),'text/plain')
+        self.assertEqual(self.table.match(b'\xef\xbb\xbf<html>'),'text/html')
+
+
+class TestSniffer(unittest.TestCase):
+    """
+    Sniffing files, and whole trees of them
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.module=_sniff()
+        for i,(mimeType,data) in enumerate(SAMPLES.items()):
+            subdirectory=os.path.join(self.directory,'sub%d'%(i%3))
+            os.makedirs(subdirectory,exist_ok=True)
+            with open(os.path.join(subdirectory,'file%d'%i),'wb') as f:
+                f.write(data)
+        with open(os.path.join(self.directory,'big.pdf'),'wb') as f:
+            f.write(SAMPLES['application/pdf']+b'\x00'*3*self.module.SNIFF_SIZE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected(self):
+        ret={os.path.join(self.directory,'sub%d'%(i%3),'file%d'%i):mimeType
+            for i,mimeType in enumerate(SAMPLES)}
+        ret[os.path.join(self.directory,'big.pdf')]='application/pdf'
+        return ret
+
+    def test_sniffer(self):
+        sniffer=self.module.Sniffer()
+        for path,mimeType in self.expected().items():
+            self.assertEqual(sniffer.sniff(path),mimeType,path)
+        with self.assertRaises(OSError):
+            sniffer.sniff(os.path.join(self.directory,'missing'))
+
+    def test_sniffTree(self):
+        for jobs in (1,4):
+            found=dict(self.module.sniffTree([self.directory],jobs=jobs,chunkSize=2))
+            self.assertEqual(found,self.expected())
+
+    def test_lookup(self):
+        looked=[]
+        def lookup(path):
+            looked.append(path)
+            if path.endswith('.pdf'):
+                return 'application/x-looked-up'
+            return None
+        found=dict(self.module.sniffTree([self.directory],jobs=1,lookup=lookup))
+        self.assertEqual(found[os.path.join(self.directory,'big.pdf')],'application/x-looked-up')
+        self.assertEqual(len(looked),len(found))
+
+
+if __name__=='__main__':
+    unittest.main()
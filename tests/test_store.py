@@ -0,0 +1,160 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+The SQLite database of the handlers of many profiles (_store)
+"""
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _store():
+    """
+    import the _store module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._store')
+
+
+def _profile(viewer,ext='xyz'):
+    """
+    a handlers.json sending a file extension to a viewer application
+    """
+    return {
+        'defaultHandlersVersion':{'en-US':4},
+        'mimeTypes':{
+            'application/x-%s'%ext:{'action':2,'extensions':[ext.upper()],
+                'handlers':[{'name':os.path.basename(viewer),'path':viewer}]},
+            'application/pdf':{'action':3,'extensions':['pdf']},
+            },
+        'schemes':{'mailto':{'action':4,'handlers':[None,{'name':'Gmail','uriTemplate':'https://mail.example.com/?u=%s'}]}},
+        }
+
+
+class TestHandlerStore(unittest.TestCase):
+    """
+    Importing a directory of profiles and asking questions of them
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.fleet=os.path.join(self.directory,'fleet')
+        self.write('a.json',_profile('/usr/bin/ourviewer'))
+        self.write('b.json',_profile('/usr/bin/ourviewer'))
+        self.write('sub/c.json',_profile('/opt/other/viewer'))
+        self.module=_store()
+        self.store=self.module.HandlerStore(os.path.join(self.directory,'store','handlers.db'))
+        self.imported=self.store.importMany([self.fleet])
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def write(self,name,jsonDict):
+        filename=os.path.join(self.fleet,name)
+        os.makedirs(os.path.dirname(filename),exist_ok=True)
+        with open(filename,'w') as f:
+            json.dump(jsonDict,f)
+        return filename
+
+    def source(self,name):
+        return os.path.abspath(os.path.join(self.fleet,name))
+
+    def test_importMany(self):
+        self.assertEqual(self.imported,(3,0,0))
+        self.assertEqual(self.store.profiles,[self.source(name) for name in ('a.json','b.json','sub/c.json')])
+
+    def test_reimport(self):
+        # nothing changed, so nothing is imported again
+        self.assertEqual(self.store.importMany([self.fleet]),(0,3,0))
+        self.write('b.json',_profile('/opt/other/viewer'))
+        with open(os.path.join(self.fleet,'broken.json'),'w') as f:
+            f.write('{"mimeTypes":')
+        reported=[]
+        counts=self.store.importMany([self.fleet],lambda *args:reported.append(args))
+        self.assertEqual(counts,(1,2,1))
+        self.assertEqual([(os.path.basename(source),imported,error is None)
+            for source,imported,error in reported if imported or error],
+            [('b.json',True,True),('broken.json',False,False)])
+        # the old rows of the re-imported profile are gone
+        self.assertEqual(self.store.query('SELECT count(*) FROM extensions'),[(6,)])
+        self.assertEqual(self.store.profilesUsing('/usr/bin/ourviewer'),
+            [(self.source('a.json'),'mimeTypes','application/x-xyz',0)])
+
+    def test_extensionOwners(self):
+        # extensions are looked up regardless of case or a leading dot
+        self.assertEqual(self.store.extensionOwners('.XYZ'),[
+            (self.source('a.json'),'application/x-xyz','/usr/bin/ourviewer'),
+            (self.source('b.json'),'application/x-xyz','/usr/bin/ourviewer'),
+            (self.source('sub/c.json'),'application/x-xyz','/opt/other/viewer')])
+        self.assertEqual(self.store.extensionOwners('pdf')[0],(self.source('a.json'),'application/pdf',None))
+        self.assertEqual(self.store.extensionOwners('none'),[])
+
+    def test_extensionMismatches(self):
+        expected=[(self.source('sub/c.json'),'application/x-xyz','/opt/other/viewer')]
+        self.assertEqual(self.store.extensionMismatches('xyz','/usr/bin/ourviewer'),expected)
+        self.assertEqual(self.store.extensionMismatches('xyz','ourviewer'),expected)
+        self.assertEqual(self.store.extensionMismatches('xyz','application/x-xyz'),[])
+
+    def test_profilesWith(self):
+        self.assertEqual(len(self.store.profilesWith('mailto','schemes')),3)
+        self.assertEqual(self.store.profilesWith('application/pdf')[0],(self.source('a.json'),3))
+        with self.assertRaises(Exception):
+            self.store.profilesWith('mailto','extensions')
+
+    def test_forgetAndPrune(self):
+        self.assertTrue(self.store.forget(self.source('a.json')))
+        self.assertFalse(self.store.forget(self.source('a.json')))
+        os.remove(os.path.join(self.fleet,'sub','c.json'))
+        self.assertEqual(self.store.prune(),1)
+        self.assertEqual(self.store.profiles,[self.source('b.json')])
+        # everything that belonged to them went with them
+        self.assertEqual(self.store.query('SELECT count(DISTINCT profile) FROM handlers'),[(1,)])
+
+    def test_queryReadOnly(self):
+        self.assertEqual(self.store.query('SELECT count(*) FROM profiles'),[(3,)])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.store.query('DELETE FROM profiles')
+        self.assertEqual(len(self.store.profiles),3)
+
+
+class TestMemoryStore(unittest.TestCase):
+    """
+    A store that is only in memory
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.filename=os.path.join(self.directory,'handlers.json')
+        with open(self.filename,'w') as f:
+            json.dump(_profile('/usr/bin/ourviewer'),f)
+        self.store=_store().HandlerStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_queryReadOnly(self):
+        self.assertTrue(self.store.importFile(self.filename,'me'))
+        self.assertFalse(self.store.importFile(self.filename,'me'))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.store.query('DROP TABLE profiles')
+        self.assertEqual(self.store.query('SELECT source FROM profiles'),[('me',)])
+        # and the store can still be written to afterwards
+        self.assertTrue(self.store.forget('me'))
+        self.assertEqual(self.store.profiles,[])
+
+
+if __name__=='__main__':
+    unittest.main()
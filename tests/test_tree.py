@@ -0,0 +1,89 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Walking directory trees (_tree)
+"""
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _tree():
+    """
+    import the _tree module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._tree')
+
+
+class TestWalkTree(unittest.TestCase):
+    """
+    walkTree() picks the right files, and only regular ones
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.root=os.path.join(self.directory,'root')
+        for name in ('a.txt','b.gz','sub/c.txt','sub/deeper/d.txt','skip/e.txt'):
+            self.touch(os.path.join(self.root,name))
+        self.touch(os.path.join(self.directory,'outside','f.txt'))
+        self.module=_tree()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def touch(self,filename):
+        os.makedirs(os.path.dirname(filename),exist_ok=True)
+        with open(filename,'w') as f:
+            f.write('x')
+
+    def walk(self,**kwargs):
+        ret=None
+        for jobs in (1,4):
+            found=sorted(os.path.relpath(path,self.root)
+                for path in self.module.walkTree([self.root],jobs=jobs,**kwargs))
+            if ret is not None:
+                self.assertEqual(found,ret)
+            ret=found
+        return [path.replace(os.sep,'/') for path in ret]
+
+    def test_all(self):
+        self.assertEqual(self.walk(),['a.txt','b.gz','skip/e.txt','sub/c.txt','sub/deeper/d.txt'])
+
+    def test_filters(self):
+        self.assertEqual(self.walk(include='*.txt',exclude='skip'),['a.txt','sub/c.txt','sub/deeper/d.txt'])
+        self.assertEqual(self.walk(include='sub/deeper/*'),['sub/deeper/d.txt'])
+        self.assertEqual(self.walk(maxDepth=1),['a.txt','b.gz','skip/e.txt','sub/c.txt'])
+        self.assertEqual(self.walk(maxDepth=0),['a.txt','b.gz'])
+
+    def test_files(self):
+        # files given as roots are passed straight through
+        filename=os.path.join(self.directory,'outside','f.txt')
+        self.assertEqual(list(self.module.walkTree([filename])),[filename])
+
+    @unittest.skipIf(not hasattr(os,'mkfifo'),'no fifos here')
+    def test_fifo(self):
+        os.mkfifo(os.path.join(self.root,'pipe.txt'))
+        self.assertEqual(self.walk(include='*.txt',maxDepth=0),['a.txt'])
+
+    @unittest.skipIf(os.name=='nt','symlinks need privileges on windows')
+    def test_symlinks(self):
+        # a loop back up the tree, one out of it, a file and a broken link
+        os.symlink(self.root,os.path.join(self.root,'sub','loop'))
+        os.symlink(os.path.join(self.directory,'outside'),os.path.join(self.root,'outside'))
+        os.symlink(os.path.join(self.directory,'outside','f.txt'),os.path.join(self.root,'f.txt'))
+        os.symlink(os.path.join(self.directory,'missing.txt'),os.path.join(self.root,'broken.txt'))
+        self.assertEqual(self.walk(),['a.txt','b.gz','f.txt','skip/e.txt','sub/c.txt','sub/deeper/d.txt'])
+
+
+if __name__=='__main__':
+    unittest.main()
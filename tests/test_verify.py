@@ -0,0 +1,70 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Checking that handler applications can be run (_verify)
+"""
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _verify():
+    """
+    import the _verify module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'._verify')
+
+
+@unittest.skipIf(os.name=='nt','no executable bit on windows')
+class TestPathCheckCache(unittest.TestCase):
+    """
+    PathCheckCache re-checks an application when it changes on disk
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.path=os.path.join(self.directory,'app')
+        with open(self.path,'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(self.path,0o755)
+        self.module=_verify()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cached(self):
+        cache=self.module.PathCheckCache()
+        self.assertIsNone(cache.check(self.path))
+        self.assertIsNone(cache.check(self.path))
+        self.assertEqual((cache.hits,cache.misses),(1,1))
+
+    def test_chmod(self):
+        cache=self.module.PathCheckCache()
+        self.assertIsNone(cache.check(self.path))
+        os.chmod(self.path,0o644)
+        if os.access(self.path,os.X_OK): # eg. running as root
+            self.skipTest('can still execute it')
+        self.assertEqual(cache.check(self.path),'application is not executable')
+        os.chmod(self.path,0o755)
+        self.assertIsNone(cache.check(self.path))
+        self.assertEqual(cache.misses,3)
+
+    def test_removed(self):
+        cache=self.module.PathCheckCache()
+        self.assertIsNone(cache.check(self.path))
+        os.remove(self.path)
+        self.assertEqual(cache.check(self.path),'application does not exist')
+
+
+if __name__=='__main__':
+    unittest.main()
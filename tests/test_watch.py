@@ -0,0 +1,164 @@
+#!/usr/bin/env
+# -*- coding: utf-8 -*-
+"""
+Incremental reloads of handlers.json (FirefoxFormats.update() and _watch)
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import importlib
+import unittest
+
+
+HERE=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE=os.path.basename(HERE)
+
+
+def _module(name):
+    """
+    import a module of the package these tests are in
+    """
+    parent=os.path.dirname(HERE)
+    if parent not in sys.path:
+        sys.path.insert(0,parent)
+    return importlib.import_module(PACKAGE+'.'+name)
+
+
+HANDLERS={
+    'defaultHandlersVersion':{'en-US':4},
+    'mimeTypes':{
+        'application/pdf':{'action':3,'extensions':['pdf']},
+        'text/plain':{'action':2,'extensions':['txt'],'handlers':[{'name':'cat','path':'/bin/cat'}]},
+        },
+    'schemes':{
+        'mailto':{'action':4,'handlers':[None,{'name':'Gmail','uriTemplate':'https://mail.example.com/?u=%s'}]},
+        'irc':{'action':2,'handlers':[{'name':'echo','path':'/bin/echo'}]},
+        },
+    }
+
+
+def _edited():
+    """
+    HANDLERS with one mime type added, one modified, one scheme removed
+    """
+    ret=json.loads(json.dumps(HANDLERS))
+    ret['mimeTypes']['image/png']={'action':3,'extensions':['png']}
+    ret['mimeTypes']['text/plain']['extensions']=['txt','txtx']
+    del ret['schemes']['irc']
+    return ret
+
+
+class _ProfileTest(unittest.TestCase):
+    """
+    A handlers.json in a temporary directory
+    """
+
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.filename=os.path.join(self.directory,'handlers.json')
+        self.write(HANDLERS)
+        self.module=_module('_firefoxFormats')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self,jsonDict):
+        """
+        replace handlers.json the way firefox does (a new file renamed over it)
+        """
+        tmpFilename=self.filename+'.tmp'
+        with open(tmpFilename,'w') as f:
+            json.dump(jsonDict,f)
+        os.replace(tmpFilename,self.filename)
+
+    def formats(self,lazy=False):
+        fff=self.module.FirefoxFormats(self.filename,useCache=False,lazy=lazy)
+        fff.load()
+        return fff
+
+    def checkChanges(self,changes):
+        self.assertEqual(changes.addedMimeTypes,['image/png'])
+        self.assertEqual(changes.removedMimeTypes,[])
+        self.assertEqual(changes.modifiedMimeTypes,['text/plain'])
+        self.assertEqual(changes.addedSchemes,[])
+        self.assertEqual(changes.removedSchemes,['irc'])
+        self.assertEqual(changes.modifiedSchemes,[])
+
+
+class TestUpdate(_ProfileTest):
+    """
+    FirefoxFormats.update()/reload() only touch what changed
+    """
+
+    def test_update(self):
+        for lazy in (False,True):
+            fff=self.formats(lazy)
+            self.assertEqual(fff.fileExtensionToMime('a.txtx'),None)
+            pdf=fff.mimeTypeHandlers['application/pdf']
+            self.checkChanges(fff.update(_edited()))
+            # unchanged entries are kept as they were
+            self.assertIs(fff.mimeTypeHandlers['application/pdf'],pdf)
+            self.assertEqual(fff.fileExtensionToMime('a.png'),'image/png')
+            self.assertEqual(fff.fileExtensionToMime('a.txtx'),'text/plain')
+            self.assertNotIn('irc',fff.urlProtocolHandlers)
+
+    def test_unchanged(self):
+        fff=self.formats()
+        changes=fff.update(json.loads(json.dumps(HANDLERS)))
+        self.assertFalse(changes)
+
+    def test_reload(self):
+        fff=self.formats()
+        self.write(_edited())
+        self.checkChanges(fff.reload())
+
+
+class TestHandlersWatcher(_ProfileTest):
+    """
+    HandlersWatcher.check() picks up changes (and survives the file going odd)
+    """
+
+    def watcher(self):
+        changed=[]
+        fff=self.formats()
+        watcher=_module('_watch').HandlersWatcher(fff,changed.append,usePolling=True)
+        watcher.check()
+        return fff,watcher,changed
+
+    def test_check(self):
+        fff,watcher,changed=self.watcher()
+        self.assertIsNone(watcher.check())
+        self.write(_edited())
+        self.checkChanges(watcher.check())
+        self.assertEqual(len(changed),1)
+        self.assertIsNone(watcher.check())
+
+    def test_halfWritten(self):
+        fff,watcher,changed=self.watcher()
+        with open(self.filename,'w') as f:
+            f.write('{"mimeTypes":')
+        self.assertIsNone(watcher.check())
+        self.assertIn('irc',fff.urlProtocolHandlers)
+
+    def test_unreadable(self):
+        fff,watcher,changed=self.watcher()
+        os.remove(self.filename)
+        self.assertIsNone(watcher.check())
+        os.mkdir(self.filename)
+        self.assertIsNone(watcher.check())
+        self.assertIn('irc',fff.urlProtocolHandlers)
+        self.assertEqual(changed,[])
+
+    def test_start(self):
+        fff,watcher,changed=self.watcher()
+        watcher.start()
+        try:
+            self.assertTrue(fff.threadSafe)
+        finally:
+            watcher.stop()
+
+
+if __name__=='__main__':
+    unittest.main()